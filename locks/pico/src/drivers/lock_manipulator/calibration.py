@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from .lock_manipulator import *
+from ..persistent_record import PersistentRecord
+
+CALIBRATION_FILE = "lock_calibration.bin"
+CALIBRATION_VERSION = const(1)
+# target rotations, lock direction, confirmed state, measured rotations, overshoot and neutral position
+CALIBRATION_FORMAT = "<BbBffh"
+
+NO_NEUTRAL_POSITION = const(-1)
+
+
+class LockCalibration:
+    def __init__(self, path: str = CALIBRATION_FILE):
+        """
+        Results of lock state determination and last confirmed lock state, kept in flash between boots.
+        State is stored as LOCK_UNINITIALIZED while lock is moving or broken, so interrupted operation is
+        never trusted.
+        """
+        self._record = PersistentRecord(path, CALIBRATION_FORMAT, CALIBRATION_VERSION)
+        self.targetRotations = 0
+        self.direction = 0
+        self.state = LOCK_UNINITIALIZED
+        self.madeRotations = 0.0
+        self.overshoot = 0.0
+        self.neutralPosition = NO_NEUTRAL_POSITION
+
+    def load(self) -> bool:
+        """
+        :return: False if there is no valid calibration stored
+        """
+        values = self._record.load()
+        if values is None:
+            return False
+        (self.targetRotations, self.direction, self.state,
+         self.madeRotations, self.overshoot, self.neutralPosition) = values
+        return True
+
+    def save(self):
+        self._record.save(self.targetRotations, self.direction, self.state,
+                          self.madeRotations, self.overshoot, self.neutralPosition)
+
+    def matches(self, targetRotations: int, direction: int) -> bool:
+        """True if calibration was made for lock configured same way and confirms lock state"""
+        return self.targetRotations == targetRotations and self.direction == direction \
+            and (self.state == LOCK_LOCKED or self.state == LOCK_UNLOCKED)
+
+    def clear(self):
+        self.state = LOCK_UNINITIALIZED
+        self._record.clear()
@@ -0,0 +1,62 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from micropython import const
+
+# coast is never assumed longer than this, so single bad measurement cannot make lock stop far before target
+MAX_COAST_ROTATIONS = const(0.5)
+
+
+class CoastModel:
+    def __init__(self,
+                 smoothing: float = 0.3,
+                 maxCoast: float = MAX_COAST_ROTATIONS):
+        """
+        Learns, how far lock keeps rotating after stop command and how long it takes to stand still,
+        separately for each direction of rotation.
+
+        :param smoothing: weight of new measurement in running averages
+        :param maxCoast: upper limit of learned coast in rotations
+        """
+        if smoothing <= 0 or smoothing > 1:
+            raise ValueError("smoothing must be in (0, 1]")
+        self._smoothing = smoothing
+        self._maxCoast = maxCoast
+        self._coast = [0.0, 0.0]
+        self._settleTime = [0.0, 0.0]
+        self._samples = [0, 0]
+
+    def record(self, direction: int, coastRotations: float, settleTimeMs: int):
+        """
+        :param direction: direction of rotation before stop (1 or -1)
+        :param coastRotations: rotations made after stop command
+        :param settleTimeMs: time from stop command to last detected movement
+        """
+        i = 0 if direction > 0 else 1
+        if coastRotations < 0:
+            coastRotations = -coastRotations
+        if coastRotations > self._maxCoast:
+            coastRotations = self._maxCoast
+        if self._samples[i] == 0:
+            self._coast[i] = coastRotations
+            self._settleTime[i] = settleTimeMs
+        else:
+            self._coast[i] = self._coast[i] + self._smoothing * (coastRotations - self._coast[i])
+            self._settleTime[i] = self._settleTime[i] + self._smoothing * (settleTimeMs - self._settleTime[i])
+        self._samples[i] = self._samples[i] + 1
+
+    def getCoast(self, direction: int) -> float:
+        """Rotations lock is expected to make after stop command, 0 until first measurement"""
+        return self._coast[0 if direction > 0 else 1]
+
+    def getSettleTime(self, direction: int) -> int:
+        """Milliseconds lock is expected to move after stop command, None until first measurement"""
+        i = 0 if direction > 0 else 1
+        if self._samples[i] == 0:
+            return None
+        return int(self._settleTime[i] + 0.5)
@@ -7,39 +7,154 @@
 #   http://www.apache.org/licenses/LICENSE-2.0                                 -
 # ------------------------------------------------------------------------------
 
+from machine import ADC, PWM
+
+from .calibration import LockCalibration
+from .coast_model import CoastModel
+from .motion_profile import TrapezoidalProfile
+from .motion_recorder import MotionRecorder
+from .operation_timer import OperationTimer
+from .step_timing import StepTimingModel
+from .stall_detector import LoadStallDetector
 from .startstop_manipulator import *
 from ..helpers import PinLike, PinHelpers
 from ..rotation_detector.rotation_detector import RotationDetector
 
+CURRENT_SAMPLING_INTERVAL_MS = const(10)
+SPEED_UPDATE_INTERVAL_MS = const(20)
+# above hearing range, so motor does not whine at partial duty
+PWM_FREQUENCY = const(20_000)
+FULL_DUTY = const(65535)
+# time for H-bridge transistors to close before opposite side opens
+DEAD_TIME_MS = const(1)
+# enough for small geared lock motor to stop with shorted windings, when braking is enabled
+BRAKE_TIME_MS = const(50)
+# time for coasting motor to stop before reversing, when it is not braked
+REVERSAL_COAST_MS = const(200)
+
 
 class EngineLockManipulator(StartStopLockManipulator):
     def __init__(self,
                  clockwisePin: PinLike = 16,
                  counterClockwisePin: PinLike = 17,
-                 rotationDetector: RotationDetector = None):
-        super().__init__(rotationDetector)
-        self._clockwise = PinHelpers.pinLikeToOutPin(clockwisePin, "clockwisePin")
-        self._counterclockwise = PinHelpers.pinLikeToOutPin(counterClockwisePin, "counterClockwisePin")
+                 rotationDetector: RotationDetector = None,
+                 reedSwitchPin: PinLike = 13,
+                 currentSensor: ADC = None,
+                 stallDetector: LoadStallDetector = None,
+                 calibration: LockCalibration = None,
+                 coastModel: CoastModel = None,
+                 recorder: MotionRecorder = None,
+                 stepTiming: StepTimingModel = None,
+                 timer: OperationTimer = None,
+                 motionProfile: TrapezoidalProfile = None,
+                 pwmFrequency: int = PWM_FREQUENCY,
+                 deadTimeMs: int = DEAD_TIME_MS,
+                 brakeMs: int = 0):
+        """
+        DC motor driven by H-bridge with PWM on both inputs.
+
+        :param motionProfile: speed profile giving soft start and slowing down before target,
+                              TrapezoidalProfile(minimalSpeed=1.0) to always drive motor with full speed
+        :param pwmFrequency: PWM frequency in Hz
+        :param deadTimeMs: pause between switching off one side of H-bridge and switching on other one
+        :param brakeMs: time both inputs are held high after stop to brake motor, also before reversing,
+                        e.g. BRAKE_TIME_MS. 0 lets motor coast after stop and gives running motor
+                        REVERSAL_COAST_MS to stop before reversing. Enable only for driver ICs, which short
+                        motor windings, when both inputs are high (e.g. DRV8833, TB6612FNG). On discrete
+                        MOSFET bridge, like the one in lock schematic, both inputs high open both sides
+                        of bridge at once and short power supply.
+        """
+        super().__init__(rotationDetector, reedSwitchPin, calibration, coastModel, recorder,
+                         stepTiming, timer)
+        self._clockwise = self._pwm(PinHelpers.pinLikeToOutPin(clockwisePin, "clockwisePin"), pwmFrequency)
+        self._counterclockwise = self._pwm(PinHelpers.pinLikeToOutPin(counterClockwisePin, "counterClockwisePin"),
+                                           pwmFrequency)
+        self._currentSensor = currentSensor
+        self._stallDetector = stallDetector if stallDetector is not None else LoadStallDetector()
+        self._profile = motionProfile if motionProfile is not None else TrapezoidalProfile()
+        self._deadTimeMs = deadTimeMs
+        self._brakeMs = brakeMs
+        self._rotationDirection = 0
+        self._motionStart = 0
+        self._duty = 0
+        # motor was driven since last stop, so it may still turn
+        self._running = False
+
+    @staticmethod
+    def _pwm(pin, frequency):
+        pwm = PWM(pin)
+        pwm.freq(frequency)
+        pwm.duty_u16(0)
+        return pwm
 
     async def init(self, fullLockRotations: int = 2, initialState: int = LOCK_UNINITIALIZED,
                    lockDirection: int = LOCK_DIRECTION_COUNTERCLOCKWISE) -> None:
-        self._clockwise.init(Pin.OUT)
-        self._counterclockwise.init(Pin.OUT)
+        self._outputsOff()
         await super().init(fullLockRotations, initialState, lockDirection)
 
-    def _detectHardwareStalled(self):
-        return False
+    def _supervisionInterval(self):
+        if self._currentSensor is not None:
+            return CURRENT_SAMPLING_INTERVAL_MS
+        return None if self._profile.isConstant() else SPEED_UPDATE_INTERVAL_MS
+
+    async def _detectHardwareStalled(self):
+        if self._currentSensor is None:
+            return False
+        return self._stallDetector.sample(self._currentSensor.read_u16())
+
+    async def _rotateCounterClockwise(self):
+        await self._rotate(-1, self._counterclockwise, self._clockwise)
+
+    async def _rotateClockwise(self):
+        await self._rotate(1, self._clockwise, self._counterclockwise)
+
+    async def _rotate(self, direction, output, opposite):
+        self._stallDetector.start(direction)
+        if self._rotationDirection != direction:
+            if self._rotationDirection != 0:
+                # motor still turns other way, driving it backwards would brake it through H-bridge
+                await self._stopLock()
+                if self._brakeMs == 0:
+                    await asyncio.sleep(REVERSAL_COAST_MS / 1000)
+            opposite.duty_u16(0)
+            self._duty = 0
+            await asyncio.sleep(self._deadTimeMs / 1000)  # prevent shortcutting circuit
+        self._rotationDirection = direction
+        self._running = True
+        self._motionStart = time.ticks_ms()
+        self._setSpeed(output, self._profile.speed(0, self._remainingRotations()))
+
+    async def _updateSpeed(self):
+        if self._profile.isConstant() or self._rotationDirection == 0:
+            return
+        output = self._clockwise if self._rotationDirection > 0 else self._counterclockwise
+        self._setSpeed(output, self._profile.speed(time.ticks_diff(time.ticks_ms(), self._motionStart),
+                                                   self._remainingRotations()))
+
+    def _setSpeed(self, output, speed):
+        duty = int(FULL_DUTY * speed)
+        if duty != self._duty:
+            output.duty_u16(duty)
+            self._duty = duty
 
-    def _rotateCounterClockwise(self):
-        self._clockwise.off()
-        time.sleep_ms(1)  # prevent shortcutting circuit
-        self._counterclockwise.on()
+    def _outputsOff(self):
+        self._counterclockwise.duty_u16(0)
+        self._clockwise.duty_u16(0)
+        self._duty = 0
 
-    def _rotateClockwise(self):
-        self._counterclockwise.off()
-        time.sleep_ms(1)  # prevent shortcutting circuit
-        self._clockwise.on()
+    def _stopFromIrq(self):
+        self._rotationDirection = 0
+        self._outputsOff()
 
-    def _stopLock(self):
-        self._counterclockwise.off()
-        self._clockwise.off()
+    async def _stopLock(self):
+        self._rotationDirection = 0
+        self._outputsOff()
+        running = self._running
+        self._running = False
+        if self._brakeMs > 0 and running:
+            await asyncio.sleep(self._deadTimeMs / 1000)
+            self._counterclockwise.duty_u16(FULL_DUTY)
+            self._clockwise.duty_u16(FULL_DUTY)
+            await asyncio.sleep(self._brakeMs / 1000)
+            # lock is released after braking, so key can be still turned by hand
+            self._outputsOff()
@@ -0,0 +1,56 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+
+class TrapezoidalProfile:
+    def __init__(self,
+                 acceleration: float = 4.0,
+                 cruiseSpeed: float = 1.0,
+                 minimalSpeed: float = 0.3,
+                 decelerationRotations: float = 0.5):
+        """
+        Trapezoidal velocity profile: ramp up from start, cruise and slow down before reaching target.
+        All speeds are fractions of full speed of motor.
+
+        :param acceleration: speed increase per second
+        :param cruiseSpeed: maximal speed
+        :param minimalSpeed: speed at start and at target, motor must be still able to turn lock with it,
+                             same as cruiseSpeed for constant speed, e.g. 1.0 to always run full speed
+        :param decelerationRotations: distance from target, at which slowing down starts
+        """
+        if minimalSpeed <= 0 or minimalSpeed > cruiseSpeed or cruiseSpeed > 1:
+            raise ValueError("Speeds must satisfy 0 < minimalSpeed <= cruiseSpeed <= 1")
+        if acceleration <= 0 or decelerationRotations <= 0:
+            raise ValueError("acceleration and decelerationRotations must be positive")
+        self._acceleration = acceleration
+        self._cruiseSpeed = cruiseSpeed
+        self._minimalSpeed = minimalSpeed
+        self._decelerationRotations = decelerationRotations
+
+    def isConstant(self) -> bool:
+        """True if profile keeps single speed, so it does not need updates during rotation"""
+        return self._minimalSpeed == self._cruiseSpeed
+
+    def speed(self, elapsedMs: int, remainingRotations: float) -> float:
+        """
+        :param elapsedMs: time since motion started
+        :param remainingRotations: distance left to target
+        :return: fraction of full speed that motor should run with
+        """
+        speed = self._minimalSpeed + self._acceleration * elapsedMs / 1000
+        if remainingRotations < self._decelerationRotations:
+            if remainingRotations < 0:
+                remainingRotations = 0
+            braking = self._minimalSpeed + (self._cruiseSpeed - self._minimalSpeed) \
+                * remainingRotations / self._decelerationRotations
+            if braking < speed:
+                speed = braking
+        if speed > self._cruiseSpeed:
+            speed = self._cruiseSpeed
+        return speed
@@ -0,0 +1,105 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import struct
+import time
+from array import array
+
+from micropython import const
+
+MOTION_SAMPLES = const(256)
+
+# sample kinds stored in command column
+MOTION_POSITION = const(0)
+MOTION_ROTATE_CLOCKWISE = const(1)
+MOTION_ROTATE_COUNTERCLOCKWISE = const(2)
+MOTION_STOP = const(3)
+MOTION_STATE_CHANGE = const(4)
+
+# ticks_us, rotations, command, state
+MOTION_RECORD_FORMAT = "<IfBB"
+MOTION_RECORD_SIZE = const(10)
+
+
+class MotionRecorder:
+    def __init__(self, size: int = MOTION_SAMPLES):
+        """
+        Keeps last motion samples of lock in preallocated ring buffer. Recording only stores numbers in arrays,
+        so it does not allocate memory and does not change timing of operation it records.
+        Samples are formatted only when dump is asked for.
+
+        :param size: number of last samples kept
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self._times = array("I", bytes(4 * size))
+        self._rotations = array("f", bytes(4 * size))
+        self._commands = array("B", bytes(size))
+        self._states = array("B", bytes(size))
+        self._size = size
+        self._next = 0
+        self.count = 0
+        self.enabled = True
+
+    def record(self, rotations: float, command: int, state: int):
+        if not self.enabled:
+            return
+        index = self._next
+        self._times[index] = time.ticks_us()
+        self._rotations[index] = rotations
+        self._commands[index] = command
+        self._states[index] = state
+        self._next = (index + 1) % self._size
+        self.count = self.count + 1
+
+    def clear(self):
+        self._next = 0
+        self.count = 0
+
+    def getStored(self) -> int:
+        """Number of samples available in buffer"""
+        return self.count if self.count < self._size else self._size
+
+    def sample(self, index: int) -> tuple:
+        """
+        :param index: 0 for oldest stored sample
+        :return: tuple of ticks_us, rotations, command and state
+        """
+        stored = self.getStored()
+        if index < 0 or index >= stored:
+            raise ValueError(f"index must be between 0 and {stored - 1}")
+        position = (self._next - stored + index) % self._size
+        return self._times[position], self._rotations[position], self._commands[position], self._states[position]
+
+    def packInto(self, buffer, start: int = 0) -> int:
+        """
+        Packs stored samples as MOTION_RECORD_FORMAT records, e.g. to send them in BLE characteristic
+
+        :param buffer: writable buffer, it is filled with as many whole records as fit
+        :param start: index of first sample to pack, 0 for oldest
+        :return: number of packed samples
+        """
+        count = min(self.getStored() - start, len(buffer) // MOTION_RECORD_SIZE)
+        for i in range(count):
+            struct.pack_into(MOTION_RECORD_FORMAT, buffer, i * MOTION_RECORD_SIZE, *self.sample(start + i))
+        return count if count > 0 else 0
+
+    def dump(self, write=print):
+        """
+        Writes stored samples as CSV lines, oldest first, with time relative to oldest sample
+
+        :param write: function called with each line, print by default to dump over serial console
+        """
+        write("us,rotations,command,state")
+        stored = self.getStored()
+        if stored == 0:
+            return
+        start = self.sample(0)[0]
+        for i in range(stored):
+            ticks, rotations, command, state = self.sample(i)
+            write(f"{time.ticks_diff(ticks, start)},{rotations:.3f},{command},{state}")
@@ -0,0 +1,158 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import struct
+import time
+from array import array
+
+from micropython import const
+
+# phases of lock operation in order they happen, histogram of PHASE_COMMAND_RECEIVED holds whole operation time
+PHASE_COMMAND_RECEIVED = const(0)
+PHASE_LOCK_ACQUIRED = const(1)
+PHASE_MOTOR_STARTED = const(2)
+PHASE_FIRST_MOVEMENT = const(3)
+PHASE_TARGET_REACHED = const(4)
+PHASE_STOP_ISSUED = const(5)
+PHASE_RECENTER_DONE = const(6)
+PHASE_CALLBACK_FIRED = const(7)
+PHASE_COUNT = const(8)
+
+PHASE_NAMES = ("total", "lock acquired", "motor started", "first movement", "target reached", "stop issued",
+               "recenter done", "callback fired")
+
+HISTOGRAM_BUCKETS = const(16)
+# upper bound of first bucket, each next bucket doubles it and last bucket has no upper bound
+FIRST_BUCKET_US = const(250)
+MAX_BUCKET_COUNT = const(0xFFFF)
+
+# completed and abandoned operations, phases and buckets, followed by little endian uint16 bucket counts
+METRICS_HEADER_FORMAT = "<HHBB"
+
+
+class OperationTimer:
+    def __init__(self):
+        """
+        Marks time of each phase of lock operation and adds time between consecutive phases to fixed bucket
+        histograms. Marking only stores ticks in preallocated array, so it can be done from IRQ.
+        """
+        self._marks = array("I", bytes(4 * PHASE_COUNT))
+        self._marked = 0
+        self._active = False
+        self._counts = array("H", bytes(2 * PHASE_COUNT * HISTOGRAM_BUCKETS))
+        self.completed = 0
+        self.abandoned = 0
+
+    def begin(self):
+        """Starts timing of new operation, operation timed so far is counted as abandoned"""
+        if self._active:
+            self.abandoned = self.abandoned + 1
+        self._marked = 0
+        self._active = True
+        self.mark(PHASE_COMMAND_RECEIVED)
+
+    def beginIfIdle(self):
+        """Starts timing, unless command was already received and still waits for lock"""
+        if self._active and not self.isMarked(PHASE_LOCK_ACQUIRED):
+            return
+        self.begin()
+
+    def isActive(self) -> bool:
+        return self._active
+
+    def isMarked(self, phase: int) -> bool:
+        return self._marked & (1 << phase) != 0
+
+    def mark(self, phase: int):
+        """Stores time of phase, only first time of each phase is kept"""
+        if not self._active or self._marked & (1 << phase):
+            return
+        self._marks[phase] = time.ticks_us()
+        self._marked = self._marked | (1 << phase)
+
+    def markMovement(self):
+        """Marks first movement, if motor was already started by timed operation"""
+        if self._marked & (1 << PHASE_MOTOR_STARTED):
+            self.mark(PHASE_FIRST_MOVEMENT)
+
+    def cancel(self):
+        """Drops timed operation, e.g. after lock error"""
+        if self._active:
+            self.abandoned = self.abandoned + 1
+            self._active = False
+
+    def finish(self):
+        """Marks callback and adds times of all marked phases to histograms"""
+        if not self._active:
+            return
+        self.mark(PHASE_CALLBACK_FIRED)
+        start = previous = self._marks[PHASE_COMMAND_RECEIVED]
+        for phase in range(1, PHASE_COUNT):
+            if self._marked & (1 << phase):
+                self._add(phase, time.ticks_diff(self._marks[phase], previous))
+                previous = self._marks[phase]
+        self._add(PHASE_COMMAND_RECEIVED, time.ticks_diff(previous, start))
+        self.completed = self.completed + 1
+        self._active = False
+
+    def reset(self):
+        for i in range(len(self._counts)):
+            self._counts[i] = 0
+        self.completed = 0
+        self.abandoned = 0
+
+    def _add(self, phase, durationUs):
+        bucket = 0
+        bound = FIRST_BUCKET_US
+        while durationUs > bound and bucket < HISTOGRAM_BUCKETS - 1:
+            bound = bound << 1
+            bucket = bucket + 1
+        index = phase * HISTOGRAM_BUCKETS + bucket
+        if self._counts[index] < MAX_BUCKET_COUNT:
+            self._counts[index] = self._counts[index] + 1
+
+    def getCount(self, phase: int, bucket: int) -> int:
+        return self._counts[phase * HISTOGRAM_BUCKETS + bucket]
+
+    @staticmethod
+    def getBucketBound(bucket: int) -> int:
+        """Upper bound of bucket in microseconds, last bucket holds also all longer times"""
+        return FIRST_BUCKET_US << bucket
+
+    def percentile(self, phase: int, percent: int) -> int:
+        """
+        :return: upper bound of bucket, which holds given percentile of phase times in microseconds,
+                 0 if phase was not timed yet
+        """
+        total = 0
+        for bucket in range(HISTOGRAM_BUCKETS):
+            total = total + self.getCount(phase, bucket)
+        if total == 0:
+            return 0
+        wanted = (total * percent + 99) // 100
+        seen = 0
+        for bucket in range(HISTOGRAM_BUCKETS):
+            seen = seen + self.getCount(phase, bucket)
+            if seen >= wanted:
+                return self.getBucketBound(bucket)
+        return self.getBucketBound(HISTOGRAM_BUCKETS - 1)
+
+    def pack(self) -> bytes:
+        """Histograms in format described by METRICS_HEADER_FORMAT, e.g. for BLE characteristic"""
+        return struct.pack(METRICS_HEADER_FORMAT, self.completed & 0xFFFF, self.abandoned & 0xFFFF,
+                           PHASE_COUNT, HISTOGRAM_BUCKETS) + bytes(self._counts)
+
+    def dump(self, write=print):
+        """
+        Writes percentiles of each phase
+
+        :param write: function called with each line, print by default to dump over serial console
+        """
+        write(f"completed={self.completed} abandoned={self.abandoned}")
+        for phase in range(PHASE_COUNT):
+            write(f"{PHASE_NAMES[phase]}: p50<={self.percentile(phase, 50)}us p99<={self.percentile(phase, 99)}us")
@@ -0,0 +1,87 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from micropython import const
+
+STALL_STARTUP_SAMPLES = const(5)
+STALL_LEARNING_SAMPLES = const(20)
+STALL_CONFIRMATIONS = const(2)
+
+
+class LoadStallDetector:
+    def __init__(self,
+                 sensitivity: float = 4.0,
+                 margin: int = 50,
+                 maxLoad: int = None,
+                 smoothing: float = 0.05,
+                 startupSamples: int = STALL_STARTUP_SAMPLES,
+                 confirmations: int = STALL_CONFIRMATIONS):
+        """
+        Detects jammed lock from motor load samples (servo load register or H-bridge current read with ADC).
+        For each direction of rotation it learns running average load and its average deviation, and reports
+        stall when load leaves learned envelope.
+
+        :param sensitivity: how many average deviations above average load is still normal load
+        :param margin: constant added to learned envelope, protects against too tight envelope
+        :param maxLoad: load which is always treated as stall, even before envelope is learned
+        :param smoothing: weight of new sample in running averages
+        :param startupSamples: samples ignored after motor start, as startup current is always high
+        :param confirmations: number of consecutive samples outside of envelope needed to report stall
+        """
+        self._sensitivity = sensitivity
+        self._margin = margin
+        self._maxLoad = maxLoad
+        self._smoothing = smoothing
+        self._startupSamples = startupSamples
+        self._confirmations = confirmations
+        self._average = [0.0, 0.0]
+        self._deviation = [0.0, 0.0]
+        self._learned = [0, 0]
+        self._index = 0
+        self._samples = 0
+        self._exceeded = 0
+
+    def start(self, direction: int):
+        """Must be called when motor starts rotating in given direction (1 or -1)"""
+        self._index = 0 if direction > 0 else 1
+        self._samples = 0
+        self._exceeded = 0
+
+    def sample(self, load: int) -> bool:
+        if load < 0:
+            load = -load
+        if self._maxLoad is not None and load >= self._maxLoad:
+            return True
+        self._samples = self._samples + 1
+        if self._samples <= self._startupSamples:
+            return False
+
+        i = self._index
+        if self._learned[i] >= STALL_LEARNING_SAMPLES \
+                and load > self._average[i] + self._sensitivity * self._deviation[i] + self._margin:
+            self._exceeded = self._exceeded + 1
+            return self._exceeded >= self._confirmations
+
+        self._exceeded = 0
+        self._learn(i, load)
+        return False
+
+    def getEnvelope(self, direction: int) -> float:
+        i = 0 if direction > 0 else 1
+        return self._average[i] + self._sensitivity * self._deviation[i] + self._margin
+
+    def _learn(self, i, load):
+        if self._learned[i] == 0:
+            self._average[i] = load
+        else:
+            self._average[i] = self._average[i] + self._smoothing * (load - self._average[i])
+            difference = load - self._average[i]
+            if difference < 0:
+                difference = -difference
+            self._deviation[i] = self._deviation[i] + self._smoothing * (difference - self._deviation[i])
+        self._learned[i] = self._learned[i] + 1
@@ -11,26 +11,65 @@ import time
 
 from machine import Pin
 
+from .calibration import LockCalibration, NO_NEUTRAL_POSITION
+from .coast_model import CoastModel
 from .lock_manipulator import *
-from ..helpers import PinLike, PinHelpers
-from ..rotation_detector.rotation_detector import RotationDetector
-
-LOCK_STOPPING_TIME = const(1.5)
-
+from .motion_recorder import *
+from .operation_timer import *
+from .step_timing import StepTimingModel
+from .zero_position_switch import ZeroPositionSwitch
+from ..helpers import PinLike
+from ..rotation_detector.rotation_detector import RotationDetector, TRIGGER_ROTATION_CHANGE
+
+# lock which did not move for this time after stop command is treated as standing still
+STANDSTILL_TIME_MS = const(150)
+# longest wait for lock to stand still after stop command
+MAX_STOPPING_TIME_MS = const(1500)
+
+# no movement timeout used until step timing is learned
 MOVE_DETECTION_TIMEOUT = const(2500)
 
+# commands waiting in pending command slot
+LOCK_COMMAND_NONE = const(0)
+LOCK_COMMAND_LOCK = const(1)
+LOCK_COMMAND_UNLOCK = const(2)
+
 
 class StartStopLockManipulator(LockManipulator):
     def __init__(self,
                  rotationDetector: RotationDetector,
-                 reedSwitchPin: PinLike):
+                 reedSwitchPin: PinLike,
+                 calibration: LockCalibration = None,
+                 coastModel: CoastModel = None,
+                 recorder: MotionRecorder = None,
+                 stepTiming: StepTimingModel = None,
+                 timer: OperationTimer = None):
+        """
+        :param calibration: optional calibration kept in flash, which lets init skip state determination
+                            sweep, when lock was left in confirmed state
+        :param coastModel: learns how far lock coasts after stop, so stop can be issued before target
+        :param recorder: optional recorder of motion timeline, used to profile operations
+        :param stepTiming: learns time between detector steps, which sets no movement timeout
+        :param timer: optional timer of operation phases, used to find where operation spends its time
+        """
         self._moveDetected = None
         self._detector = rotationDetector
         self._lock = asyncio.Lock()
         self._waitingLock = None
         self._task = None
         self._lastPosition = None
-        self._positionZeroPin = PinHelpers.pinLikeToInPin(reedSwitchPin, "reedSwitchPin", pull=Pin.PULL_UP)
+        self._rotationFlag = asyncio.ThreadSafeFlag()
+        self._zeroSwitch = ZeroPositionSwitch(reedSwitchPin)
+        self._homing = False
+        self._homingLatency = 0
+        self._calibration = calibration
+        self._coast = coastModel if coastModel is not None else CoastModel()
+        self._motionDirection = 0
+        self._recorder = recorder
+        self._pendingCommand = LOCK_COMMAND_NONE
+        self._steps = stepTiming if stepTiming is not None else StepTimingModel()
+        self._firstStep = False
+        self._timer = timer
         super().__init__()
 
     async def init(self, fullLockRotations: int = 2, initialState: int = LOCK_UNINITIALIZED,
@@ -38,11 +77,19 @@ class StartStopLockManipulator(LockManipulator):
         await self._lock.acquire()
         try:
             self._detector.init()
+            self._detector.irq(self._onRotationChange, TRIGGER_ROTATION_CHANGE)
+            self._zeroSwitch.init(self._onZeroPosition)
+            self._loadCalibration()
             if self._task:
                 self._task.cancel()
             self._task = None
             self._lastPosition = None
+            self._pendingCommand = LOCK_COMMAND_NONE
             await super().init(fullLockRotations, initialState, lockDirection)
+            if initialState != LOCK_UNINITIALIZED:
+                self._resetPosition()
+            if self._task is None:
+                self._detector.suspend()
         finally:
             self._lock.release()
 
@@ -61,17 +108,55 @@ class StartStopLockManipulator(LockManipulator):
             self._lock.release()
 
     async def unlock(self):
+        await self._request(LOCK_COMMAND_UNLOCK)
+
+    async def lock(self):
+        await self._request(LOCK_COMMAND_LOCK)
+
+    async def _request(self, command):
+        """
+        Stores command as pending one, replacing older pending command, and applies it as soon as lock is free.
+        Rotation task holds lock only for short checks, so command given during rotation reverses lock in flight,
+        while command given during stopping cuts recentering short. When several commands wait, only newest
+        one is applied.
+        """
+        if self._state == LOCK_ERROR:
+            raise RuntimeError("Lock error")
+        self._pendingCommand = command
+        if self._timer is not None:
+            self._timer.beginIfIdle()
+        # wakes up rotation task, so it sees pending command without waiting for next rotation change
+        self._rotationFlag.set()
         await self._lock.acquire()
         try:
-            if self._state == LOCK_ERROR:
-                raise RuntimeError("Lock error")
-            if self._state == LOCK_UNLOCKED \
-                    or self._state == LOCK_WORKING_UNLOCKING:
-                return
-            await self._innerUnlock()
+            self._mark(PHASE_LOCK_ACQUIRED)
+            await self._applyPendingCommand()
         finally:
             self._lock.release()
 
+    async def _applyPendingCommand(self):
+        command = self._pendingCommand
+        self._pendingCommand = LOCK_COMMAND_NONE
+        if command == LOCK_COMMAND_NONE:
+            # already applied together with newer command
+            return
+        if self._state == LOCK_ERROR:
+            raise RuntimeError("Lock error")
+        if command == LOCK_COMMAND_LOCK:
+            if self._state != LOCK_LOCKED and self._state != LOCK_WORKING_LOCKING:
+                await self._innerLock()
+        elif self._state != LOCK_UNLOCKED and self._state != LOCK_WORKING_UNLOCKING:
+            await self._innerUnlock()
+
+    def _commandPending(self) -> bool:
+        return self._pendingCommand != LOCK_COMMAND_NONE
+
+    def _otherCommandPending(self, reachedState) -> bool:
+        """Drops pending command, which asks for state lock has just reached, and tells if any other one waits"""
+        if self._pendingCommand == (LOCK_COMMAND_LOCK if reachedState == LOCK_LOCKED else LOCK_COMMAND_UNLOCK):
+            self._pendingCommand = LOCK_COMMAND_NONE
+        return self._commandPending()
+
     async def _innerUnlock(self):
         self._state = LOCK_WORKING_UNLOCKING
         await self._callStateCallback()
@@ -80,47 +165,54 @@ class StartStopLockManipulator(LockManipulator):
             self._task = asyncio.create_task(self._rotationTask())
 
     async def _rotateToUnlock(self):
+        await self._markStateUnconfirmed()
+        self._motionDirection = -self._direction
+        self._motionStarted()
         if self._direction == LOCK_DIRECTION_COUNTERCLOCKWISE:
             self._detector.setDirection(1)
+            self._record(MOTION_ROTATE_CLOCKWISE)
             await self._rotateClockwise()
         else:
             self._detector.setDirection(-1)
+            self._record(MOTION_ROTATE_COUNTERCLOCKWISE)
             await self._rotateCounterClockwise()
+        self._mark(PHASE_MOTOR_STARTED)
 
-    async def lock(self):
-        await self._lock.acquire()
-        try:
-            if self._state == LOCK_ERROR:
-                raise RuntimeError("Lock error")
-            if self._state == LOCK_LOCKED \
-                    or self._state == LOCK_WORKING_LOCKING:
-                return
-            self._state = LOCK_WORKING_LOCKING
-            await self._callStateCallback()
-            await self._rotateToLock()
-            if self._task is None:
-                self._task = asyncio.create_task(self._rotationTask())
-        finally:
-            self._lock.release()
+    async def _innerLock(self):
+        self._state = LOCK_WORKING_LOCKING
+        await self._callStateCallback()
+        await self._rotateToLock()
+        if self._task is None:
+            self._task = asyncio.create_task(self._rotationTask())
 
     async def _rotateToLock(self):
+        await self._markStateUnconfirmed()
+        self._motionDirection = self._direction
+        self._motionStarted()
         if self._direction == LOCK_DIRECTION_COUNTERCLOCKWISE:
             self._detector.setDirection(-1)
+            self._record(MOTION_ROTATE_COUNTERCLOCKWISE)
             await self._rotateCounterClockwise()
         else:
             self._detector.setDirection(1)
+            self._record(MOTION_ROTATE_CLOCKWISE)
             await self._rotateClockwise()
+        self._mark(PHASE_MOTOR_STARTED)
 
     async def _rotationTask(self):
         await self._updateLastPositionChange()
         while True:
-            await asyncio.sleep(0.01)
+            await self._waitForRotation()
 
             if (await self._detectHardwareStalled()
                     or await self._detectNotMoving()):
                 await self._markError(LOCK_ERROR_STALLED)
                 break
 
+            await self._updateSpeed()
+
+            # changes reported before this point are already visible in position read below
+            self._rotationFlag.clear()
             if self._lastPosition == self._detector.getCurrentRotations():
                 continue
 
@@ -132,39 +224,264 @@ class StartStopLockManipulator(LockManipulator):
 
             await self._lock.acquire()
             try:
-                if self._lastPosition == 0 and self._state == LOCK_WORKING_LOCKING:
+                # stop is issued early by distance lock is expected to coast after it
+                finished = self._remainingRotations() <= self._coast.getCoast(self._motionDirection)
+                if finished:
+                    self._mark(PHASE_TARGET_REACHED)
+                if self._state == LOCK_WORKING_LOCKING and finished:
                     await self._markFinished(LOCK_LOCKED)
                     break
-                if self._state == LOCK_WORKING_UNLOCKING and self._abs(self._lastPosition) >= self._targetRotations:
+                if self._state == LOCK_WORKING_UNLOCKING and finished:
                     await self._markFinished(LOCK_UNLOCKED)
                     break
             finally:
                 self._lock.release()
 
-    async def _updateLastPositionChange(self):
+    def _onRotationChange(self, trigger, degrees):
+        # called from detector IRQ, so only wake up waiting task and mark time of first movement
+        if self._timer is not None:
+            self._timer.markMovement()
+        self._rotationFlag.set()
+
+    def _onZeroPosition(self):
+        # called from reed switch IRQ
+        if self._homing:
+            self._homing = False
+            self._stopFromIrq()
+        self._rotationFlag.set()
+
+    def _stopFromIrq(self):
+        """
+        Stops motor directly in IRQ context, when hardware allows it without awaiting. Must not allocate memory.
+        """
+        pass
+
+    def getRecorder(self) -> MotionRecorder:
+        """Recorder of motion timeline, None if recording was not enabled"""
+        return self._recorder
+
+    def getTimer(self) -> OperationTimer:
+        """Timer of operation phases, None if timing was not enabled"""
+        return self._timer
+
+    def _mark(self, phase):
+        if self._timer is not None:
+            self._timer.mark(phase)
+
+    def _record(self, command):
+        if self._recorder is not None:
+            self._recorder.record(self._detector.getCurrentRotations(), command, self._state)
+
+    async def _callStateCallback(self):
+        self._record(MOTION_STATE_CHANGE)
+        await super()._callStateCallback()
+
+    async def _stop(self):
+        self._record(MOTION_STOP)
+        await self._stopLock()
+
+    def getHomingLatency(self) -> int:
+        """Microseconds between magnet reaching reed switch and stop command during last homing"""
+        return self._homingLatency
+
+    async def _stopAtZeroPosition(self):
+        self._homing = False
+        await self._stop()
+        if self._zeroSwitch.hasEdge():
+            self._homingLatency = time.ticks_diff(time.ticks_us(), self._zeroSwitch.getEdgeTime())
+
+    async def _waitForZeroPosition(self, timeoutMs, reachedState):
+        """Waits until magnet reaches reed switch, timeout passes or command leaving reachedState is given"""
+        start = time.ticks_ms()
+        while True:
+            # reed switch IRQ and new commands set this flag, so it is cleared before checking them
+            self._rotationFlag.clear()
+            if self._zeroSwitch.triggered() or self._otherCommandPending(reachedState):
+                return
+            remaining = timeoutMs - time.ticks_diff(time.ticks_ms(), start)
+            if remaining <= 0:
+                return
+            await self._waitForChange(remaining)
+
+    def _supervisionInterval(self):
+        """
+        Milliseconds between hardware checks during rotation, when detector does not report any change,
+        None if only rotation changes and no movement timeout have to be watched
+        """
+        return None
+
+    async def _waitForRotation(self):
+        """Sleeps until detector reports rotation change, hardware check is due or movement timeout passes"""
+        await self._waitForChange(
+            time.ticks_diff(time.ticks_add(self._moveDetected, self._moveTimeout()), time.ticks_ms()))
+
+    def _moveTimeout(self) -> int:
+        """Milliseconds without detector step, after which lock is treated as not moving"""
+        timeout = self._steps.getTimeout(self._motionDirection, self._firstStep)
+        return MOVE_DETECTION_TIMEOUT if timeout is None else timeout
+
+    def _motionStarted(self):
+        self._detector.resume()
+        # steps are timed from rotate command, so time spent standing still before it is not learned
+        self._firstStep = True
         self._moveDetected = time.ticks_ms()
         self._lastPosition = self._detector.getCurrentRotations()
 
+    async def _waitForChange(self, timeoutMs):
+        interval = self._supervisionInterval()
+        poll = self._detector.getPollInterval()
+        if poll is not None and (interval is None or poll < interval):
+            interval = poll
+        if interval is not None and interval < timeoutMs:
+            timeoutMs = interval
+        if timeoutMs <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._rotationFlag.wait(), timeoutMs / 1000)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _waitForStandstill(self, learn: bool = False) -> float:
+        """
+        Waits after stop command until detector reports no movement for STANDSTILL_TIME_MS
+
+        :param learn: True to teach coast model, it should be used only for stops at usual speed
+        :return: rotations made after stop command
+        """
+        direction = self._motionDirection
+        settleTime = self._coast.getSettleTime(direction)
+        limit = MAX_STOPPING_TIME_MS
+        if settleTime is not None and 2 * settleTime + STANDSTILL_TIME_MS < limit:
+            limit = 2 * settleTime + STANDSTILL_TIME_MS
+        start = time.ticks_ms()
+        lastMove = start
+        stopPosition = position = self._detector.getCurrentRotations()
+        while True:
+            self._rotationFlag.clear()
+            await self._updatePosition()
+            now = time.ticks_ms()
+            if position != self._detector.getCurrentRotations():
+                position = self._detector.getCurrentRotations()
+                lastMove = now
+                self._record(MOTION_POSITION)
+            elif time.ticks_diff(now, lastMove) >= STANDSTILL_TIME_MS or time.ticks_diff(now, start) >= limit:
+                break
+            await self._waitForChange(STANDSTILL_TIME_MS - time.ticks_diff(now, lastMove))
+        if learn:
+            self._coast.record(direction, position - stopPosition, time.ticks_diff(lastMove, start))
+        return position - stopPosition
+
+    def _remainingRotations(self):
+        # unlocking rotates against lock direction, so its progress is position measured against lock direction
+        progress = -self._direction * self._detector.getCurrentRotations()
+        if self._state == LOCK_WORKING_LOCKING:
+            return progress
+        return self._targetRotations - self._abs(progress)
+
+    async def _updateLastPositionChange(self):
+        now = time.ticks_ms()
+        position = self._detector.getCurrentRotations()
+        if self._lastPosition is not None and position != self._lastPosition and self._moveDetected is not None:
+            self._steps.record(self._motionDirection, self._firstStep, time.ticks_diff(now, self._moveDetected))
+            self._firstStep = False
+        self._moveDetected = now
+        self._lastPosition = position
+        self._record(MOTION_POSITION)
+
     async def _markFinished(self, newState):
-        await self._stopLock()
-        await self._recenterLock(newState == LOCK_LOCKED)
+        await self._stop()
+        self._mark(PHASE_STOP_ISSUED)
+        await self._waitForStandstill(True)
+        await self._recenterLock(newState == LOCK_LOCKED, newState)
+        self._mark(PHASE_RECENTER_DONE)
+        # detector is not needed until next rotation, which resumes it
+        self._detector.suspend()
         self._state = newState
         self._task = None
+        await self._storeState(newState)
+        # finished before callback, so callback already sees this operation in histograms
+        if self._timer is not None:
+            self._timer.finish()
         await self._callStateCallback()
 
     async def _markError(self, error):
         await self._lock.acquire()
         try:
-            await self._stopLock()
-            self._state = LOCK_ERROR
-            self._error = (0 if self._error is None else self._error) | error
-            self._task = None
-            await self._callStateCallback()
+            await self._stop()
+            await self._applyError(error)
         finally:
             self._lock.release()
 
+    async def _applyError(self, error):
+        self._homing = False
+        if self._timer is not None:
+            self._timer.cancel()
+        self._state = LOCK_ERROR
+        self._error = (0 if self._error is None else self._error) | error
+        self._task = None
+        self._detector.suspend()
+        await self._storeState(LOCK_UNINITIALIZED)
+        await self._callStateCallback()
+
+    async def _markStateUnconfirmed(self):
+        # stored state stops being trustworthy once lock moves, so it is marked before motor starts,
+        # flash is written only by first rotation of operation, as RAM copy is unconfirmed after it
+        await self._storeState(LOCK_UNINITIALIZED)
+
+    def _loadCalibration(self):
+        """Reads stored calibration, so state kept in RAM always matches one in flash"""
+        calibration = self._calibration
+        if calibration is not None and not calibration.load():
+            calibration.state = LOCK_UNINITIALIZED
+
+    async def _storeState(self, state):
+        """Keeps confirmed lock state in calibration, LOCK_UNINITIALIZED marks state as not trustworthy"""
+        calibration = self._calibration
+        if calibration is None or (state == LOCK_UNINITIALIZED and calibration.state == state):
+            return
+        calibration.targetRotations = self._targetRotations
+        calibration.direction = self._direction
+        calibration.state = state
+        if state != LOCK_UNINITIALIZED:
+            calibration.neutralPosition = await self._neutralPosition()
+        try:
+            calibration.save()
+        except OSError as error:
+            print("Cannot store lock calibration: " + str(error))
+
+    async def _restoreState(self) -> bool:
+        """
+        Restores confirmed lock state from calibration, when lock still rests in neutral position
+
+        :return: False if state must be determined by rotating lock
+        """
+        calibration = self._calibration
+        if calibration is None or not calibration.matches(self._targetRotations, self._direction):
+            return False
+        if not self._zeroSwitch.isClosed() or not await self._isNeutralPosition(calibration.neutralPosition):
+            return False
+        self._state = calibration.state
+        self._resetPosition()
+        await self._callStateCallback()
+        return True
+
+    def _resetPosition(self):
+        """Sets detector to position of confirmed state, locked lock is at 0 rotations"""
+        if self._state == LOCK_UNLOCKED:
+            self._detector.setCurrentDegree(-self._direction * self._targetRotations * 360)
+        else:
+            self._detector.resetCurrentDegree()
+
+    async def _neutralPosition(self) -> int:
+        """Absolute position reported by hardware in neutral position, NO_NEUTRAL_POSITION if not available"""
+        return NO_NEUTRAL_POSITION
+
+    async def _isNeutralPosition(self, neutralPosition: int) -> bool:
+        """Checks if hardware is in stored neutral position, when it can tell"""
+        return True
+
     async def _detectNotMoving(self):
-        return self._moveDetected + MOVE_DETECTION_TIMEOUT < time.ticks_ms()
+        return time.ticks_diff(time.ticks_ms(), self._moveDetected) >= self._moveTimeout()
 
     @staticmethod
     def _abs(value):
@@ -175,6 +492,13 @@ class StartStopLockManipulator(LockManipulator):
     async def _detectHardwareStalled(self):
         ...
 
+    async def _updatePosition(self):
+        """Refreshes detector, when it is fed by manipulator instead of IRQ"""
+        ...
+
+    async def _updateSpeed(self):
+        ...
+
     async def _rotateCounterClockwise(self):
         ...
 
@@ -186,54 +510,73 @@ class StartStopLockManipulator(LockManipulator):
 
     async def determineState(self):
         await super().determineState()
+        if await self._restoreState():
+            return
         self._detector.resetCurrentDegree()
 
         await self._updateLastPositionChange()
 
         await self._rotateToLock()
-        while self._abs(self._detector.getCurrentRotations()) < self._targetRotations \
-                and not (await self._detectHardwareStalled() or await self._detectNotMoving()):
-            await asyncio.sleep(0.005)
+        while not (await self._detectHardwareStalled() or await self._detectNotMoving()):
+            await self._updateSpeed()
+            self._rotationFlag.clear()
             if self._lastPosition != self._detector.getCurrentRotations():
                 await self._updateLastPositionChange()
-        await self._stopLock()
-
-        await asyncio.sleep(LOCK_STOPPING_TIME)  # give time to fully stop
+            if self._abs(self._lastPosition) >= self._targetRotations:
+                break
+            await self._waitForRotation()
+        await self._stop()
+        overshoot = self._abs(await self._waitForStandstill())
         madeRotations = self._abs(self._detector.getCurrentRotations())
 
         self._detector.resetCurrentDegree()
+        self._zeroSwitch.arm()
+        self._homing = True
         await self._rotateToUnlock()
-        while self._abs(self._detector.getCurrentRotations()) < 1 \
-                and not (await self._detectHardwareStalled() or await self._detectNotMoving()) \
-                and self._positionZeroPin.value() == 1:
-            await asyncio.sleep(0.005)
+        while not (await self._detectHardwareStalled() or await self._detectNotMoving()):
+            self._rotationFlag.clear()
+            if self._zeroSwitch.triggered():
+                break
             if self._lastPosition != self._detector.getCurrentRotations():
                 await self._updateLastPositionChange()
+            if self._abs(self._lastPosition) >= 1:
+                break
+            await self._waitForRotation()
 
-        await self._stopLock()
+        await self._stopAtZeroPosition()
+        await self._waitForStandstill()
         if self._abs(self._detector.getCurrentRotations()) > 1:
             raise RuntimeError("Cannot find neutral position of lock")
 
-        await self._recenterLock(False)
+        await self._recenterLock(False, LOCK_LOCKED)
 
         self._state = LOCK_LOCKED
         self._detector.resetCurrentDegree()
+        if self._calibration is not None:
+            self._calibration.madeRotations = madeRotations
+            self._calibration.overshoot = overshoot
+        await self._storeState(LOCK_LOCKED)
         await self._callStateCallback()
 
         if madeRotations >= self._targetRotations - 0.5:
             await self._innerUnlock()
 
-    async def _recenterLock(self, forLocking):
-        await asyncio.sleep(LOCK_STOPPING_TIME)
+    async def _recenterLock(self, forLocking, reachedState):
+        """
+        Rotates lock back to neutral position, unless pending command is going to rotate it anyway.
+        Repeated command for reachedState is dropped, as lock is already where it wants it.
+        """
         toggle = -1 if forLocking else 1
-        while self._positionZeroPin.value() == 1:
+        while not self._zeroSwitch.isClosed() and not self._otherCommandPending(reachedState):
             toggle = toggle * -1
+            self._zeroSwitch.arm()
+            self._homing = True
             if toggle == -1:
                 await self._rotateToLock()
             else:
                 await self._rotateToUnlock()
-            while self._positionZeroPin.value() == 1:
-                await asyncio.sleep(0.001)
-            await self._stopLock()
-            await asyncio.sleep(LOCK_STOPPING_TIME)
-        await self._stopLock()
+            # when magnet is not found in time, direction is toggled again
+            await self._waitForZeroPosition(MOVE_DETECTION_TIMEOUT, reachedState)
+            await self._stopAtZeroPosition()
+            await self._waitForStandstill()
+        await self._stop()
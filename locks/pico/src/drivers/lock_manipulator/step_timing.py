@@ -0,0 +1,92 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from micropython import const
+
+MIN_MOVE_TIMEOUT_MS = const(250)
+MAX_MOVE_TIMEOUT_MS = const(5000)
+# learned timeout is used only after this many intervals were seen
+MIN_STEP_SAMPLES = const(5)
+# weight of deviation in expected interval, same as in TCP retransmission timeout
+DEVIATION_WEIGHT = const(4)
+
+
+class StepTimingModel:
+    def __init__(self,
+                 multiplier: float = 3.0,
+                 floorMs: int = MIN_MOVE_TIMEOUT_MS,
+                 ceilingMs: int = MAX_MOVE_TIMEOUT_MS,
+                 smoothing: float = 0.125):
+        """
+        Learns time between rotation detector steps separately for each direction. First step after rotate
+        command includes motor start, so it is learned apart from steps of running motor.
+        No movement timeout follows from running average and mean deviation of intervals.
+
+        :param multiplier: how many times longer than expected interval lock can go without step
+        :param floorMs: shortest timeout, it covers timer resolution and scheduling delays
+        :param ceilingMs: longest timeout, even if lock moved that slowly before
+        :param smoothing: weight of new interval in running averages
+        """
+        if smoothing <= 0 or smoothing > 1:
+            raise ValueError("smoothing must be in (0, 1]")
+        if multiplier < 1:
+            raise ValueError("multiplier must be at least 1")
+        if floorMs > ceilingMs:
+            raise ValueError("floorMs must not be greater than ceilingMs")
+        self._multiplier = multiplier
+        self._floor = floorMs
+        self._ceiling = ceilingMs
+        self._smoothing = smoothing
+        # indexed by _index, clockwise and counterclockwise for running motor and for its start
+        self._mean = [0.0, 0.0, 0.0, 0.0]
+        self._deviation = [0.0, 0.0, 0.0, 0.0]
+        self._samples = [0, 0, 0, 0]
+
+    def record(self, direction: int, starting: bool, intervalMs: int):
+        """
+        :param direction: direction of rotation (1 or -1)
+        :param starting: True for interval between rotate command and first step
+        :param intervalMs: time from previous step or rotate command
+        """
+        i = self._index(direction, starting)
+        if self._samples[i] == 0:
+            self._mean[i] = intervalMs
+            self._deviation[i] = intervalMs / 2
+        else:
+            difference = intervalMs - self._mean[i]
+            self._mean[i] = self._mean[i] + self._smoothing * difference
+            if difference < 0:
+                difference = -difference
+            self._deviation[i] = self._deviation[i] + self._smoothing * (difference - self._deviation[i])
+        self._samples[i] = self._samples[i] + 1
+
+    def getExpectedInterval(self, direction: int, starting: bool = False) -> int:
+        """Milliseconds between steps, which are rarely exceeded, None until enough steps were seen"""
+        i = self._index(direction, starting)
+        if self._samples[i] < MIN_STEP_SAMPLES:
+            return None
+        return int(self._mean[i] + DEVIATION_WEIGHT * self._deviation[i] + 0.5)
+
+    def getTimeout(self, direction: int, starting: bool = False) -> int:
+        """
+        :return: milliseconds without step, after which lock is treated as not moving,
+                 None until enough steps were seen
+        """
+        expected = self.getExpectedInterval(direction, starting)
+        if expected is None:
+            return None
+        timeout = int(self._multiplier * expected)
+        if timeout < self._floor:
+            return self._floor
+        if timeout > self._ceiling:
+            return self._ceiling
+        return timeout
+
+    @staticmethod
+    def _index(direction, starting):
+        return (0 if direction > 0 else 1) + (2 if starting else 0)
@@ -6,125 +6,210 @@
 #   You may obtain a copy of the License at                                    -
 #   http://www.apache.org/licenses/LICENSE-2.0                                 -
 # ------------------------------------------------------------------------------
-import struct
-
 from machine import UART
 
+from .calibration import LockCalibration, NO_NEUTRAL_POSITION
+from .coast_model import CoastModel
+from .motion_recorder import MotionRecorder
+from .operation_timer import OperationTimer
+from .step_timing import StepTimingModel
+from .motion_profile import TrapezoidalProfile
+from .stall_detector import LoadStallDetector
 from .startstop_manipulator import *
+from ..rotation_detector.servo_encoder_detector import ServoEncoderRotationDetector, POSITIONS_PER_ROTATION
+from ..scservo.bus import ScServoBus
+from ..scservo.protocol import *
+from ..scservo.registers import ShadowRegisters
+from ..scservo.telemetry import ServoTelemetry, TELEMETRY_LENGTH, SPEED_DIRECTION_BIT
+from ..scservo.transport import NO_RESPONSE
 
-PING_INSTRUCTION = const(0x01)
-READ_INSTRUCTION = const(0x02)
-WRITE_INSTRUCTION = const(0x03)
+SERVO_ID = const(1)
+# servo reports load in 0.1% of maximal torque
+SERVO_MAX_LOAD = const(1000)
 
-MOTOR_MODE_MEMORY_ADDR = const(9)
-TIME_MEMORY_ADDR = const(44)
+STOP_RETRIES = const(10)
+# encoder position, load and speed profile are refreshed with telemetry read in this interval
+TELEMETRY_INTERVAL_MS = const(10)
+# encoder positions of POSITIONS_PER_ROTATION resolution, by which servo can differ from stored neutral position
+# and still be treated as in it
+NEUTRAL_POSITION_TOLERANCE = const(50)
 
-SERVO_ID = const(1)
+# position of register address and first data byte in encoded write frame
+WRITE_FRAME_ADDRESS = const(5)
+WRITE_FRAME_DATA = const(6)
+
+# speed is written into high byte of goal time register, which also holds direction bit
+CLOCKWISE_SPEED = const(112)
+COUNTER_CLOCKWISE_SPEED = const(40)
+CLOCKWISE_SPEED_BYTE = const(SPEED_DIRECTION_BIT >> 8)
 
 
 class WaveshareScServoLockManipulator(StartStopLockManipulator):
     def __init__(self,
-                 communication: UART,
-                 rotationDetector: RotationDetector,
-                 reedSwitchPin: PinLike):
-        super().__init__(rotationDetector, reedSwitchPin)
-        self.uart = communication
-
-    @staticmethod
-    def controlSum(data):
-        sum = 0
-        for arg in data:
-            sum = sum + arg
-        return (~sum) & 0xff
-
-    @staticmethod
-    def message(data):
-        buf = [0xFF, 0xFF]
-        for arg in data:
-            buf.append(arg)
-        buf.append(WaveshareScServoLockManipulator.controlSum(data))
-        return buf
-
-    def writeMessage(self, instruction, parameters=None):
-        if parameters is None:
-            parameters = []
-        length = 2 + len(parameters)
-        buffer = [SERVO_ID, length, instruction]
-        buffer = bytearray(self.message(buffer + parameters))
-        self.uart.read()
-        self.uart.write(buffer)
-        self.uart.flush()
-        time.sleep_us(1)
-        self.uart.read(len(buffer))
-
-    def readMessage(self, timeout=10):
-        endTime = time.ticks_ms() + timeout
-        while endTime > time.ticks_ms():
-            buff = self.uart.read(100)
-            if buff is None:
-                time.sleep_us(10)
-                continue
-            for i in range(0, len(buff) - 5):
-                if buff[i] != 0xff or buff[i + 1] != 0xff:
-                    continue
-                if buff[i + 2] != SERVO_ID:
-                    self.uart.read()
-                    return [], 0xff
-                (length, error) = struct.unpack_from(">BB", buff, i + 3)
-                checksum = self.uart.read(i + 3 + length)
-                buff = buff[i + 5:i + 3 + length]
-                calculatedChecksum = self.controlSum([SERVO_ID, length, error] + list(buff))
-                if checksum != calculatedChecksum:
-                    return buff, error & 0b10
-                return buff, error
-        return [], 0xff
+                 communication: UART | ScServoBus,
+                 rotationDetector: RotationDetector = None,
+                 reedSwitchPin: PinLike = 13,
+                 servoId: int = SERVO_ID,
+                 stallDetector: LoadStallDetector = None,
+                 motionProfile: TrapezoidalProfile = None,
+                 calibration: LockCalibration = None,
+                 coastModel: CoastModel = None,
+                 recorder: MotionRecorder = None,
+                 stepTiming: StepTimingModel = None,
+                 timer: OperationTimer = None):
+        if rotationDetector is None:
+            rotationDetector = ServoEncoderRotationDetector()
+        super().__init__(rotationDetector, reedSwitchPin, calibration, coastModel, recorder,
+                         stepTiming, timer)
+        self._encoderDetector = rotationDetector if isinstance(rotationDetector, ServoEncoderRotationDetector) \
+            else None
+        self._positionsPerRotation = POSITIONS_PER_ROTATION if self._encoderDetector is None \
+            else self._encoderDetector.getPositionsPerRotation()
+        bus = communication if isinstance(communication, ScServoBus) else ScServoBus(communication)
+        self._servo = bus.servo(servoId)
+        self._pingFrame = encodeFrame(servoId, PING_INSTRUCTION)
+        self._wheelModeFrame = encodeFrame(servoId, WRITE_INSTRUCTION, bytes((MOTOR_MODE_MEMORY_ADDR, 0, 0, 0, 0)))
+        self._telemetryFrame = encodeFrame(servoId, READ_INSTRUCTION,
+                                           bytes((PRESENT_POSITION_MEMORY_ADDR, TELEMETRY_LENGTH)))
+        self._counterClockwiseFrame = encodeFrame(servoId, WRITE_INSTRUCTION,
+                                                  bytes((TIME_MEMORY_ADDR, COUNTER_CLOCKWISE_SPEED, 0)))
+        self._clockwiseFrame = encodeFrame(servoId, WRITE_INSTRUCTION,
+                                           bytes((TIME_MEMORY_ADDR, CLOCKWISE_SPEED_BYTE | CLOCKWISE_SPEED, 0)))
+        self._stopFrame = encodeFrame(servoId, WRITE_INSTRUCTION, bytes((TIME_MEMORY_ADDR, 0, 0)))
+        self._telemetry = ServoTelemetry()
+        self._stallDetector = stallDetector if stallDetector is not None \
+            else LoadStallDetector(maxLoad=SERVO_MAX_LOAD)
+        self._profile = motionProfile if motionProfile is not None else TrapezoidalProfile()
+        self._rotationDirection = 0
+        self._motionStart = 0
+        self._speedParameters = bytearray((TIME_MEMORY_ADDR, 0, 0))
+        self._registers = ShadowRegisters()
+
+    async def _send(self, frame, priority: bool = False):
+        return await self._servo.transaction(frame, priority)
+
+    async def _write(self, frame, priority: bool = False) -> int:
+        """Sends precomputed write frame, unless servo already holds written values"""
+        address = frame[WRITE_FRAME_ADDRESS]
+        end = len(frame) - 1
+        if self._registers.matches(address, frame, WRITE_FRAME_DATA, end):
+            return 0
+        buff, error = await self._send(frame, priority)
+        if error == 0:
+            self._registers.update(address, frame, WRITE_FRAME_DATA, end)
+        else:
+            self._registers.invalidate()
+        return error
 
     async def init(self, fullLockRotations: int = 2, initialState: int = LOCK_UNINITIALIZED,
                    lockDirection: int = LOCK_DIRECTION_COUNTERCLOCKWISE) -> None:
-        self.writeMessage(PING_INSTRUCTION, [])
-        time.sleep_ms(1)
-        buff, error = self.readMessage()
+        self._registers.invalidate()
+        buff, error = await self._send(self._pingFrame)
         if error != 0:
             await self._markError(LOCK_ERROR_HARDWARE_FAILURE)
             raise RuntimeError("Servo do not respond")
-        self.writeMessage(WRITE_INSTRUCTION, [MOTOR_MODE_MEMORY_ADDR, 0, 0, 0, 0])
-        time.sleep_ms(1)
-        buff, error = self.readMessage()
+        error = await self._write(self._wheelModeFrame)
         if error != 0:
             await self._markError(LOCK_ERROR_HARDWARE_FAILURE)
             raise RuntimeError("Servo is broken. Cannot operate.")
 
         await super().init(fullLockRotations, initialState, lockDirection)
 
+    async def readTelemetry(self) -> ServoTelemetry:
+        """
+        Reads position, speed, load, voltage, temperature and moving flag in one bus round trip
+        """
+        data, error = await self._send(self._telemetryFrame)
+        self._telemetry.update(data, error)
+        if error == NO_RESPONSE:
+            # servo could have been restarted, so it may not hold written values anymore
+            self._registers.invalidate()
+        if self._encoderDetector is not None and self._telemetry.valid:
+            self._encoderDetector.updatePosition(self._telemetry.position)
+        return self._telemetry
+
+    def getTelemetry(self) -> ServoTelemetry:
+        return self._telemetry
+
+    async def _updatePosition(self):
+        await self.readTelemetry()
+
+    async def _neutralPosition(self) -> int:
+        telemetry = await self.readTelemetry()
+        return telemetry.position if telemetry.valid else NO_NEUTRAL_POSITION
+
+    async def _isNeutralPosition(self, neutralPosition: int) -> bool:
+        if neutralPosition == NO_NEUTRAL_POSITION:
+            return True
+        telemetry = await self.readTelemetry()
+        if not telemetry.valid:
+            return False
+        positions = self._positionsPerRotation
+        difference = self._abs(telemetry.position - neutralPosition)
+        if difference > positions // 2:
+            difference = positions - difference
+        return difference <= NEUTRAL_POSITION_TOLERANCE * positions // POSITIONS_PER_ROTATION
+
+    def _supervisionInterval(self):
+        return TELEMETRY_INTERVAL_MS
+
     async def _detectHardwareStalled(self):
-        self.writeMessage(READ_INSTRUCTION, [66, 1])
-        buff, error = self.readMessage()
-        return error != 0
+        telemetry = await self.readTelemetry()
+        if telemetry.error != 0:
+            return True
+        return telemetry.valid and self._stallDetector.sample(telemetry.load)
 
     async def _rotateCounterClockwise(self):
-        self.writeMessage(WRITE_INSTRUCTION, [TIME_MEMORY_ADDR, 40, 0])
-        buff, error = self.readMessage()
-        if error != 0:
-            await self._markError(LOCK_ERROR_HARDWARE_FAILURE)
-            raise RuntimeError("Servo is broken. Cannot operate.")
+        await self._rotate(-1, self._counterClockwiseFrame)
 
     async def _rotateClockwise(self):
-        self.writeMessage(WRITE_INSTRUCTION, [TIME_MEMORY_ADDR, 240, 0])
-        buff, error = self.readMessage()
+        await self._rotate(1, self._clockwiseFrame)
+
+    async def _rotate(self, direction, fullSpeedFrame):
+        self._stallDetector.start(direction)
+        self._rotationDirection = direction
+        self._motionStart = time.ticks_ms()
+        speed = self._profile.speed(0, self._remainingRotations())
+        if speed == 1.0:
+            error = await self._write(fullSpeedFrame)
+        else:
+            error = await self._writeSpeed(speed)
         if error != 0:
             await self._markError(LOCK_ERROR_HARDWARE_FAILURE)
             raise RuntimeError("Servo is broken. Cannot operate.")
 
+    async def _updateSpeed(self):
+        if self._profile.isConstant() or self._rotationDirection == 0:
+            return
+        # failed write is retried on next tick, missing servo is reported by stall detection
+        await self._writeSpeed(self._profile.speed(time.ticks_diff(time.ticks_ms(), self._motionStart),
+                                                   self._remainingRotations()))
+
+    async def _writeSpeed(self, speed: float) -> int:
+        if self._rotationDirection > 0:
+            value = int(CLOCKWISE_SPEED * speed + 0.5) | CLOCKWISE_SPEED_BYTE
+        else:
+            value = int(COUNTER_CLOCKWISE_SPEED * speed + 0.5)
+        if value & ~CLOCKWISE_SPEED_BYTE == 0:
+            value = value | 1
+        self._speedParameters[1] = value
+        if self._registers.matches(TIME_MEMORY_ADDR, self._speedParameters, 1):
+            return 0
+        buff, error = await self._servo.request(WRITE_INSTRUCTION, self._speedParameters)
+        if error == 0:
+            self._registers.update(TIME_MEMORY_ADDR, self._speedParameters, 1)
+        else:
+            self._registers.invalidate()
+        return error
+
     async def _stopLock(self):
+        self._rotationDirection = 0
         i = 0
-        while i < 10:  # really hard try to stop lock
+        while i < STOP_RETRIES:  # really hard try to stop lock
             i = i + 1
-            try:
-                self.writeMessage(WRITE_INSTRUCTION, [TIME_MEMORY_ADDR, 0, 0])
-                break
-            except Exception:
-                time.sleep_ms(1)
-        buff, error = self.readMessage()
-        if error != 0:
-            await self._markError(LOCK_ERROR_HARDWARE_FAILURE)
-            raise RuntimeError("Servo is broken. Cannot operate.")
+            error = await self._write(self._stopFrame, priority=True)
+            if error == 0:
+                return
+            await asyncio.sleep(0.001)
+        await self._applyError(LOCK_ERROR_HARDWARE_FAILURE)
+        raise RuntimeError("Servo is broken. Cannot operate.")
@@ -0,0 +1,73 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import time
+
+from machine import Pin
+from micropython import const
+
+from ..helpers import PinLike, PinHelpers
+
+# reed contacts bounce for few hundreds of microseconds after closing
+ZERO_SWITCH_DEBOUNCE_US = const(2000)
+
+
+class ZeroPositionSwitch:
+    def __init__(self,
+                 pin: PinLike,
+                 debounceUs: int = ZERO_SWITCH_DEBOUNCE_US):
+        """
+        Reed switch closed by magnet in neutral position of lock. Closing edge is handled in IRQ, which records
+        its time and calls handler, so even short pass of magnet is not missed and waiting for it does not need
+        polling.
+
+        :param pin: pin with reed switch connected to ground, internal pull up is used
+        :param debounceUs: edges closer to previous closing edge are treated as contact bounce
+        """
+        self._pin = PinHelpers.pinLikeToInPin(pin, "reedSwitchPin", pull=Pin.PULL_UP)
+        self._debounceUs = debounceUs
+        self._handler = None
+        self._edgeTime = time.ticks_us()
+        self._triggered = False
+
+    def init(self, handler=None):
+        """
+        :param handler: optional function called from IRQ on closing edge, it must not allocate memory
+        """
+        self._handler = handler
+        self._triggered = False
+        self._pin.init(Pin.IN, Pin.PULL_UP)
+        self._pin.irq(self._irq, trigger=Pin.IRQ_FALLING)
+
+    def isClosed(self) -> bool:
+        return self._pin.value() == 0
+
+    def arm(self):
+        """Forgets edges seen so far, so triggered reports only magnet passing from now on"""
+        self._triggered = False
+
+    def triggered(self) -> bool:
+        """True if switch is closed or magnet passed it since arm, even if switch is open again"""
+        return self._triggered or self.isClosed()
+
+    def hasEdge(self) -> bool:
+        """True if closing edge was seen since arm"""
+        return self._triggered
+
+    def getEdgeTime(self) -> int:
+        """time.ticks_us of last closing edge"""
+        return self._edgeTime
+
+    def _irq(self, pin):
+        now = time.ticks_us()
+        if self._triggered and time.ticks_diff(now, self._edgeTime) < self._debounceUs:
+            return
+        self._edgeTime = now
+        self._triggered = True
+        if self._handler is not None:
+            self._handler()
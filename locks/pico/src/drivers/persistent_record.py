@@ -0,0 +1,79 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import os
+import struct
+
+from micropython import const
+
+RECORD_HEADER = const(0x534C)  # "SL"
+RECORD_HEADER_FORMAT = "<HB"
+RECORD_CHECKSUM_FORMAT = "<H"
+
+
+def crc16(data) -> int:
+    """CRC-16/CCITT-FALSE of data"""
+    crc = 0xFFFF
+    for byte in data:
+        crc = crc ^ (byte << 8)
+        for i in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+class PersistentRecord:
+    def __init__(self, path: str, format: str, version: int = 1):
+        """
+        Single record of values stored in flash file with checksum. Record is written to temporary file and
+        renamed, so power loss during save leaves either old or new record, never a mix of both.
+
+        :param path: file in which record is stored
+        :param format: struct format of stored values, e.g. "<Bf"
+        :param version: version of stored values, record with other version is not loaded
+        """
+        self._path = path
+        self._format = format
+        self._version = version
+        self._size = struct.calcsize(RECORD_HEADER_FORMAT) + struct.calcsize(format) \
+            + struct.calcsize(RECORD_CHECKSUM_FORMAT)
+
+    def load(self):
+        """
+        :return: tuple of stored values, None if record is missing, corrupted or has other version
+        """
+        try:
+            with open(self._path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) != self._size:
+            return None
+        checksumStart = self._size - struct.calcsize(RECORD_CHECKSUM_FORMAT)
+        if struct.unpack_from(RECORD_CHECKSUM_FORMAT, data, checksumStart)[0] != crc16(data[:checksumStart]):
+            return None
+        header, version = struct.unpack_from(RECORD_HEADER_FORMAT, data, 0)
+        if header != RECORD_HEADER or version != self._version:
+            return None
+        return struct.unpack_from(self._format, data, struct.calcsize(RECORD_HEADER_FORMAT))
+
+    def save(self, *values):
+        data = struct.pack(RECORD_HEADER_FORMAT, RECORD_HEADER, self._version) + struct.pack(self._format, *values)
+        data = data + struct.pack(RECORD_CHECKSUM_FORMAT, crc16(data))
+        temporary = self._path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.rename(temporary, self._path)
+
+    def clear(self):
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
@@ -0,0 +1,173 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+
+import machine
+from micropython import const
+
+ACTIVE_FREQUENCY = const(125_000_000)
+# lowest frequency with exact 48 MHz USB clock, so serial console keeps working while idle
+IDLE_FREQUENCY = const(48_000_000)
+# time left to asyncio tasks between light sleeps, enough to handle BLE events gathered during sleep
+IDLE_AWAKE_MS = const(5)
+# short enough for wireless chip to keep BLE connection, longer sleeps have to be verified with board firmware
+LIGHT_SLEEP_MS = const(10)
+# lock stays awake for a while after operation, as next command or status read often follows soon
+SLEEP_DELAY_MS = const(5000)
+
+SUBSYSTEM_CPU_BASE = const(0)
+SUBSYSTEM_CPU_PER_MHZ = const(1)
+SUBSYSTEM_WIRELESS = const(2)
+SUBSYSTEM_DETECTOR = const(3)
+SUBSYSTEM_SERVO = const(4)
+SUBSYSTEM_LIGHT_SLEEP = const(5)
+SUBSYSTEM_COUNT = const(6)
+
+# rough values in mA from RP2040, Pico W and servo datasheets, they are not measured on lock hardware
+ESTIMATED_CURRENTS = (8.0, 0.12, 25.0, 1.0, 10.0, 1.5)
+
+
+class CurrentModel:
+    def __init__(self, currents: tuple = ESTIMATED_CURRENTS):
+        """
+        Sums current drawn by lock subsystems. Defaults are estimates taken from datasheets, not values measured
+        on lock hardware. Replace them with setCurrent once measured on your board, e.g. by comparing supply
+        current with subsystem on and off.
+
+        :param currents: mA drawn by each SUBSYSTEM_*, SUBSYSTEM_CPU_PER_MHZ is mA per MHz of system clock
+        """
+        if len(currents) != SUBSYSTEM_COUNT:
+            raise ValueError(f"currents must contain {SUBSYSTEM_COUNT} values")
+        self._currents = list(currents)
+        self._measured = 0
+
+    def setCurrent(self, subsystem: int, currentMa: float):
+        """Replaces estimate of subsystem with measured value"""
+        self._currents[subsystem] = currentMa
+        self._measured = self._measured | (1 << subsystem)
+
+    def getCurrent(self, subsystem: int) -> float:
+        return self._currents[subsystem]
+
+    def isMeasured(self, subsystem: int) -> bool:
+        return self._measured & (1 << subsystem) != 0
+
+    def estimate(self, frequency: int, detectorSampling: bool, lightSleepShare: float = 0.0) -> float:
+        """
+        :param frequency: system clock in Hz
+        :param detectorSampling: True if rotation detector samples periodically
+        :param lightSleepShare: part of time CPU spends in light sleep, from 0 to 1
+        :return: estimated average current in mA
+        """
+        cpu = self._currents[SUBSYSTEM_CPU_BASE] + self._currents[SUBSYSTEM_CPU_PER_MHZ] * frequency / 1_000_000
+        cpu = cpu * (1 - lightSleepShare) + self._currents[SUBSYSTEM_LIGHT_SLEEP] * lightSleepShare
+        current = cpu + self._currents[SUBSYSTEM_WIRELESS] + self._currents[SUBSYSTEM_SERVO]
+        if detectorSampling:
+            current = current + self._currents[SUBSYSTEM_DETECTOR]
+        return current
+
+
+class PowerManager:
+    def __init__(self,
+                 activeFrequency: int = ACTIVE_FREQUENCY,
+                 idleFrequency: int = IDLE_FREQUENCY,
+                 lightSleepMs: int = LIGHT_SLEEP_MS,
+                 sleepDelayMs: int = SLEEP_DELAY_MS,
+                 currentModel: CurrentModel = None):
+        """
+        Lowers system clock and light sleeps while lock does not move. Rotation detectors are
+        suspended by lock manipulator itself, as it knows exactly when rotation starts and ends.
+
+        Light sleep stops CPU together with asyncio, so BLE events are handled only between sleeps and command
+        waits up to lightSleepMs longer. Default sleeps are short and start only after lock is idle for
+        sleepDelayMs, longer sleeps have to be verified with firmware of your board, that wireless chip keeps
+        connection during them.
+
+        :param activeFrequency: system clock in Hz used during lock operation
+        :param idleFrequency: system clock in Hz used while idle
+        :param lightSleepMs: length of single light sleep while idle, 0 disables light sleep
+        :param sleepDelayMs: time after lock became idle, in which it does not sleep yet
+        :param currentModel: model used to estimate current drawn in each mode
+        """
+        if idleFrequency > activeFrequency:
+            raise ValueError("idleFrequency must not be greater than activeFrequency")
+        if lightSleepMs < 0:
+            raise ValueError("lightSleepMs must not be negative")
+        if sleepDelayMs < 0:
+            raise ValueError("sleepDelayMs must not be negative")
+        self._activeFrequency = activeFrequency
+        self._idleFrequency = idleFrequency
+        self._lightSleepMs = lightSleepMs
+        self._sleepDelayMs = sleepDelayMs
+        self._model = currentModel if currentModel is not None else CurrentModel()
+        self._listeners = []
+        self._idle = False
+        self._wake = asyncio.Event()
+
+    def addFrequencyListener(self, listener):
+        """
+        :param listener: function called with new frequency after system clock changes, e.g. to set UART baud
+                         rate again, as its divider is derived from system clock
+        """
+        self._listeners.append(listener)
+
+    def isIdle(self) -> bool:
+        return self._idle
+
+    def active(self):
+        """Restores full speed, called before lock starts operation"""
+        if not self._idle:
+            return
+        self._idle = False
+        self._wake.set()
+        self._setFrequency(self._activeFrequency)
+
+    def idle(self):
+        """Lowers power usage, called once lock finished operation"""
+        if self._idle:
+            return
+        self._idle = True
+        self._wake.set()
+        self._setFrequency(self._idleFrequency)
+
+    def _setFrequency(self, frequency):
+        if machine.freq() == frequency:
+            return
+        machine.freq(frequency)
+        for listener in self._listeners:
+            listener(frequency)
+
+    async def run(self):
+        """Light sleeps in slices while idle, other tasks run between slices"""
+        while True:
+            # mode changes set this event
+            self._wake.clear()
+            if not self._idle or self._lightSleepMs == 0:
+                await self._wake.wait()
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._sleepDelayMs / 1000)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            while self._idle:
+                machine.lightsleep(self._lightSleepMs)
+                await asyncio.sleep(IDLE_AWAKE_MS / 1000)
+
+    def getEstimatedCurrent(self) -> float:
+        """Current in mA estimated by current model for present mode"""
+        if not self._idle:
+            return self._model.estimate(self._activeFrequency, True)
+        sleepShare = 0.0
+        if self._lightSleepMs > 0:
+            sleepShare = self._lightSleepMs / (self._lightSleepMs + IDLE_AWAKE_MS)
+        return self._model.estimate(self._idleFrequency, False, sleepShare)
+
+    def getCurrentModel(self) -> CurrentModel:
+        return self._model
@@ -7,31 +7,90 @@
 #   http://www.apache.org/licenses/LICENSE-2.0                                 -
 # ------------------------------------------------------------------------------
 
-from machine import ADC, Timer
+from array import array
+
+import rp2
+from machine import ADC, Timer, mem32
 
 from .rotation_detector import *
+from .threshold_tracker import ThresholdTracker
 
 ADC_MAX_VALUE = const(55000.0)
 ADC_HIGH_VALUE = const(45000.0)
 ADC_LOW_VALUE = const(10000)
 STEPS_COUNT = const(18)
+SAMPLING_PERIOD_MS = const(5)
+
+BLOCK_SIZE = const(64)
+BLOCK_SAMPLE_RATE = const(2000)
+# GPIOs connected to ADC inputs 0 to 3
+ADC_FIRST_PIN = const(26)
+ADC_LAST_PIN = const(29)
+
+# RP2040 ADC registers used to stream samples through FIFO
+ADC_BASE = const(0x4004C000)
+ADC_CS = const(ADC_BASE + 0x00)
+ADC_FCS = const(ADC_BASE + 0x08)
+ADC_FIFO = const(ADC_BASE + 0x0C)
+ADC_DIV = const(ADC_BASE + 0x10)
+ADC_CS_EN = const(0x1)
+ADC_CS_START_MANY = const(0x8)
+ADC_CS_AINSEL_SHIFT = const(12)
+ADC_FCS_EN = const(0x1)
+ADC_FCS_DREQ_EN = const(0x8)
+ADC_FCS_EMPTY = const(0x100)
+ADC_FIFO_DEPTH = const(4)
+ADC_FCS_THRESH_SHIFT = const(24)
+ADC_DIV_INT_SHIFT = const(8)
+ADC_CLOCK = const(48_000_000)
+DREQ_ADC = const(36)
+# FIFO holds 12 bit samples, read_u16 scales them to 16 bits
+ADC_FIFO_SHIFT = const(4)
 
 
 class SteppingPhotoTransistorRotationDetector(RotationDetector):
     def __init__(self,
-                 pin: ADC):
+                 pin: ADC,
+                 thresholds: ThresholdTracker = None):
+        """
+        :param pin: ADC of phototransistor
+        :param thresholds: tracker, which learns thresholds from signal of this device,
+                           fixed ADC_HIGH_VALUE and ADC_LOW_VALUE are used if not given
+        """
         if pin is None or not isinstance(pin, ADC):
             raise ValueError("Pin must be valid ADC pin")
         self._pin = pin
         self._degreesChange = 360.0 / STEPS_COUNT
         self._previous = None
         self._timer = Timer()
+        self._sampling = False
+        self._high = ADC_HIGH_VALUE
+        self._low = ADC_LOW_VALUE
+        self._thresholds = thresholds
+        if thresholds is not None:
+            thresholds.load()
+            self._applyThresholds()
         super().__init__()
 
     def init(self):
-        self._timer.init(mode=Timer.PERIODIC, period=5, callback=self._irq)
+        self._timer.init(mode=Timer.PERIODIC, period=SAMPLING_PERIOD_MS, callback=self._irq)
+        self._sampling = True
         self._previous = None
 
+    def suspend(self) -> None:
+        if self._sampling:
+            self._timer.deinit()
+            self._sampling = False
+            self._saveThresholds()
+
+    def resume(self) -> None:
+        if not self._sampling:
+            # light level may have changed while suspended, so first sample only sets previous level
+            self.init()
+
+    def isSampling(self) -> bool:
+        return self._sampling
+
     def getCurrentRotations(self) -> float:
         return super().getCurrentRotations()
 
@@ -41,13 +100,152 @@ class SteppingPhotoTransistorRotationDetector(RotationDetector):
             return - value
         return value
 
+    def getThresholds(self) -> tuple:
+        """Low and high threshold of hysteresis in read_u16 values"""
+        return self._low, self._high
+
+    def _applyThresholds(self):
+        self._high = self._thresholds.getHigh()
+        self._low = self._thresholds.getLow()
+
+    def _saveThresholds(self):
+        # lock stands still while suspended, so flash write does not delay any step
+        if self._thresholds is not None:
+            self._thresholds.saveIfChanged()
+
     def _irq(self, timer):
+        value = self._pin.read_u16()
+        if self._thresholds is not None and self._thresholds.track(value, value):
+            self._applyThresholds()
         if self._previous is None:
-            self._previous = 1 if self._pin.read_u16() > ADC_HIGH_VALUE else 0
+            self._previous = 1 if value > self._high else 0
         else:
-            value = self._pin.read_u16()
-            if value > ADC_HIGH_VALUE and self._previous == 0:
+            if value > self._high and self._previous == 0:
                 self._updateDegrees(self._degreesChange)
                 self._previous = 1
-            elif value < ADC_LOW_VALUE and self._previous == 1:
+            elif value < self._low and self._previous == 1:
                 self._previous = 0
+
+    def _processBlock(self, samples, count: int, shift: int = 0):
+        """
+        Detects steps in block of samples in one pass and reports them with single position change
+
+        :param shift: bits samples are shifted right against read_u16 values
+        """
+        high = int(self._high) >> shift
+        low = int(self._low) >> shift
+        previous = self._previous
+        start = 0
+        if previous is None:
+            previous = 1 if samples[0] > high else 0
+            start = 1
+        steps = 0
+        lowest = highest = samples[0]
+        for i in range(start, count):
+            value = samples[i]
+            if previous == 0:
+                if value > high:
+                    steps = steps + 1
+                    previous = 1
+            elif value < low:
+                previous = 0
+            if value < lowest:
+                lowest = value
+            elif value > highest:
+                highest = value
+        self._previous = previous
+        # thresholds learned from this block are used from next one
+        if self._thresholds is not None and self._thresholds.track(lowest << shift, highest << shift, count):
+            self._applyThresholds()
+        if steps != 0:
+            self._updateDegrees(steps * self._degreesChange)
+
+
+class BlockSampledPhotoTransistorRotationDetector(SteppingPhotoTransistorRotationDetector):
+    def __init__(self,
+                 pin: int,
+                 blockSize: int = BLOCK_SIZE,
+                 sampleRate: int = BLOCK_SAMPLE_RATE,
+                 useDma: bool = True,
+                 thresholds: ThresholdTracker = None):
+        """
+        Samples phototransistor in blocks and detects steps in whole block at once. When firmware provides
+        rp2.DMA, ADC runs free at sampleRate and DMA moves its FIFO to two preallocated buffers in turns, so CPU
+        only processes full blocks. Steps are reported once per block, so position lags behind by up to
+        blockSize / sampleRate seconds. Without DMA detector polls ADC every SAMPLING_PERIOD_MS like
+        SteppingPhotoTransistorRotationDetector, as timer callback for each sample would cost more than it saves.
+
+        :param pin: GPIO number of phototransistor, 26 to 29, which selects ADC input
+        :param blockSize: number of samples processed together
+        :param sampleRate: samples per second
+        :param useDma: False to poll ADC even if DMA is available
+        :param thresholds: tracker, which learns thresholds from signal of this device
+        """
+        if pin < ADC_FIRST_PIN or pin > ADC_LAST_PIN:
+            raise ValueError(f"pin must be ADC capable GPIO between {ADC_FIRST_PIN} and {ADC_LAST_PIN}")
+        if blockSize < 1:
+            raise ValueError("blockSize must be at least 1")
+        if sampleRate < 1 or sampleRate > 500_000:
+            raise ValueError("sampleRate must be between 1 and 500000")
+        self._channel = pin - ADC_FIRST_PIN
+        self._blockSize = blockSize
+        self._sampleRate = sampleRate
+        self._dma = rp2.DMA() if useDma and hasattr(rp2, "DMA") else None
+        self._buffers = None
+        if self._dma is not None:
+            self._buffers = (array("H", bytes(2 * blockSize)), array("H", bytes(2 * blockSize)))
+        self._filled = 0
+        super().__init__(ADC(pin), thresholds)
+
+    def init(self):
+        if self._dma is None:
+            super().init()
+            return
+        self._previous = None
+        self._startAdcStream()
+        self._sampling = True
+
+    def suspend(self) -> None:
+        if self._dma is None:
+            super().suspend()
+            return
+        if not self._sampling:
+            return
+        self._stopAdcStream()
+        self._sampling = False
+        self._saveThresholds()
+
+    def usesDma(self) -> bool:
+        return self._dma is not None
+
+    def _startAdcStream(self):
+        mem32[ADC_CS] = ADC_CS_EN | (self._channel << ADC_CS_AINSEL_SHIFT)
+        mem32[ADC_DIV] = (ADC_CLOCK // self._sampleRate - 1) << ADC_DIV_INT_SHIFT
+        mem32[ADC_FCS] = ADC_FCS_EN | ADC_FCS_DREQ_EN | (1 << ADC_FCS_THRESH_SHIFT)
+        # samples left from before would shift first block, FIFO holds at most ADC_FIFO_DEPTH of them
+        for i in range(ADC_FIFO_DEPTH):
+            if mem32[ADC_FCS] & ADC_FCS_EMPTY:
+                break
+            mem32[ADC_FIFO]
+        self._dmaControl = self._dma.pack_ctrl(size=1, inc_read=False, treq_sel=DREQ_ADC)
+        self._dma.irq(self._blockFilled)
+        self._filled = 0
+        self._startDma()
+        mem32[ADC_CS] = ADC_CS_EN | ADC_CS_START_MANY | (self._channel << ADC_CS_AINSEL_SHIFT)
+
+    def _startDma(self):
+        self._dma.config(read=ADC_FIFO, write=self._buffers[self._filled], count=self._blockSize,
+                         ctrl=self._dmaControl, trigger=True)
+
+    def _stopAdcStream(self):
+        mem32[ADC_CS] = ADC_CS_EN | (self._channel << ADC_CS_AINSEL_SHIFT)
+        self._dma.irq(None)
+        self._dma.active(0)
+        mem32[ADC_FCS] = 0
+
+    def _blockFilled(self, dma):
+        full = self._buffers[self._filled]
+        # ADC FIFO holds next samples, while DMA is pointed to other buffer
+        self._filled = 1 - self._filled
+        self._startDma()
+        self._processBlock(full, self._blockSize, ADC_FIFO_SHIFT)
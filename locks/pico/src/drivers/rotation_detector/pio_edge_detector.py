@@ -0,0 +1,106 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import rp2
+from machine import Pin
+
+from .rotation_detector import *
+from ..helpers import PinLike, PinHelpers
+
+# one PIO cycle per microsecond, so debounce time in microseconds is number of delay loop cycles
+PIO_FREQUENCY = const(1_000_000)
+PIO_DEBOUNCE_US = const(2000)
+POLL_INTERVAL_MS = const(10)
+
+
+@rp2.asm_pio()
+def _countEdges():
+    # debounce delay is put to TX FIFO before start and kept in OSR, X counts edges down from 0,
+    # as PIO can only decrement and single instruction keeps X valid whenever Python reads it
+    pull()
+    mov(x, null)
+    wrap_target()
+    wait(0, pin, 0)
+    jmp(x_dec, "decremented")
+    label("decremented")
+    # contacts bounce after closing
+    mov(y, osr)
+    label("closed")
+    jmp(y_dec, "closed")
+    wait(1, pin, 0)
+    # and after opening too
+    mov(y, osr)
+    label("opened")
+    jmp(y_dec, "opened")
+    wrap()
+
+
+class PioEdgeCounterDetector(RotationDetector):
+    def __init__(self,
+                 pin: PinLike,
+                 edgesPerRotation: int = 1,
+                 debounceUs: int = PIO_DEBOUNCE_US,
+                 stateMachineId: int = 0,
+                 pollIntervalMs: int = POLL_INTERVAL_MS):
+        """
+        Counts falling edges of digital rotation sensor in PIO state machine, which also debounces them.
+        It works with reed switches and with phototransistors connected through comparator or read as plain
+        GPIO input. Python does not handle any interrupt, count is read from state machine only when position
+        is asked for, so no edge is missed even at fast rotation.
+
+        :param pin: pin with sensor pulling it to ground on each step, internal pull up is used
+        :param edgesPerRotation: number of falling edges per one full rotation
+        :param debounceUs: time after each edge, in which sensor changes are ignored
+        :param stateMachineId: PIO state machine used for counting, it must not be used by anything else
+        :param pollIntervalMs: how often manipulator should read position during rotation
+        """
+        if edgesPerRotation < 1:
+            raise ValueError("edgesPerRotation must be at least 1")
+        self._pin = PinHelpers.pinLikeToInPin(pin, "pin", Pin.PULL_UP)
+        self._degreesChange = 360.0 / edgesPerRotation
+        self._debounceCycles = debounceUs * PIO_FREQUENCY // 1_000_000
+        self._pollInterval = pollIntervalMs
+        self._stateMachine = rp2.StateMachine(stateMachineId)
+        # instructions executed from Python are encoded once, so reading count does not allocate
+        self._readCountInstruction = rp2.asm_pio_encode("mov(isr, x)", 0)
+        self._pushInstruction = rp2.asm_pio_encode("push()", 0)
+        self._count = 0
+        super().__init__()
+
+    def init(self):
+        stateMachine = self._stateMachine
+        stateMachine.active(0)
+        stateMachine.init(_countEdges, freq=PIO_FREQUENCY, in_base=self._pin)
+        stateMachine.restart()
+        stateMachine.put(self._debounceCycles)
+        stateMachine.active(1)
+        self._count = 0
+        super().init()
+
+    def getCurrentDegree(self) -> float:
+        self._readCount()
+        return super().getCurrentDegree()
+
+    def getCurrentRotations(self) -> float:
+        self._readCount()
+        return super().getCurrentRotations()
+
+    def getPollInterval(self) -> int:
+        return self._pollInterval
+
+    def _readCount(self):
+        stateMachine = self._stateMachine
+        stateMachine.exec(self._readCountInstruction)
+        stateMachine.exec(self._pushInstruction)
+        count = -stateMachine.get() & 0xFFFFFFFF
+        change = (count - self._count) & 0xFFFFFFFF
+        if change == 0:
+            return
+        # stored before degrees change, as change handlers read position again
+        self._count = count
+        self._updateDegrees(change * self._degreesChange)
@@ -0,0 +1,79 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from machine import Pin
+
+from .rotation_detector import *
+from ..helpers import PinLike, PinHelpers
+
+# step for previous state << 2 | new state, where state is A << 1 | B,
+# channel A leads in positive direction: 00 -> 10 -> 11 -> 01 -> 00
+QUADRATURE_TRANSITIONS = (0, -1, 1, 0,
+                          1, 0, 0, -1,
+                          -1, 0, 0, 1,
+                          0, 1, -1, 0)
+# both channels changed at once, so transition in between was missed
+QUADRATURE_INVALID = (3, 6, 9, 12)
+QUADRATURE_STATES = const(4)
+
+
+class QuadratureRotationDetector(RotationDetector):
+    def __init__(self,
+                 pinA: PinLike,
+                 pinB: PinLike,
+                 cyclesPerRotation: int = 1,
+                 clockwiseLeadsA: bool = True,
+                 pull: int = Pin.PULL_UP):
+        """
+        Decodes direction from order in which two sensors change. Each sensor has to be on for about half
+        of its cycle and sensors have to be offset by quarter of cycle, e.g. two reflectance sensors
+        over disc with one half dark, placed 90 degrees apart. Sensors with short pulses, like reed switches
+        passed by single magnet, never overlap, so their pulses cancel out and no rotation is counted.
+        Each change of either sensor is counted as quarter of cycle in direction it was made, so backdrive,
+        coasting after reversal and turning key by hand are counted correctly, and direction set with
+        setDirection is ignored. Bouncing sensor only moves position back and forth by one quarter,
+        so no debounce is needed.
+
+        :param pinA: first sensor
+        :param pinB: second sensor, quarter of cycle behind pinA in clockwise rotation
+        :param cyclesPerRotation: number of full on and off cycles of each sensor per one full rotation
+        :param clockwiseLeadsA: False if pinA follows pinB in clockwise rotation, e.g. sensors are swapped
+        :param pull: pull of both sensor inputs
+        """
+        if cyclesPerRotation < 1:
+            raise ValueError("cyclesPerRotation must be at least 1")
+        self._pinA = PinHelpers.pinLikeToInPin(pinA, "pinA", pull)
+        self._pinB = PinHelpers.pinLikeToInPin(pinB, "pinB", pull)
+        self._pull = pull
+        change = 360.0 / (QUADRATURE_STATES * cyclesPerRotation)
+        self._degreesChange = change if clockwiseLeadsA else -change
+        self._state = 0
+        self.invalidTransitions = 0
+        super().__init__()
+
+    def init(self):
+        self._pinA.init(Pin.IN, self._pull)
+        self._pinB.init(Pin.IN, self._pull)
+        self._state = self._readState()
+        self._pinA.irq(self._irq, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+        self._pinB.irq(self._irq, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+        super().init()
+
+    def _readState(self):
+        return (self._pinA.value() << 1) | self._pinB.value()
+
+    def _irq(self, pin):
+        state = self._readState()
+        transition = (self._state << 2) | state
+        self._state = state
+        step = QUADRATURE_TRANSITIONS[transition]
+        if step != 0:
+            self._changeDegrees(step * self._degreesChange)
+        elif transition in QUADRATURE_INVALID:
+            # direction is unknown, so position is left as it was
+            self.invalidTransitions = self.invalidTransitions + 1
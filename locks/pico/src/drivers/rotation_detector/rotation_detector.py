@@ -42,9 +42,26 @@ class RotationDetector:
     def setDirection(self, direction):
         self._direction = direction
 
+    def suspend(self) -> None:
+        """Stops periodic sampling while lock does not move, detectors woken only by edges may keep running"""
+        pass
+
+    def resume(self) -> None:
+        """Restarts sampling stopped by suspend, current position is kept"""
+        pass
+
+    def getPollInterval(self) -> int:
+        """
+        Milliseconds between position reads needed to notice rotation, None if detector reports changes on its own
+        """
+        return None
+
     def _updateDegrees(self, value: float):
+        self._changeDegrees(value * self._direction)
+
+    def _changeDegrees(self, value: float):
         prevRotations = self.getCurrentRotations()
-        self._degrees = self._degrees + value * self._direction
+        self._degrees = self._degrees + value
         currentRotations = self.getCurrentRotations()
         if self._irqTrigger & TRIGGER_ROTATION_CHANGE != 0:
             self._irqHandler(TRIGGER_ROTATION_CHANGE, self._degrees)
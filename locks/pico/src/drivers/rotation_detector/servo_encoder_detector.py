@@ -0,0 +1,56 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+from .rotation_detector import *
+
+POSITIONS_PER_ROTATION = const(1024)
+POSITION_DEADBAND = const(2)
+
+
+class ServoEncoderRotationDetector(RotationDetector):
+    def __init__(self,
+                 positionsPerRotation: int = POSITIONS_PER_ROTATION,
+                 clockwiseIncreasesPosition: bool = True,
+                 deadband: int = POSITION_DEADBAND):
+        """
+        Counts multi-turn rotations by unwrapping present position register of servo. Detector does not
+        sample anything on its own, servo manipulator feeds it with positions read in telemetry.
+        Encoder knows real direction of rotation, so direction set with setDirection is ignored.
+
+        :param positionsPerRotation: number of position register values per one full turn of servo shaft
+        :param clockwiseIncreasesPosition: True if position register grows, when servo rotates clockwise
+        :param deadband: position changes up to this value are treated as encoder noise
+        """
+        self._positionsPerRotation = positionsPerRotation
+        self._halfRotation = positionsPerRotation // 2
+        self._degreesPerPosition = (360.0 if clockwiseIncreasesPosition else -360.0) / positionsPerRotation
+        self._deadband = deadband
+        self._lastPosition = None
+        super().__init__()
+
+    def init(self):
+        super().init()
+        self._lastPosition = None
+
+    def getPositionsPerRotation(self) -> int:
+        return self._positionsPerRotation
+
+    def updatePosition(self, position: int):
+        if self._lastPosition is None:
+            self._lastPosition = position
+            return
+        change = position - self._lastPosition
+        if change > self._halfRotation:
+            change = change - self._positionsPerRotation
+        elif change < -self._halfRotation:
+            change = change + self._positionsPerRotation
+        if -self._deadband <= change <= self._deadband:
+            return
+        self._lastPosition = position
+        self._changeDegrees(change * self._degreesPerPosition)
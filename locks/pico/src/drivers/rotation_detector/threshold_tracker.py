@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from micropython import const
+
+from ..persistent_record import PersistentRecord
+
+THRESHOLDS_FILE = "detector_thresholds.bin"
+THRESHOLDS_VERSION = const(1)
+# low and high envelope of read_u16 values
+THRESHOLDS_FORMAT = "<HH"
+
+ADC_FULL_SCALE = const(0xFFFF)
+# envelopes decay by 1/2^shift of their distance to signal per sample
+ENVELOPE_DECAY_SHIFT = const(12)
+# smaller difference between envelopes is noise of standing sensor, not steps
+MIN_SIGNAL_SPAN = const(4096)
+# thresholds as part of span between envelopes, in 1/256
+HIGH_THRESHOLD = const(166)
+LOW_THRESHOLD = const(90)
+# envelopes are saved again only after moving further than this
+SAVE_CHANGE = const(1024)
+
+
+class ThresholdTracker:
+    def __init__(self,
+                 high: int,
+                 low: int,
+                 path: str = THRESHOLDS_FILE,
+                 decayShift: int = ENVELOPE_DECAY_SHIFT,
+                 minSpan: int = MIN_SIGNAL_SPAN):
+        """
+        Follows darkest and brightest value of phototransistor signal with envelopes, which jump to new extremes
+        at once and slowly decay towards signal. Hysteresis thresholds are placed between envelopes, so ambient
+        light, sensor distance and reflector wear do not need manual retuning. Learned envelopes are kept in
+        flash, so detector starts with thresholds of its own device after reboot.
+        Tracking only does integer math, so it can be done from IRQ.
+
+        :param high: threshold used until signal span is learned
+        :param low: threshold used until signal span is learned
+        :param path: file in which envelopes are stored, each detector needs its own
+        :param decayShift: envelopes move by 1/2^decayShift of their distance to signal per sample
+        :param minSpan: smallest difference between envelopes, which is used for thresholds
+        """
+        if low >= high:
+            raise ValueError("low must be lower than high")
+        if decayShift < 1:
+            raise ValueError("decayShift must be at least 1")
+        self._record = PersistentRecord(path, THRESHOLDS_FORMAT, THRESHOLDS_VERSION)
+        self._decayShift = decayShift
+        self._minSpan = minSpan
+        self._high = int(high)
+        self._low = int(low)
+        # nothing seen yet, first sample sets both envelopes
+        self._minimum = ADC_FULL_SCALE
+        self._maximum = 0
+        self._savedMinimum = 0
+        self._savedMaximum = 0
+
+    def load(self) -> bool:
+        """
+        :return: False if there are no valid envelopes stored
+        """
+        values = self._record.load()
+        if values is None:
+            return False
+        self._minimum, self._maximum = values
+        self._savedMinimum, self._savedMaximum = values
+        self._updateThresholds()
+        return True
+
+    def save(self):
+        self._record.save(self._minimum, self._maximum)
+        self._savedMinimum = self._minimum
+        self._savedMaximum = self._maximum
+
+    def saveIfChanged(self) -> bool:
+        """Saves envelopes, if they moved noticeably since last save, e.g. each time lock stops"""
+        if self._maximum - self._minimum < self._minSpan:
+            return False
+        if abs(self._minimum - self._savedMinimum) < SAVE_CHANGE \
+                and abs(self._maximum - self._savedMaximum) < SAVE_CHANGE:
+            return False
+        self.save()
+        return True
+
+    def clear(self):
+        self._minimum = ADC_FULL_SCALE
+        self._maximum = 0
+        self._record.clear()
+
+    def track(self, lowest: int, highest: int, samples: int = 1) -> bool:
+        """
+        :param lowest: lowest read_u16 value of tracked samples
+        :param highest: highest read_u16 value of tracked samples
+        :param samples: number of tracked samples, envelopes decay once per sample
+        :return: True if thresholds changed
+        """
+        minimum = self._minimum
+        maximum = self._maximum
+        if highest > maximum:
+            maximum = highest
+        else:
+            decay = ((maximum - highest) * samples) >> self._decayShift
+            maximum = maximum - (decay if decay < maximum - highest else maximum - highest)
+        if lowest < minimum:
+            minimum = lowest
+        else:
+            decay = ((lowest - minimum) * samples) >> self._decayShift
+            minimum = minimum + (decay if decay < lowest - minimum else lowest - minimum)
+        if minimum == self._minimum and maximum == self._maximum:
+            return False
+        self._minimum = minimum
+        self._maximum = maximum
+        return self._updateThresholds()
+
+    def _updateThresholds(self):
+        span = self._maximum - self._minimum
+        if span < self._minSpan:
+            return False
+        self._high = self._minimum + ((span * HIGH_THRESHOLD) >> 8)
+        self._low = self._minimum + ((span * LOW_THRESHOLD) >> 8)
+        return True
+
+    def getHigh(self) -> int:
+        return self._high
+
+    def getLow(self) -> int:
+        return self._low
+
+    def getEnvelope(self) -> tuple:
+        """Lowest and highest value signal reaches"""
+        return self._minimum, self._maximum
@@ -0,0 +1,151 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+
+from micropython import const
+
+from .bus import ScServoBus
+from .protocol import *
+from .telemetry import TELEMETRY_LENGTH
+
+# index in this tuple is value of servo baud rate register
+BAUD_RATES = (1_000_000, 500_000, 250_000, 128_000, 115_200, 76_800, 57_600, 38_400)
+
+MEASURE_SAMPLES = const(100)
+PING_RETRIES = const(3)
+# time servo needs to apply new baud rate after receiving it
+SWITCH_DELAY = const(0.005)
+
+
+class BaudRateNegotiator:
+    def __init__(self,
+                 bus: ScServoBus,
+                 servoIds: tuple = (1,),
+                 samples: int = MEASURE_SAMPLES,
+                 maxFailures: int = 0):
+        """
+        Finds fastest baud rate at which all servos on bus answer reliably. Servos are switched together with
+        broadcast writes, so every servo connected to bus must be listed in servoIds.
+
+        :param bus: bus with servos
+        :param servoIds: ids of all servos connected to bus
+        :param samples: number of telemetry reads used to measure each baud rate
+        :param maxFailures: number of unanswered or corrupted reads still accepted as reliable
+        """
+        if len(servoIds) == 0:
+            raise ValueError("servoIds must contain at least one servo")
+        self._bus = bus
+        self._servoIds = servoIds
+        self._samples = samples
+        self._maxFailures = maxFailures
+        self._baudrate = 0
+        self._results = {}
+        self._telemetryParameters = bytes((PRESENT_POSITION_MEMORY_ADDR, TELEMETRY_LENGTH))
+
+    def getBaudRate(self) -> int:
+        """Baud rate servos and UART use now, 0 if unknown"""
+        return self._baudrate
+
+    def getResults(self) -> dict:
+        """Measured baud rates mapped to tuple of failures, p50 and p99 round trip time in microseconds"""
+        return self._results
+
+    async def find(self) -> int:
+        """
+        Finds baud rate servos currently use, e.g. after Pico restart without restarting servos
+
+        :return: found baud rate, UART is switched to it
+        """
+        for baudrate in BAUD_RATES:
+            await self._bus.setBaudRate(baudrate)
+            if await self._pingAll():
+                self._baudrate = baudrate
+                return baudrate
+        self._baudrate = 0
+        raise RuntimeError("Servos do not respond at any baud rate")
+
+    async def switch(self, baudrate: int) -> bool:
+        """
+        Switches servos and UART to baud rate and checks if all servos respond at it. Servo keeps rate
+        only until power off, unless persist is called.
+        """
+        try:
+            index = BAUD_RATES.index(baudrate)
+        except ValueError:
+            raise ValueError(f"baudrate must be one of {BAUD_RATES}")
+        await self._bus.broadcast(WRITE_INSTRUCTION, bytes((BAUD_RATE_MEMORY_ADDR, index)))
+        await self._bus.setBaudRate(baudrate)
+        self._baudrate = baudrate
+        await asyncio.sleep(SWITCH_DELAY)
+        return await self._pingAll()
+
+    async def measure(self) -> tuple:
+        """
+        Measures round trip time of telemetry reads at current baud rate
+
+        :return: tuple of failures, p50 and p99 round trip time in microseconds
+        """
+        latency = self._bus.getTransport().getLatency()
+        latency.reset()
+        for i in range(self._samples):
+            for servoId in self._servoIds:
+                await self._bus.servo(servoId).request(READ_INSTRUCTION, self._telemetryParameters)
+        result = (latency.failures, latency.percentile(50), latency.percentile(99))
+        self._results[self._baudrate] = result
+        return result
+
+    async def negotiate(self, candidates: tuple = BAUD_RATES, persist: bool = False) -> int:
+        """
+        Tries candidates from fastest one and keeps first baud rate, which meets maxFailures.
+        If none does, servos are returned to baud rate they used before.
+
+        :param candidates: baud rates to try, each must be supported by servo
+        :param persist: True to store chosen baud rate in servo EEPROM
+        :return: chosen baud rate
+        """
+        original = await self.find()
+        for baudrate in sorted(candidates, reverse=True):
+            if not await self.switch(baudrate):
+                # servos usually still hear commands, even if their answers are lost at this rate
+                await self._recover(original)
+                continue
+            failures, p50, p99 = await self.measure()
+            if failures <= self._maxFailures:
+                if persist:
+                    await self.persist()
+                return baudrate
+        await self._recover(original)
+        return self._baudrate
+
+    async def persist(self):
+        """Stores current baud rate in EEPROM of servos"""
+        index = BAUD_RATES.index(self._baudrate)
+        await self._bus.broadcast(WRITE_INSTRUCTION, bytes((EEPROM_LOCK_MEMORY_ADDR, 0)))
+        await self._bus.broadcast(WRITE_INSTRUCTION, bytes((BAUD_RATE_MEMORY_ADDR, index)))
+        await self._bus.broadcast(WRITE_INSTRUCTION, bytes((EEPROM_LOCK_MEMORY_ADDR, 1)))
+
+    async def _recover(self, baudrate):
+        if await self.switch(baudrate):
+            return
+        # some servo missed broadcast, gather all of them at known rate again
+        if await self.find() != baudrate and not await self.switch(baudrate):
+            raise RuntimeError("Cannot return servos to original baud rate")
+
+    async def _pingAll(self) -> bool:
+        for servoId in self._servoIds:
+            if not await self._ping(servoId):
+                return False
+        return True
+
+    async def _ping(self, servoId) -> bool:
+        for i in range(PING_RETRIES):
+            data, error = await self._bus.servo(servoId).request(PING_INSTRUCTION)
+            if error == 0:
+                return True
+        return False
@@ -0,0 +1,133 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+
+from .protocol import *
+from .transport import ScServoTransport, DEFAULT_TIMEOUT_MS
+
+
+class ScServoChannel:
+    def __init__(self, bus, servoId: int):
+        """
+        Access to single servo on shared bus. Use ScServoBus.servo() to get instance.
+        """
+        self.servoId = servoId
+        self._bus = bus
+        self._lock = asyncio.Lock()
+        self._priorityLock = asyncio.Lock()
+        self._turn = asyncio.Event()
+        self._priorityTurn = asyncio.Event()
+
+    async def request(self, instruction: int, parameters=b"", priority: bool = False, timeoutMs: int = None):
+        return await self._transaction(None, instruction, parameters, priority, timeoutMs)
+
+    async def transaction(self, frame, priority: bool = False, timeoutMs: int = None):
+        """
+        Sends encoded frame to servo, when it is turn of this servo on bus. Response parameters are valid
+        only until next transaction on bus.
+
+        :param frame: frame encoded for servoId of this channel
+        :param priority: True for commands that must overtake regular traffic, e.g. stop
+        :param timeoutMs: response timeout, transport default if None
+        """
+        return await self._transaction(frame, 0, b"", priority, timeoutMs)
+
+    async def _transaction(self, frame, instruction, parameters, priority, timeoutMs):
+        lock = self._priorityLock if priority else self._lock
+        await lock.acquire()
+        try:
+            return await self._bus._transaction(self.servoId, frame, instruction, parameters,
+                                                self._priorityTurn if priority else self._turn, priority, timeoutMs)
+        finally:
+            lock.release()
+
+
+class ScServoBus:
+    def __init__(self,
+                 uart,
+                 timeoutMs: int = DEFAULT_TIMEOUT_MS,
+                 echo: bool = True):
+        """
+        Owns UART with many SC servos connected and schedules their transactions. Regular transactions
+        are served round-robin between servos, priority transactions (e.g. stop) are served before them.
+
+        :param uart: UART connected to servo bus
+        :param timeoutMs: default time for servo to respond to single request
+        :param echo: True if bus is half-duplex and each sent frame is received back on RX line
+        """
+        self._transport = ScServoTransport(uart, timeoutMs, echo)
+        self._channels = {}
+        self._busy = False
+        self._queue = []
+        self._priorityQueue = []
+        self._encoder = FrameEncoder()
+        self._broadcastStopFrame = encodeFrame(BROADCAST_ID, WRITE_INSTRUCTION, bytes((TIME_MEMORY_ADDR, 0, 0)))
+
+    def servo(self, servoId: int) -> ScServoChannel:
+        if servoId < 0 or servoId >= BROADCAST_ID:
+            raise ValueError(f"servoId must be between 0 and {BROADCAST_ID - 1}")
+        try:
+            return self._channels[servoId]
+        except KeyError:
+            channel = ScServoChannel(self, servoId)
+            self._channels[servoId] = channel
+            return channel
+
+    def getTransport(self) -> ScServoTransport:
+        return self._transport
+
+    async def broadcast(self, instruction: int, parameters=b""):
+        """Sends instruction to all servos on bus as priority transaction. Servos do not answer broadcasts."""
+        await self._transaction(BROADCAST_ID, None, instruction, parameters, asyncio.Event(), True, None)
+
+    async def setBaudRate(self, baudrate: int):
+        """Changes UART speed between transactions. Servos must be switched before, see BaudRateNegotiator."""
+        await self._waitForTurn(asyncio.Event(), True)
+        try:
+            self._transport.setBaudRate(baudrate)
+        finally:
+            self._passTurn()
+
+    async def stopAll(self):
+        """Stops all servos on bus with single broadcast frame, which overtakes waiting regular transactions"""
+        await self._transaction(BROADCAST_ID, self._broadcastStopFrame, 0, b"", asyncio.Event(), True, None)
+
+    async def _transaction(self, servoId, frame, instruction, parameters, turn, priority, timeoutMs):
+        await self._waitForTurn(turn, priority)
+        try:
+            if frame is None:
+                # encoder buffer is shared, so frame can be encoded only when bus is ours
+                frame = self._encoder.encode(servoId, instruction, parameters)
+            return await self._transport.transaction(servoId, frame, timeoutMs)
+        finally:
+            self._passTurn()
+
+    async def _waitForTurn(self, turn, priority):
+        if not self._busy:
+            self._busy = True
+            return
+        queue = self._priorityQueue if priority else self._queue
+        turn.clear()
+        queue.append(turn)
+        try:
+            await turn.wait()
+        except asyncio.CancelledError:
+            if turn in queue:
+                queue.remove(turn)
+            else:
+                self._passTurn()
+            raise
+
+    def _passTurn(self):
+        if self._priorityQueue:
+            self._priorityQueue.pop(0).set()
+        elif self._queue:
+            self._queue.pop(0).set()
+        else:
+            self._busy = False
@@ -0,0 +1,55 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from array import array
+
+from micropython import const
+
+LATENCY_SAMPLES = const(128)
+
+
+class LatencyRecorder:
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        """
+        Keeps durations of last transactions in preallocated ring buffer, so recording does not allocate memory.
+        Percentiles are computed only when asked for.
+
+        :param size: number of last durations used for percentiles
+        """
+        self._samples = array("I", bytes(4 * size))
+        self._size = size
+        self._next = 0
+        self.count = 0
+        self.failures = 0
+
+    def record(self, durationUs: int):
+        self._samples[self._next] = durationUs
+        self._next = (self._next + 1) % self._size
+        self.count = self.count + 1
+
+    def recordFailure(self):
+        self.failures = self.failures + 1
+
+    def reset(self):
+        self._next = 0
+        self.count = 0
+        self.failures = 0
+
+    def percentile(self, percent: int) -> int:
+        """
+        :return: duration in microseconds not exceeded by given percent of recorded transactions, 0 if none recorded
+        """
+        stored = self.count if self.count < self._size else self._size
+        if stored == 0:
+            return 0
+        ordered = sorted(self._samples[:stored])
+        index = (stored * percent + 99) // 100 - 1
+        return ordered[index if index > 0 else 0]
+
+    def __str__(self):
+        return f"count={self.count} failures={self.failures} p50={self.percentile(50)}us p99={self.percentile(99)}us"
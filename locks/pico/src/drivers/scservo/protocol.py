@@ -0,0 +1,211 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import micropython
+from micropython import const
+
+FRAME_HEADER = const(0xFF)
+BROADCAST_ID = const(0xFE)
+
+PING_INSTRUCTION = const(0x01)
+READ_INSTRUCTION = const(0x02)
+WRITE_INSTRUCTION = const(0x03)
+
+BAUD_RATE_MEMORY_ADDR = const(6)
+MOTOR_MODE_MEMORY_ADDR = const(9)
+TIME_MEMORY_ADDR = const(44)
+EEPROM_LOCK_MEMORY_ADDR = const(48)
+PRESENT_POSITION_MEMORY_ADDR = const(56)
+MOVING_MEMORY_ADDR = const(66)
+
+# header (2 bytes), id, length, instruction or error and checksum
+FRAME_OVERHEAD = const(6)
+MAX_PARAMETERS = const(16)
+
+
+@micropython.native
+def checksum(buffer, start: int, end: int) -> int:
+    sum = 0
+    for i in range(start, end):
+        sum = sum + buffer[i]
+    return (~sum) & 0xff
+
+
+def encodeFrame(servoId: int, instruction: int, parameters=b"") -> bytes:
+    """Builds standalone frame, that can be precomputed once and sent many times"""
+    return bytes(FrameEncoder(len(parameters)).encode(servoId, instruction, parameters))
+
+
+class FrameEncoder:
+    def __init__(self, maxParameters: int = MAX_PARAMETERS):
+        """
+        Encodes instruction frames into single reused buffer, so sending commands does not allocate memory
+
+        :param maxParameters: maximal number of instruction parameters that encoder must handle
+        """
+        self._maxParameters = maxParameters
+        self._buffer = bytearray(FRAME_OVERHEAD + maxParameters)
+        self._buffer[0] = FRAME_HEADER
+        self._buffer[1] = FRAME_HEADER
+        view = memoryview(self._buffer)
+        self._frames = [view[:FRAME_OVERHEAD + count] for count in range(maxParameters + 1)]
+
+    def encode(self, servoId: int, instruction: int, parameters=b"") -> memoryview:
+        """
+        Writes frame into encoder buffer. Returned view is valid only until next call of this method.
+        """
+        count = len(parameters)
+        if count > self._maxParameters:
+            raise ValueError(f"Frame can have at most {self._maxParameters} parameters")
+        buffer = self._buffer
+        buffer[2] = servoId
+        buffer[3] = count + 2
+        buffer[4] = instruction
+        for i in range(count):
+            buffer[5 + i] = parameters[i]
+        buffer[5 + count] = checksum(buffer, 2, 5 + count)
+        return self._frames[count]
+
+
+PARSER_HEADER = const(0)
+PARSER_SECOND_HEADER = const(1)
+PARSER_ID = const(2)
+PARSER_LENGTH = const(3)
+PARSER_ERROR = const(4)
+PARSER_PARAMETERS = const(5)
+PARSER_CHECKSUM = const(6)
+
+RING_BUFFER_SIZE = const(64)
+
+
+class FrameParser:
+    def __init__(self, size: int = RING_BUFFER_SIZE, maxParameters: int = MAX_PARAMETERS):
+        """
+        Streaming parser of servo response frames. Bytes can be pushed in chunks of any size,
+        frames split between chunks are completed on later pushes.
+
+        :param size: size of ring buffer holding not yet parsed bytes
+        :param maxParameters: maximal number of parameters in accepted frame
+        """
+        self._ring = bytearray(size)
+        self._size = size
+        self._readIndex = 0
+        self._available = 0
+        self._skip = 0
+        self._state = PARSER_HEADER
+        self._synchronized = True
+        self._sum = 0
+        self._remaining = 0
+        self._maxParameters = maxParameters
+        self._parameters = bytearray(maxParameters)
+        view = memoryview(self._parameters)
+        self._views = [view[:count] for count in range(maxParameters + 1)]
+
+        self.servoId = 0
+        self.error = 0
+        self.parameters = self._views[0]
+
+        self.frames = 0
+        self.resyncs = 0
+        self.checksumErrors = 0
+        self.overflows = 0
+
+    def reset(self):
+        self._readIndex = 0
+        self._available = 0
+        self._skip = 0
+        self._state = PARSER_HEADER
+        self._synchronized = True
+
+    def skip(self, count: int):
+        """Ignores next count bytes, e.g. echo of sent frame on half-duplex bus"""
+        self._skip = self._skip + count
+
+    @micropython.native
+    def push(self, data, count: int = -1):
+        if count < 0:
+            count = len(data)
+        ring = self._ring
+        size = self._size
+        for i in range(count):
+            if self._available == size:
+                self._readIndex = (self._readIndex + 1) % size
+                self._available = self._available - 1
+                self.overflows = self.overflows + 1
+            ring[(self._readIndex + self._available) % size] = data[i]
+            self._available = self._available + 1
+
+    @micropython.native
+    def poll(self) -> bool:
+        """
+        Consumes buffered bytes until frame is complete. When True is returned, servoId, error and
+        parameters hold data of parsed frame. Parameters stay valid only until next call.
+        """
+        ring = self._ring
+        while self._available > 0:
+            byte = ring[self._readIndex]
+            self._readIndex = (self._readIndex + 1) % self._size
+            self._available = self._available - 1
+            if self._skip > 0:
+                self._skip = self._skip - 1
+                continue
+            if self._consume(byte):
+                return True
+        return False
+
+    @micropython.native
+    def _consume(self, byte: int) -> bool:
+        state = self._state
+        if state == PARSER_HEADER:
+            if byte == FRAME_HEADER:
+                self._state = PARSER_SECOND_HEADER
+            else:
+                self._lostSynchronization()
+        elif state == PARSER_SECOND_HEADER:
+            if byte == FRAME_HEADER:
+                self._state = PARSER_ID
+            else:
+                self._state = PARSER_HEADER
+                self._lostSynchronization()
+        elif state == PARSER_ID:
+            if byte != FRAME_HEADER:
+                self.servoId = byte
+                self._sum = byte
+                self._state = PARSER_LENGTH
+        elif state == PARSER_LENGTH:
+            if byte < 2 or byte - 2 > self._maxParameters:
+                self._state = PARSER_HEADER
+                self._lostSynchronization()
+            else:
+                self._remaining = byte - 2
+                self.parameters = self._views[self._remaining]
+                self._sum = self._sum + byte
+                self._state = PARSER_ERROR
+        elif state == PARSER_ERROR:
+            self.error = byte
+            self._sum = self._sum + byte
+            self._state = PARSER_PARAMETERS if self._remaining > 0 else PARSER_CHECKSUM
+        elif state == PARSER_PARAMETERS:
+            self._parameters[len(self.parameters) - self._remaining] = byte
+            self._sum = self._sum + byte
+            self._remaining = self._remaining - 1
+            if self._remaining == 0:
+                self._state = PARSER_CHECKSUM
+        else:
+            self._state = PARSER_HEADER
+            self._synchronized = True
+            if (~self._sum) & 0xff == byte:
+                self.frames = self.frames + 1
+                return True
+            self.checksumErrors = self.checksumErrors + 1
+        return False
+
+    def _lostSynchronization(self):
+        if self._synchronized:
+            self._synchronized = False
+            self.resyncs = self.resyncs + 1
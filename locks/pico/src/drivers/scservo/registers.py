@@ -0,0 +1,48 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from micropython import const
+
+CONTROL_TABLE_SIZE = const(72)
+
+
+class ShadowRegisters:
+    def __init__(self, size: int = CONTROL_TABLE_SIZE):
+        """
+        Write-through copy of servo control table. It remembers values successfully written to servo,
+        so writes that would not change anything can be skipped.
+        """
+        self._values = bytearray(size)
+        self._known = bytearray(size)
+        self._size = size
+
+    def matches(self, address: int, data, start: int = 0, end: int = -1) -> bool:
+        """Checks if data[start:end] is already stored in servo at given address"""
+        if end < 0:
+            end = len(data)
+        if address + end - start > self._size:
+            return False
+        for i in range(start, end):
+            register = address + i - start
+            if not self._known[register] or self._values[register] != data[i]:
+                return False
+        return True
+
+    def update(self, address: int, data, start: int = 0, end: int = -1):
+        if end < 0:
+            end = len(data)
+        if address + end - start > self._size:
+            return
+        for i in range(start, end):
+            register = address + i - start
+            self._values[register] = data[i]
+            self._known[register] = 1
+
+    def invalidate(self):
+        for i in range(self._size):
+            self._known[i] = 0
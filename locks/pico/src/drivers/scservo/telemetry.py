@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+from micropython import const
+
+from .protocol import PRESENT_POSITION_MEMORY_ADDR, MOVING_MEMORY_ADDR
+
+# present position, speed, load, voltage, temperature, async write flag, status and moving flag
+TELEMETRY_LENGTH = const(MOVING_MEMORY_ADDR - PRESENT_POSITION_MEMORY_ADDR + 1)
+
+SPEED_DIRECTION_BIT = const(1 << 15)
+LOAD_DIRECTION_BIT = const(1 << 10)
+
+
+class ServoTelemetry:
+    def __init__(self):
+        """
+        Snapshot of servo state read with single multi-register read. Object is updated in place,
+        so keep copy of values if you need them after next read.
+        """
+        self.valid = False
+        self.error = 0
+        self.position = 0
+        self.speed = 0
+        self.load = 0
+        self.voltage = 0
+        self.temperature = 0
+        self.status = 0
+        self.moving = False
+
+    def update(self, data, error: int):
+        self.error = error
+        self.valid = len(data) == TELEMETRY_LENGTH
+        if not self.valid:
+            return
+        self.position = data[0] << 8 | data[1]
+        self.speed = self._signed(data[2] << 8 | data[3], SPEED_DIRECTION_BIT)
+        self.load = self._signed(data[4] << 8 | data[5], LOAD_DIRECTION_BIT)
+        self.voltage = data[6]
+        self.temperature = data[7]
+        self.status = data[9]
+        self.moving = data[10] != 0
+
+    @staticmethod
+    def _signed(value, directionBit):
+        if value & directionBit:
+            return -(value & ~directionBit)
+        return value
+
+    def __str__(self):
+        return f"position={self.position} speed={self.speed} load={self.load} voltage={self.voltage / 10}V " \
+               f"temperature={self.temperature}C moving={self.moving} error={self.error}"
@@ -0,0 +1,121 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import time
+
+from machine import UART
+from micropython import const
+
+from .latency import LatencyRecorder
+from .protocol import BROADCAST_ID, FrameEncoder, FrameParser
+
+NO_RESPONSE = const(0xFF)
+
+DEFAULT_TIMEOUT_MS = const(10)
+READ_CHUNK_SIZE = const(32)
+
+
+class ScServoTransport:
+    def __init__(self,
+                 uart,
+                 timeoutMs: int = DEFAULT_TIMEOUT_MS,
+                 echo: bool = True):
+        """
+        Asynchronous request/response transport for Waveshare/Feetech SC servos connected to UART
+
+        :param uart: UART connected to servo bus or object already providing asyncio stream API
+                     (write, drain, readinto) together with UART any and read methods, e.g. simulated servo
+        :param timeoutMs: default time for servo to respond to single request
+        :param echo: True if bus is half-duplex and each sent frame is received back on RX line
+        """
+        self._uart = uart
+        if isinstance(uart, UART):
+            self._reader = asyncio.StreamReader(uart)
+            self._writer = asyncio.StreamWriter(uart, {})
+        else:
+            self._reader = uart
+            self._writer = uart
+        self._timeoutMs = timeoutMs
+        self._echo = echo
+        self._lock = asyncio.Lock()
+        self._encoder = FrameEncoder()
+        self._parser = FrameParser()
+        self._chunk = bytearray(READ_CHUNK_SIZE)
+        self._latency = LatencyRecorder()
+
+    def getParser(self) -> FrameParser:
+        return self._parser
+
+    def setBaudRate(self, baudrate: int):
+        """Changes UART speed once all already written bytes left it. Caller must own bus."""
+        self._uart.flush()
+        self._uart.init(baudrate=baudrate)
+        self._discardInput()
+
+    def getLatency(self) -> LatencyRecorder:
+        """Round trip times of answered transactions and number of unanswered ones"""
+        return self._latency
+
+    async def request(self, servoId, instruction, parameters=b"", timeoutMs: int = None):
+        """
+        Sends instruction to servo and awaits its response without blocking event loop
+
+        :return: tuple of response parameters and servo error byte. Error is NO_RESPONSE when servo
+                 did not answer in time. Parameters are view valid only until next request
+        """
+        await self._lock.acquire()
+        try:
+            return await self._exchange(servoId, self._encoder.encode(servoId, instruction, parameters), timeoutMs)
+        finally:
+            self._lock.release()
+
+    async def transaction(self, servoId, frame, timeoutMs: int = None):
+        """
+        Sends already encoded frame (see protocol.encodeFrame) and awaits servo response
+        """
+        await self._lock.acquire()
+        try:
+            return await self._exchange(servoId, frame, timeoutMs)
+        finally:
+            self._lock.release()
+
+    async def _exchange(self, servoId, frame, timeoutMs):
+        if timeoutMs is None:
+            timeoutMs = self._timeoutMs
+        self._discardInput()
+        start = time.ticks_us()
+        self._writer.write(frame)
+        await self._writer.drain()
+        if servoId == BROADCAST_ID:
+            # servos never answer broadcast frames
+            return b"", 0
+        try:
+            response = await asyncio.wait_for(self._receive(servoId, len(frame)), timeoutMs / 1000)
+        except asyncio.TimeoutError:
+            self._latency.recordFailure()
+            return b"", NO_RESPONSE
+        self._latency.record(time.ticks_diff(time.ticks_us(), start))
+        return response
+
+    def _discardInput(self):
+        if self._uart.any():
+            self._uart.read()
+        self._parser.reset()
+
+    async def _receive(self, servoId, sentLength):
+        parser = self._parser
+        if self._echo:
+            parser.skip(sentLength)
+        while True:
+            while parser.poll():
+                if parser.servoId == servoId:
+                    return parser.parameters, parser.error
+            count = await self._reader.readinto(self._chunk)
+            if count:
+                parser.push(self._chunk, count)
@@ -12,9 +12,15 @@ from asyncio import TimeoutError
 
 import aioble
 import bluetooth
+from machine import Pin, UART
 from micropython import const
 
 from clock import Clock
+from drivers.lock_manipulator.calibration import LockCalibration
+from drivers.lock_manipulator.lock_manipulator import *
+from drivers.lock_manipulator.operation_timer import OperationTimer
+from drivers.lock_manipulator.wavesharesc_servo_manipulator import WaveshareScServoLockManipulator
+from drivers.power_manager import PowerManager
 
 _CURRENT_API = const("0.0")
 # lock service/namespace
@@ -25,11 +31,28 @@ _LOCK_STATE_UUID = bluetooth.UUID("53ffd6da-faea-5711-861b-2c823b4d37f3")
 _LOCK_API_VERSION_UUID = bluetooth.UUID("26084787-dd2e-573c-9909-50fa997d8d70")
 # commandRx
 _LOCK_COMMAND_UUID = bluetooth.UUID("1007179b-8749-5c02-ae48-7fdc43307ef8")
+# lockMetrics, histograms of lock operation phases as packed by OperationTimer
+_LOCK_METRICS_UUID = bluetooth.UUID("47b19e85-eb24-4613-aa51-c6068cd1a6b7")
 # org.bluetooth.characteristic.gap.appearance.xml
 _ADV_APPEARANCE = const(576)
 
 _ADV_INTERVAL_MS = 550_000
 
+_SERVO_BAUD_RATE = const(1_000_000)
+
+# first byte of command written to commandRx
+_COMMAND_LOCK = const(1)
+_COMMAND_UNLOCK = const(2)
+
+_STATE_NAMES = {
+    LOCK_UNINITIALIZED: "INITIALIZING",
+    LOCK_LOCKED: "LOCKED",
+    LOCK_UNLOCKED: "UNLOCKED",
+    LOCK_WORKING_LOCKING: "LOCKING",
+    LOCK_WORKING_UNLOCKING: "UNLOCKING",
+    LOCK_ERROR: "ERROR",
+}
+
 clock = Clock()
 
 # Register GATT server.
@@ -38,8 +61,28 @@ lock_state = aioble.Characteristic(lock_service, _LOCK_STATE_UUID, read=True, no
                                    initial=f"{clock.getIsoTime()} INITIALIZING")
 lock_api = aioble.Characteristic(lock_service, _LOCK_STATE_UUID, read=True, initial=_CURRENT_API)
 lock_command = aioble.Characteristic(lock_service, _LOCK_COMMAND_UUID, write=True, capture=True)
+lock_metrics = aioble.Characteristic(lock_service, _LOCK_METRICS_UUID, read=True)
 aioble.register_services(lock_service)
 
+timer = OperationTimer()
+servo_uart = UART(0, _SERVO_BAUD_RATE, tx=Pin(16), rx=Pin(17))
+lock = WaveshareScServoLockManipulator(servo_uart, calibration=LockCalibration(), timer=timer)
+power = PowerManager()
+# UART divider follows system clock, so baud rate has to be set again after clock change
+power.addFrequencyListener(lambda frequency: servo_uart.init(baudrate=_SERVO_BAUD_RATE))
+
+
+def on_lock_state_change(state, error, manipulator):
+    if state == LOCK_LOCKED or state == LOCK_UNLOCKED or state == LOCK_ERROR:
+        power.idle()
+    else:
+        power.active()
+    lock_state.write(f"{clock.getIsoTime()} {_STATE_NAMES.get(state, state)}", True)
+    lock_metrics.write(timer.pack())
+
+
+lock.lockStateChangeCallback(on_lock_state_change)
+
 
 # struct.pack("<h", int(`value`))
 
@@ -59,7 +102,7 @@ async def run_ble_service():
                 try:
                     while connection.is_connected():
                         (device, data) = await lock_command.written(timeout_ms=60000)
-                        print(data)
+                        handle_command(data)
                 except TimeoutError:
                     await connection.disconnected(timeout_ms=10000)
         except KeyboardInterrupt:
@@ -68,9 +111,40 @@ async def run_ble_service():
             print("Error in BLE connection handling: " + str(error))
 
 
+def handle_command(data):
+    if not data:
+        return
+    if data[0] != _COMMAND_LOCK and data[0] != _COMMAND_UNLOCK:
+        print("Unknown command: " + str(data))
+        return
+    # operation is timed from here, so BLE stack delays are part of measured time
+    timer.begin()
+    power.active()
+    asyncio.create_task(run_command(data[0]))
+
+
+async def run_command(command):
+    try:
+        if command == _COMMAND_LOCK:
+            await lock.lock()
+        else:
+            await lock.unlock()
+    except RuntimeError as error:
+        print("Cannot execute lock command: " + str(error))
+
+
+async def run_lock():
+    try:
+        await lock.init()
+    except RuntimeError as error:
+        print("Cannot initialize lock: " + str(error))
+
+
 async def main():
     ble_service = asyncio.create_task(run_ble_service())
-    await asyncio.gather(ble_service)
+    lock_task = asyncio.create_task(run_lock())
+    power_task = asyncio.create_task(power.run())
+    await asyncio.gather(ble_service, lock_task, power_task)
 
 def start():
     print("Start")
@@ -0,0 +1,84 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+#
+# Benchmark of SC servo protocol, baud rates and lock cycle against simulated servo.
+# Run from project directory with: python -m test.benchmark_scservo
+#
+import asyncio
+import time
+
+import test
+from src.drivers.lock_manipulator.lock_manipulator import *
+from src.drivers.lock_manipulator.operation_timer import OperationTimer
+from src.drivers.lock_manipulator.wavesharesc_servo_manipulator import WaveshareScServoLockManipulator
+from src.drivers.scservo.baudrate import BaudRateNegotiator, BAUD_RATES
+from src.drivers.scservo.bus import ScServoBus
+from test.mock.scservo_simulator import SimulatedScServo, SimulatedScServoBus, SimulatedReedSwitch
+
+TELEMETRY_READS = 2000
+# later cycles show effect of learned coast
+LOCK_CYCLES = 3
+# host is not real-time, occasional scheduling hiccup must not be reported as missing servo
+SIMULATION_TIMEOUT_MS = 100
+
+
+async def benchmarkTelemetry(timing: bool):
+    servo = SimulatedScServo()
+    uart = SimulatedScServoBus(servo, timing=timing)
+    lock = WaveshareScServoLockManipulator(ScServoBus(uart, timeoutMs=SIMULATION_TIMEOUT_MS),
+                                           reedSwitchPin=SimulatedReedSwitch(servo))
+    start = time.monotonic()
+    for i in range(TELEMETRY_READS):
+        await lock.readTelemetry()
+    elapsed = time.monotonic() - start
+    print(f"telemetry reads (wire timing {timing}): {TELEMETRY_READS / elapsed:.0f}/s, "
+          f"{elapsed / TELEMETRY_READS * 1e6:.0f}us per read, {uart.sentBytes / TELEMETRY_READS:.0f} bytes sent per read")
+
+
+async def benchmarkBaudRates():
+    uart = SimulatedScServoBus(SimulatedScServo())
+    bus = ScServoBus(uart, timeoutMs=SIMULATION_TIMEOUT_MS)
+    negotiator = BaudRateNegotiator(bus)
+    await negotiator.find()
+    for baudrate in BAUD_RATES:
+        await negotiator.switch(baudrate)
+        failures, p50, p99 = await negotiator.measure()
+        print(f"telemetry at {baudrate} baud: p50 {p50}us, p99 {p99}us, failures {failures}")
+
+
+async def benchmarkLockCycle():
+    # lock starts away from neutral position, so state detection has to home it
+    servo = SimulatedScServo(fullSpeedRotationsPerSecond=4.0, limits=(-2.5, 1.9), acceleration=20.0)
+    uart = SimulatedScServoBus(servo)
+    timer = OperationTimer()
+    lock = WaveshareScServoLockManipulator(ScServoBus(uart, timeoutMs=SIMULATION_TIMEOUT_MS),
+                                           reedSwitchPin=SimulatedReedSwitch(servo, neutral=0.3), timer=timer)
+
+    start = time.monotonic()
+    await lock.init(fullLockRotations=2)
+    await lock._task
+    print(f"init with state detection and unlock: {time.monotonic() - start:.2f}s, {uart.sentFrames} frames, "
+          f"homing stop {lock.getHomingLatency()}us after magnet")
+
+    for cycle in range(LOCK_CYCLES):
+        for name, operation in (("lock", lock.lock), ("unlock", lock.unlock)):
+            frames = uart.sentFrames
+            start = time.monotonic()
+            await operation()
+            await lock._task
+            print(f"{name}: {time.monotonic() - start:.2f}s, {uart.sentFrames - frames} frames, "
+                  f"error {lock.getLockError()}, shaft at {servo.rotations:.3f} rotations")
+    timer.dump()
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmarkTelemetry(False))
+    asyncio.run(benchmarkTelemetry(True))
+    asyncio.run(benchmarkBaudRates())
+    asyncio.run(benchmarkLockCycle())
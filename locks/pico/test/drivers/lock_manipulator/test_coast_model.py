@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from src.drivers.lock_manipulator.coast_model import CoastModel
+
+
+class TestCoastModel(unittest.TestCase):
+    def test_unknownCoastIsZero(self):
+        model = CoastModel()
+
+        self.assertEqual(model.getCoast(1), 0)
+        self.assertIsNone(model.getSettleTime(1))
+
+    def test_firstMeasurementIsTakenAsIs(self):
+        model = CoastModel()
+
+        model.record(1, 0.1, 200)
+
+        self.assertAlmostEqual(model.getCoast(1), 0.1)
+        self.assertEqual(model.getSettleTime(1), 200)
+
+    def test_directionsAreLearnedSeparately(self):
+        model = CoastModel()
+
+        model.record(1, 0.1, 200)
+        model.record(-1, -0.05, 100)
+
+        self.assertAlmostEqual(model.getCoast(1), 0.1)
+        self.assertAlmostEqual(model.getCoast(-1), 0.05)
+        self.assertEqual(model.getSettleTime(-1), 100)
+
+    def test_measurementsAreSmoothed(self):
+        model = CoastModel(smoothing=0.5)
+
+        model.record(1, 0.1, 200)
+        model.record(1, 0.2, 400)
+
+        self.assertAlmostEqual(model.getCoast(1), 0.15)
+        self.assertEqual(model.getSettleTime(1), 300)
+
+    def test_coastIsLimited(self):
+        model = CoastModel(maxCoast=0.3)
+
+        model.record(1, 2.0, 200)
+
+        self.assertAlmostEqual(model.getCoast(1), 0.3)
+
+    def test_invalidSmoothingIsRejected(self):
+        with self.assertRaises(ValueError):
+            CoastModel(smoothing=0)
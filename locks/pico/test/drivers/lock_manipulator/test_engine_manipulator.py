@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import unittest
+
+from machine import Pin
+
+import test.conditions
+from src.drivers.lock_manipulator.engine_manipulator import *
+from src.drivers.lock_manipulator.motion_profile import TrapezoidalProfile
+from src.drivers.rotation_detector.rotation_detector import RotationDetector
+
+FULL_SPEED = TrapezoidalProfile(minimalSpeed=1.0)
+
+
+@test.conditions.pc_only()
+class TestEngineLockManipulator(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def engine(self, **options):
+        lock = EngineLockManipulator(Pin(16), Pin(17), RotationDetector(), Pin(13), **options)
+        self.loop.run_until_complete(lock.init(fullLockRotations=2, initialState=LOCK_UNLOCKED))
+        lock._state = LOCK_WORKING_LOCKING
+        return lock
+
+    def test_startsWithMinimalSpeedOfProfile(self):
+        lock = self.engine(motionProfile=TrapezoidalProfile(minimalSpeed=0.25))
+
+        self.loop.run_until_complete(lock._rotateCounterClockwise())
+
+        self.assertEqual(lock._counterclockwise.duty_u16(), int(FULL_DUTY * 0.25))
+        self.assertEqual(lock._clockwise.duty_u16(), 0)
+
+    def test_speedRampsUp(self):
+        lock = self.engine(motionProfile=TrapezoidalProfile(acceleration=4.0, minimalSpeed=0.25))
+
+        async def scenario():
+            await lock._rotateCounterClockwise()
+            await asyncio.sleep(0.1)
+            await lock._updateSpeed()
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertGreater(lock._counterclockwise.duty_u16(), int(FULL_DUTY * 0.6))
+
+    def test_withoutProfileMotorRunsFullSpeed(self):
+        lock = self.engine(motionProfile=FULL_SPEED)
+
+        self.loop.run_until_complete(lock._rotateClockwise())
+
+        self.assertEqual(lock._clockwise.duty_u16(), FULL_DUTY)
+        self.assertIsNone(lock._supervisionInterval())
+
+    def test_manipulatorsDoNotShareMotionProfile(self):
+        self.assertIsNot(self.engine()._profile, self.engine()._profile)
+
+    def test_enabledBrakeIsUsedBeforeOppositeSideIsDriven(self):
+        lock = self.engine(motionProfile=FULL_SPEED, brakeMs=BRAKE_TIME_MS)
+
+        async def scenario():
+            await lock._rotateClockwise()
+            lock._clockwise.duties.clear()
+            lock._counterclockwise.duties.clear()
+            await lock._rotateCounterClockwise()
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(lock._clockwise.duties, [0, FULL_DUTY, 0, 0])
+        self.assertEqual(lock._counterclockwise.duties, [0, FULL_DUTY, 0, FULL_DUTY])
+
+    def test_reversalWaitsForMotorToCoast(self):
+        # braking would short discrete bridge, so it is not used unless enabled
+        lock = self.engine(motionProfile=FULL_SPEED)
+        duties = []
+
+        async def ticker():
+            for i in range(4):
+                duties.append(lock._counterclockwise.duty_u16())
+                await asyncio.sleep(REVERSAL_COAST_MS / 4000)
+
+        async def scenario():
+            await lock._rotateClockwise()
+            lock._clockwise.duties.clear()
+            await asyncio.gather(lock._rotateCounterClockwise(), ticker())
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(duties, [0, 0, 0, 0])
+        self.assertEqual(lock._clockwise.duties, [0, 0])
+        self.assertEqual(lock._counterclockwise.duty_u16(), FULL_DUTY)
+
+    def test_stopLetsMotorCoast(self):
+        lock = self.engine(motionProfile=FULL_SPEED)
+
+        async def scenario():
+            await lock._rotateClockwise()
+            lock._clockwise.duties.clear()
+            await lock._stopLock()
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(lock._clockwise.duties, [0])
+        self.assertEqual(lock._counterclockwise.duty_u16(), 0)
+
+    def test_standingMotorIsNotBraked(self):
+        lock = self.engine(motionProfile=FULL_SPEED, brakeMs=BRAKE_TIME_MS)
+        lock._clockwise.duties.clear()
+
+        self.loop.run_until_complete(lock._stopLock())
+
+        self.assertNotIn(FULL_DUTY, lock._clockwise.duties)
+
+    def test_deadTimeDoesNotBlockEventLoop(self):
+        lock = self.engine(motionProfile=FULL_SPEED, deadTimeMs=50)
+        ticks = []
+
+        async def ticker():
+            for i in range(3):
+                ticks.append(lock._clockwise.duty_u16())
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            await asyncio.gather(lock._rotateClockwise(), ticker())
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(ticks, [0, 0, 0])
+        self.assertEqual(lock._clockwise.duty_u16(), FULL_DUTY)
@@ -0,0 +1,51 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from src.drivers.lock_manipulator.motion_profile import TrapezoidalProfile
+
+
+class TestTrapezoidalProfile(unittest.TestCase):
+    def setUp(self):
+        self.profile = TrapezoidalProfile(acceleration=2.0, cruiseSpeed=0.8, minimalSpeed=0.2,
+                                          decelerationRotations=0.5)
+
+    def test_startsWithMinimalSpeed(self):
+        self.assertAlmostEqual(self.profile.speed(0, 3), 0.2)
+
+    def test_acceleratesUpToCruiseSpeed(self):
+        self.assertAlmostEqual(self.profile.speed(150, 3), 0.5)
+        self.assertAlmostEqual(self.profile.speed(5000, 3), 0.8)
+
+    def test_deceleratesBeforeTarget(self):
+        self.assertAlmostEqual(self.profile.speed(5000, 0.25), 0.5)
+        self.assertAlmostEqual(self.profile.speed(5000, 0), 0.2)
+        self.assertAlmostEqual(self.profile.speed(5000, -0.1), 0.2)
+
+    def test_shortMoveNeverReachesCruiseSpeed(self):
+        self.assertAlmostEqual(self.profile.speed(100, 0.1), 0.32)
+
+    def test_equalSpeedsMakeConstantProfile(self):
+        profile = TrapezoidalProfile(minimalSpeed=1.0)
+
+        self.assertTrue(profile.isConstant())
+        self.assertFalse(self.profile.isConstant())
+        self.assertEqual(profile.speed(0, 3), 1.0)
+        self.assertEqual(profile.speed(100, 0), 1.0)
+
+    def test_rejectsInvalidSpeeds(self):
+        with self.assertRaises(ValueError):
+            TrapezoidalProfile(cruiseSpeed=0.5, minimalSpeed=0.6)
+        with self.assertRaises(ValueError):
+            TrapezoidalProfile(acceleration=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
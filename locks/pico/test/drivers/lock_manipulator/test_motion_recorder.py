@@ -0,0 +1,83 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import struct
+import unittest
+
+from src.drivers.lock_manipulator.lock_manipulator import LOCK_WORKING_LOCKING, LOCK_LOCKED
+from src.drivers.lock_manipulator.motion_recorder import *
+
+
+class TestMotionRecorder(unittest.TestCase):
+    def test_emptyRecorder(self):
+        recorder = MotionRecorder(4)
+        lines = []
+
+        recorder.dump(lines.append)
+
+        self.assertEqual(recorder.getStored(), 0)
+        self.assertEqual(lines, ["us,rotations,command,state"])
+
+    def test_samplesAreKeptInOrder(self):
+        recorder = MotionRecorder(4)
+
+        recorder.record(0.0, MOTION_ROTATE_CLOCKWISE, LOCK_WORKING_LOCKING)
+        recorder.record(0.5, MOTION_POSITION, LOCK_WORKING_LOCKING)
+
+        self.assertEqual(recorder.getStored(), 2)
+        self.assertEqual(recorder.sample(0)[1:], (0.0, MOTION_ROTATE_CLOCKWISE, LOCK_WORKING_LOCKING))
+        self.assertEqual(recorder.sample(1)[1:], (0.5, MOTION_POSITION, LOCK_WORKING_LOCKING))
+
+    def test_oldestSamplesAreOverwritten(self):
+        recorder = MotionRecorder(3)
+
+        for i in range(5):
+            recorder.record(i, MOTION_POSITION, LOCK_WORKING_LOCKING)
+
+        self.assertEqual(recorder.count, 5)
+        self.assertEqual(recorder.getStored(), 3)
+        self.assertEqual([recorder.sample(i)[1] for i in range(3)], [2.0, 3.0, 4.0])
+        with self.assertRaises(ValueError):
+            recorder.sample(3)
+
+    def test_disabledRecorderIgnoresSamples(self):
+        recorder = MotionRecorder(3)
+        recorder.enabled = False
+
+        recorder.record(1.0, MOTION_STOP, LOCK_LOCKED)
+
+        self.assertEqual(recorder.getStored(), 0)
+
+    def test_packsWholeRecordsIntoBuffer(self):
+        recorder = MotionRecorder(4)
+        for i in range(3):
+            recorder.record(i, MOTION_POSITION, LOCK_WORKING_LOCKING)
+        buffer = bytearray(2 * MOTION_RECORD_SIZE + 5)
+
+        packed = recorder.packInto(buffer, 1)
+
+        self.assertEqual(packed, 2)
+        self.assertEqual(struct.unpack_from(MOTION_RECORD_FORMAT, buffer, 0)[1:],
+                         (1.0, MOTION_POSITION, LOCK_WORKING_LOCKING))
+        self.assertEqual(struct.unpack_from(MOTION_RECORD_FORMAT, buffer, MOTION_RECORD_SIZE)[1], 2.0)
+        self.assertEqual(recorder.packInto(buffer, 3), 0)
+
+    def test_recordSizeMatchesFormat(self):
+        self.assertEqual(struct.calcsize(MOTION_RECORD_FORMAT), MOTION_RECORD_SIZE)
+
+    def test_dumpsCsvRelativeToOldestSample(self):
+        recorder = MotionRecorder(4)
+        recorder.record(0.0, MOTION_ROTATE_CLOCKWISE, LOCK_WORKING_LOCKING)
+        recorder.record(1.25, MOTION_STOP, LOCK_WORKING_LOCKING)
+        lines = []
+
+        recorder.dump(lines.append)
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1], f"0,0.000,{MOTION_ROTATE_CLOCKWISE},{LOCK_WORKING_LOCKING}")
+        self.assertTrue(lines[2].endswith(f",1.250,{MOTION_STOP},{LOCK_WORKING_LOCKING}"))
@@ -0,0 +1,117 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import struct
+import time
+import unittest
+
+from src.drivers.lock_manipulator.operation_timer import *
+
+
+class TestOperationTimer(unittest.TestCase):
+    def totalCount(self, timer, phase):
+        return sum(timer.getCount(phase, bucket) for bucket in range(HISTOGRAM_BUCKETS))
+
+    def test_marksAreIgnoredWithoutOperation(self):
+        timer = OperationTimer()
+
+        timer.mark(PHASE_LOCK_ACQUIRED)
+        timer.finish()
+
+        self.assertFalse(timer.isMarked(PHASE_LOCK_ACQUIRED))
+        self.assertEqual(timer.completed, 0)
+
+    def test_finishedOperationFillsHistogramsOfMarkedPhases(self):
+        timer = OperationTimer()
+
+        timer.begin()
+        timer.mark(PHASE_LOCK_ACQUIRED)
+        timer.mark(PHASE_MOTOR_STARTED)
+        timer.finish()
+
+        self.assertEqual(timer.completed, 1)
+        self.assertFalse(timer.isActive())
+        for phase in (PHASE_COMMAND_RECEIVED, PHASE_LOCK_ACQUIRED, PHASE_MOTOR_STARTED, PHASE_CALLBACK_FIRED):
+            self.assertEqual(self.totalCount(timer, phase), 1)
+        self.assertEqual(self.totalCount(timer, PHASE_TARGET_REACHED), 0)
+
+    def test_onlyFirstMarkOfPhaseIsKept(self):
+        timer = OperationTimer()
+        timer.begin()
+        timer.mark(PHASE_MOTOR_STARTED)
+        time.sleep(0.01)
+        timer.mark(PHASE_MOTOR_STARTED)
+        timer.finish()
+
+        self.assertEqual(timer.getCount(PHASE_MOTOR_STARTED, 0), 1)
+        self.assertGreater(timer.percentile(PHASE_CALLBACK_FIRED, 50), 8000)
+
+    def test_movementIsMarkedOnlyAfterMotorStart(self):
+        timer = OperationTimer()
+        timer.begin()
+
+        timer.markMovement()
+        self.assertFalse(timer.isMarked(PHASE_FIRST_MOVEMENT))
+        timer.mark(PHASE_MOTOR_STARTED)
+        timer.markMovement()
+
+        self.assertTrue(timer.isMarked(PHASE_FIRST_MOVEMENT))
+
+    def test_newOperationAbandonsRunningOne(self):
+        timer = OperationTimer()
+
+        timer.begin()
+        timer.mark(PHASE_LOCK_ACQUIRED)
+        timer.begin()
+        timer.cancel()
+
+        self.assertEqual(timer.abandoned, 2)
+        self.assertEqual(timer.completed, 0)
+
+    def test_commandWaitingForLockIsNotRestarted(self):
+        timer = OperationTimer()
+        timer.begin()
+        time.sleep(0.01)
+
+        timer.beginIfIdle()
+        timer.finish()
+
+        self.assertEqual(timer.abandoned, 0)
+        self.assertGreater(timer.percentile(PHASE_COMMAND_RECEIVED, 50), 8000)
+
+    def test_durationsAreSortedIntoDoublingBuckets(self):
+        timer = OperationTimer()
+
+        timer._add(PHASE_STOP_ISSUED, 100)
+        timer._add(PHASE_STOP_ISSUED, 400)
+        timer._add(PHASE_STOP_ISSUED, 10 ** 9)
+
+        self.assertEqual(timer.getCount(PHASE_STOP_ISSUED, 0), 1)
+        self.assertEqual(timer.getCount(PHASE_STOP_ISSUED, 1), 1)
+        self.assertEqual(timer.getCount(PHASE_STOP_ISSUED, HISTOGRAM_BUCKETS - 1), 1)
+        self.assertEqual(timer.percentile(PHASE_STOP_ISSUED, 50), 2 * FIRST_BUCKET_US)
+        self.assertEqual(timer.percentile(PHASE_RECENTER_DONE, 50), 0)
+
+    def test_packsHeaderAndCounts(self):
+        timer = OperationTimer()
+        timer.begin()
+        timer.finish()
+
+        packed = timer.pack()
+
+        self.assertEqual(len(packed), struct.calcsize(METRICS_HEADER_FORMAT) + 2 * PHASE_COUNT * HISTOGRAM_BUCKETS)
+        self.assertEqual(struct.unpack_from(METRICS_HEADER_FORMAT, packed), (1, 0, PHASE_COUNT, HISTOGRAM_BUCKETS))
+        self.assertEqual(struct.unpack_from("<H", packed, struct.calcsize(METRICS_HEADER_FORMAT))[0], 1)
+
+    def test_dumpsLinePerPhase(self):
+        timer = OperationTimer()
+        lines = []
+
+        timer.dump(lines.append)
+
+        self.assertEqual(len(lines), PHASE_COUNT + 1)
@@ -0,0 +1,70 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from src.drivers.lock_manipulator.stall_detector import LoadStallDetector
+
+
+class TestLoadStallDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = LoadStallDetector(sensitivity=4.0, margin=20, startupSamples=2, confirmations=2)
+
+    def _learn(self, direction, load, samples=30):
+        self.detector.start(direction)
+        for i in range(samples):
+            self.assertFalse(self.detector.sample(load + (i % 3)))
+
+    def test_ignoresStartupSamples(self):
+        self._learn(1, 100)
+        self.detector.start(1)
+
+        self.assertFalse(self.detector.sample(900))
+        self.assertFalse(self.detector.sample(900))
+
+    def test_detectsLoadAboveLearnedEnvelope(self):
+        self._learn(1, 100)
+        self.detector.start(1)
+        self.detector.sample(100)
+        self.detector.sample(100)
+
+        self.assertFalse(self.detector.sample(400))
+        self.assertTrue(self.detector.sample(400))
+
+    def test_singleSpikeIsNotStall(self):
+        self._learn(1, 100)
+
+        self.assertFalse(self.detector.sample(400))
+        self.assertFalse(self.detector.sample(100))
+        self.assertFalse(self.detector.sample(400))
+
+    def test_learnsEachDirectionSeparately(self):
+        self._learn(1, 100)
+        self._learn(-1, 500)
+
+        self.assertFalse(self.detector.sample(-500))
+        self.assertFalse(self.detector.sample(-500))
+        self.assertLess(self.detector.getEnvelope(1), 200)
+        self.assertGreater(self.detector.getEnvelope(-1), 500)
+
+    def test_doesNotDetectBeforeLearning(self):
+        self.detector.start(1)
+
+        for i in range(10):
+            self.assertFalse(self.detector.sample(100 if i < 5 else 900))
+
+    def test_maxLoadIsAlwaysStall(self):
+        detector = LoadStallDetector(maxLoad=1000)
+        detector.start(-1)
+
+        self.assertTrue(detector.sample(-1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
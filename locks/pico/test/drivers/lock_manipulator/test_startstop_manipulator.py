@@ -0,0 +1,319 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import struct
+import time
+import unittest
+
+from machine import Pin
+
+from src.drivers.lock_manipulator.calibration import LockCalibration
+from src.drivers.lock_manipulator.lock_manipulator import *
+from src.drivers.lock_manipulator.motion_recorder import *
+from src.drivers.lock_manipulator.operation_timer import *
+from src.drivers.lock_manipulator.step_timing import StepTimingModel
+from src.drivers.lock_manipulator.startstop_manipulator import StartStopLockManipulator
+from src.drivers.rotation_detector.rotation_detector import RotationDetector
+
+CALIBRATION_FILE = "test_startstop_calibration.bin"
+
+
+class StubDetector(RotationDetector):
+    suspended = False
+
+    def rotate(self, degrees):
+        self._updateDegrees(degrees)
+
+    def suspend(self):
+        self.suspended = True
+
+    def resume(self):
+        self.suspended = False
+
+
+class StubManipulator(StartStopLockManipulator):
+    def __init__(self, interval=None, recorder=None, stepTiming=None, timer=None, calibration=None):
+        super().__init__(StubDetector(), Pin(13), calibration=calibration, recorder=recorder, stepTiming=stepTiming,
+                         timer=timer)
+        self.interval = interval
+        self.storedOnRotate = []
+
+    async def _rotateClockwise(self):
+        if self._calibration is not None:
+            stored = LockCalibration(CALIBRATION_FILE)
+            self.storedOnRotate.append(stored.state if stored.load() else None)
+
+    def _supervisionInterval(self):
+        return self.interval
+
+
+class TestStartStopLockManipulatorWakeup(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def waitForRotation(self, lock, rotateAfter=None):
+        async def scenario():
+            await lock.init(initialState=LOCK_LOCKED)
+            await lock._updateLastPositionChange()
+            if rotateAfter is not None:
+                self.loop.call_later(rotateAfter, lock._detector.rotate, 20)
+            start = time.monotonic()
+            await lock._waitForRotation()
+            return time.monotonic() - start
+
+        return self.loop.run_until_complete(scenario())
+
+    def test_wakesUpOnRotationChange(self):
+        elapsed = self.waitForRotation(StubManipulator(), rotateAfter=0.02)
+
+        self.assertLess(elapsed, 0.5)
+
+    def test_wakesUpForHardwareCheck(self):
+        elapsed = self.waitForRotation(StubManipulator(interval=20))
+
+        self.assertLess(elapsed, 0.5)
+
+    def test_wakesUpToPollDetector(self):
+        lock = StubManipulator()
+        lock._detector.getPollInterval = lambda: 20
+
+        elapsed = self.waitForRotation(lock)
+
+        self.assertLess(elapsed, 0.5)
+
+    def test_wakesUpWhenNotMovingTimeoutPasses(self):
+        lock = StubManipulator()
+
+        elapsed = self.waitForRotation(lock)
+
+        self.assertGreater(elapsed, 2.0)
+        self.assertTrue(self.loop.run_until_complete(lock._detectNotMoving()))
+
+    def test_learnedStepTimingShortensNotMovingTimeout(self):
+        steps = StepTimingModel(floorMs=100)
+        for i in range(10):
+            steps.record(1, False, 20)
+        lock = StubManipulator(stepTiming=steps)
+
+        async def scenario():
+            await lock.init(initialState=LOCK_LOCKED)
+            await lock._rotateToUnlock()
+            lock._detector.rotate(10)
+            await lock._updateLastPositionChange()
+            lock._rotationFlag.clear()
+            start = time.monotonic()
+            await lock._waitForRotation()
+            return time.monotonic() - start
+
+        elapsed = self.loop.run_until_complete(scenario())
+
+        self.assertGreater(elapsed, 0.05)
+        self.assertLess(elapsed, 0.5)
+        self.assertTrue(self.loop.run_until_complete(lock._detectNotMoving()))
+
+    def test_stepsAreLearnedFromRotateCommand(self):
+        steps = StepTimingModel()
+        lock = StubManipulator(stepTiming=steps)
+
+        async def scenario():
+            await lock.init(initialState=LOCK_LOCKED)
+            await lock._rotateToUnlock()
+            for i in range(6):
+                await asyncio.sleep(0.01)
+                lock._detector.rotate(10)
+                await lock._updateLastPositionChange()
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertIsNone(steps.getExpectedInterval(1, starting=True))
+        self.assertIsNotNone(steps.getExpectedInterval(1))
+        self.assertLess(steps.getExpectedInterval(1), 200)
+
+
+class TestStartStopLockManipulatorRecording(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_recordsCommandsPositionsAndStates(self):
+        lock = StubManipulator(recorder=MotionRecorder(16))
+
+        async def scenario():
+            await lock.init(initialState=LOCK_LOCKED)
+            lock._state = LOCK_WORKING_UNLOCKING
+            await lock._rotateToUnlock()
+            lock._detector.rotate(90)
+            await lock._updateLastPositionChange()
+            await lock._stop()
+
+        self.loop.run_until_complete(scenario())
+
+        recorder = lock.getRecorder()
+        self.assertEqual([recorder.sample(i)[2] for i in range(recorder.getStored())],
+                         [MOTION_ROTATE_CLOCKWISE, MOTION_POSITION, MOTION_STOP])
+        self.assertEqual(recorder.sample(1)[1], 0.25)
+        self.assertEqual(recorder.sample(2)[3], LOCK_WORKING_UNLOCKING)
+
+
+class TestStartStopLockManipulatorTiming(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_finishedOperationIsVisibleInStateCallback(self):
+        timer = OperationTimer()
+        lock = StubManipulator(timer=timer)
+        completed = []
+        lock.lockStateChangeCallback(
+            lambda state, error, manipulator: completed.append(struct.unpack_from(METRICS_HEADER_FORMAT,
+                                                                                   timer.pack())[0]))
+
+        async def scenario():
+            await lock.init(initialState=LOCK_LOCKED)
+            timer.begin()
+            await lock.unlock()
+            task = lock._task
+            await lock._lock.acquire()
+            try:
+                await lock._markFinished(LOCK_UNLOCKED)
+            finally:
+                lock._lock.release()
+            task.cancel()
+            await asyncio.sleep(0)
+
+        self.loop.run_until_complete(scenario())
+
+        # working state is reported before operation ends, final state after it
+        self.assertEqual(completed, [0, 1])
+        self.assertTrue(timer.isMarked(PHASE_CALLBACK_FIRED))
+
+
+class TestStartStopLockManipulatorCalibration(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        calibration = LockCalibration(CALIBRATION_FILE)
+        calibration.targetRotations = 2
+        calibration.direction = LOCK_DIRECTION_COUNTERCLOCKWISE
+        calibration.state = LOCK_LOCKED
+        calibration.save()
+        self.lock = StubManipulator(calibration=LockCalibration(CALIBRATION_FILE))
+
+    def tearDown(self):
+        if self.lock._task is not None:
+            self.lock._task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        LockCalibration(CALIBRATION_FILE).clear()
+
+    def storedState(self):
+        stored = LockCalibration(CALIBRATION_FILE)
+        return stored.state if stored.load() else None
+
+    def test_storedStateIsUnconfirmedBeforeMotorStarts(self):
+        self.loop.run_until_complete(self.lock.init(initialState=LOCK_LOCKED))
+
+        self.loop.run_until_complete(self.lock.unlock())
+
+        self.assertEqual(self.lock.storedOnRotate, [LOCK_UNINITIALIZED])
+        self.assertEqual(self.storedState(), LOCK_UNINITIALIZED)
+
+    def test_storedStateIsUnconfirmedOncePerOperation(self):
+        self.loop.run_until_complete(self.lock.init(initialState=LOCK_LOCKED))
+        calibration = self.lock._calibration
+        saves = []
+        save = calibration.save
+        calibration.save = lambda: saves.append(save())
+
+        self.loop.run_until_complete(self.lock.unlock())
+        # e.g. recentering rotates again in same operation
+        self.loop.run_until_complete(self.lock._rotateToUnlock())
+
+        self.assertEqual(len(saves), 1)
+
+    def test_storedStateIsLoadedOnInit(self):
+        self.loop.run_until_complete(self.lock.init(initialState=LOCK_LOCKED))
+
+        self.assertEqual(self.lock._calibration.state, LOCK_LOCKED)
+
+    def test_restoredUnlockedStateKeepsUnlockedPosition(self):
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2, initialState=LOCK_LOCKED))
+        self.lock._calibration.state = LOCK_UNLOCKED
+        self.lock._zeroSwitch._pin.value(0)
+
+        self.assertTrue(self.loop.run_until_complete(self.lock._restoreState()))
+        self.assertEqual(self.lock.getLockState(), LOCK_UNLOCKED)
+        self.assertEqual(self.lock._detector.getCurrentRotations(), 2)
+
+
+class TestStartStopLockManipulatorCommands(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.lock = StubManipulator()
+        self.states = []
+        self.lock.lockStateChangeCallback(lambda state, error, lock: self.states.append(state))
+        self.loop.run_until_complete(self.lock.init(initialState=LOCK_LOCKED))
+
+    def tearDown(self):
+        if self.lock._task is not None:
+            self.lock._task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    def whileBusy(self, *commands):
+        async def scenario():
+            await self.lock._lock.acquire()
+            requests = [asyncio.create_task(command()) for command in commands]
+            await asyncio.sleep(0)
+            self.lock._lock.release()
+            await asyncio.gather(*requests)
+
+        self.loop.run_until_complete(scenario())
+
+    def test_commandsGivenWhileBusyAreCoalesced(self):
+        self.whileBusy(self.lock.unlock, self.lock.lock, self.lock.unlock)
+
+        self.assertEqual(self.states, [LOCK_WORKING_UNLOCKING])
+
+    def test_commandCancelledByNewerOneIsNotApplied(self):
+        self.whileBusy(self.lock.unlock, self.lock.lock)
+
+        self.assertEqual(self.states, [])
+        self.assertEqual(self.lock.getLockState(), LOCK_LOCKED)
+
+    def test_unlockedPositionIsSetOnInit(self):
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=3, initialState=LOCK_UNLOCKED,
+                                                    lockDirection=LOCK_DIRECTION_COUNTERCLOCKWISE))
+
+        self.assertEqual(self.lock._detector.getCurrentRotations(), 3)
+        self.assertEqual(self.lock._remainingRotations(), 0)
+
+    def test_detectorIsSuspendedOnlyWhileIdle(self):
+        self.assertTrue(self.lock._detector.suspended)
+
+        self.loop.run_until_complete(self.lock.unlock())
+        self.assertFalse(self.lock._detector.suspended)
+        task = self.lock._task
+        self.loop.run_until_complete(self.lock._markError(LOCK_ERROR_STALLED))
+        task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertTrue(self.lock._detector.suspended)
+
+    def test_commandInErrorStateIsRejected(self):
+        self.lock._state = LOCK_ERROR
+
+        with self.assertRaises(RuntimeError):
+            self.loop.run_until_complete(self.lock.lock())
@@ -0,0 +1,67 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from src.drivers.lock_manipulator.step_timing import *
+
+
+class TestStepTimingModel(unittest.TestCase):
+    def test_timeoutIsUnknownUntilEnoughSteps(self):
+        model = StepTimingModel()
+
+        for i in range(MIN_STEP_SAMPLES - 1):
+            model.record(1, False, 100)
+
+        self.assertIsNone(model.getTimeout(1))
+
+    def test_steadyStepsGiveMultipliedInterval(self):
+        model = StepTimingModel(multiplier=3.0, floorMs=10)
+
+        for i in range(50):
+            model.record(1, False, 100)
+
+        self.assertAlmostEqual(model.getTimeout(1), 300, delta=5)
+
+    def test_irregularStepsGiveLongerTimeout(self):
+        steady = StepTimingModel(floorMs=10)
+        irregular = StepTimingModel(floorMs=10)
+
+        for i in range(50):
+            steady.record(1, False, 100)
+            irregular.record(1, False, 50 if i % 2 == 0 else 150)
+
+        self.assertGreater(irregular.getTimeout(1), steady.getTimeout(1))
+
+    def test_timeoutIsLimitedByFloorAndCeiling(self):
+        model = StepTimingModel(floorMs=200, ceilingMs=1000)
+
+        for i in range(10):
+            model.record(1, False, 10)
+            model.record(-1, False, 800)
+
+        self.assertEqual(model.getTimeout(1), 200)
+        self.assertEqual(model.getTimeout(-1), 1000)
+
+    def test_startAndDirectionsAreLearnedSeparately(self):
+        model = StepTimingModel(floorMs=10)
+
+        for i in range(10):
+            model.record(1, True, 400)
+            model.record(1, False, 20)
+
+        self.assertGreater(model.getTimeout(1, starting=True), model.getTimeout(1))
+        self.assertIsNone(model.getTimeout(-1))
+
+    def test_invalidParametersAreRejected(self):
+        with self.assertRaises(ValueError):
+            StepTimingModel(multiplier=0.5)
+        with self.assertRaises(ValueError):
+            StepTimingModel(floorMs=500, ceilingMs=100)
+        with self.assertRaises(ValueError):
+            StepTimingModel(smoothing=2)
@@ -0,0 +1,208 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import unittest
+
+import test.conditions
+from src.drivers.lock_manipulator.calibration import LockCalibration
+from src.drivers.lock_manipulator.lock_manipulator import *
+from src.drivers.lock_manipulator.operation_timer import *
+from src.drivers.lock_manipulator.wavesharesc_servo_manipulator import WaveshareScServoLockManipulator
+from src.drivers.rotation_detector.servo_encoder_detector import ServoEncoderRotationDetector
+from src.drivers.scservo.bus import ScServoBus
+from test.mock.scservo_simulator import SimulatedScServo, SimulatedScServoBus, SimulatedReedSwitch
+
+SIMULATION_TIMEOUT_MS = 100
+CALIBRATION_FILE = "test_lock_calibration.bin"
+
+
+@test.conditions.pc_only()
+class TestWaveshareSCLockManipulatorWithSimulator(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.servo = SimulatedScServo(fullSpeedRotationsPerSecond=4.0, limits=(-2.2, 2.2))
+        self.uart = SimulatedScServoBus(self.servo)
+        # simulation runs on non real-time host, so give responses more time than real servo needs
+        self.lock = WaveshareScServoLockManipulator(ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS),
+                                                    reedSwitchPin=SimulatedReedSwitch(self.servo))
+        self.states = []
+
+        def callback(state, error, lock):
+            self.states.append(state)
+
+        self.lock.lockStateChangeCallback(callback=callback)
+
+    def tearDown(self):
+        self.loop.close()
+        LockCalibration(CALIBRATION_FILE).clear()
+
+    def test_initFailsWithoutServo(self):
+        self.servo.online = False
+
+        with self.assertRaises(RuntimeError):
+            self.loop.run_until_complete(self.lock.init(fullLockRotations=2))
+
+        self.assertEqual(self.lock.getLockState(), LOCK_ERROR)
+        self.assertEqual(self.lock.getLockError(), LOCK_ERROR_HARDWARE_FAILURE)
+
+    def test_initSwitchesServoToWheelMode(self):
+        self.servo.table[9] = 0xFF
+
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2, initialState=LOCK_LOCKED))
+
+        self.assertEqual(bytes(self.servo.table[9:13]), bytes(4))
+        self.assertEqual(self.lock.getLockState(), LOCK_LOCKED)
+
+    def test_manipulatorsDoNotShareMotionProfile(self):
+        other = WaveshareScServoLockManipulator(ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS))
+
+        self.assertIsNot(self.lock._profile, other._profile)
+
+    def test_initRestoresStateFromCalibration(self):
+        self.lock = self.calibratedLock(neutralPosition=0)
+
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2))
+
+        self.assertEqual(self.lock.getLockState(), LOCK_UNLOCKED)
+        self.assertEqual(self.states, [LOCK_UNINITIALIZED, LOCK_UNLOCKED])
+        self.assertEqual(self.servo.table[44], 0)
+
+    def test_restoredUnlockedStateKeepsUnlockedPosition(self):
+        self.lock = self.calibratedLock(neutralPosition=0)
+
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2))
+
+        # locking has to rotate whole way, so detector must not be zeroed in unlocked state
+        self.assertEqual(self.lock._detector.getCurrentRotations(), 2)
+        self.lock._state = LOCK_WORKING_LOCKING
+        self.assertEqual(self.lock._remainingRotations(), 2)
+
+    def test_calibrationIsNotTrustedAwayFromNeutralPosition(self):
+        self.lock = self.calibratedLock(neutralPosition=300)
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2, initialState=LOCK_LOCKED))
+
+        self.assertFalse(self.loop.run_until_complete(self.lock._restoreState()))
+
+    def test_neutralPositionUsesEncoderResolution(self):
+        self.servo.positionsPerRotation = 4096
+        self.servo.rotations = 0.5
+        self.lock = WaveshareScServoLockManipulator(ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS),
+                                                    ServoEncoderRotationDetector(positionsPerRotation=4096),
+                                                    reedSwitchPin=SimulatedReedSwitch(self.servo))
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2, initialState=LOCK_LOCKED))
+
+        # half turn away from neutral position, with wrap around computed for 4096 positions
+        self.assertFalse(self.loop.run_until_complete(self.lock._isNeutralPosition(0)))
+        self.assertTrue(self.loop.run_until_complete(self.lock._isNeutralPosition(2100)))
+        self.assertTrue(self.loop.run_until_complete(self.lock._isNeutralPosition(2000)))
+
+    def test_calibrationOfOtherLockConfigurationIsNotTrusted(self):
+        self.lock = self.calibratedLock(neutralPosition=0)
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=3, initialState=LOCK_LOCKED))
+
+        self.assertFalse(self.loop.run_until_complete(self.lock._restoreState()))
+
+    def test_newerCommandReversesLockInFlight(self):
+        self.lock = self.calibratedLock(neutralPosition=0)
+
+        async def scenario():
+            await self.lock.init(fullLockRotations=2)
+            await self.lock.lock()
+            await asyncio.sleep(0.3)
+            await self.lock.unlock()
+            await self.lock._task
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(self.lock.getLockError(), None)
+        self.assertEqual(self.states, [LOCK_UNINITIALIZED, LOCK_UNLOCKED, LOCK_WORKING_LOCKING,
+                                       LOCK_WORKING_UNLOCKING, LOCK_UNLOCKED])
+        self.assertAlmostEqual(self.servo.rotations, 0, delta=0.1)
+
+    def test_operationPhasesAreTimed(self):
+        timer = OperationTimer()
+        self.lock = self.calibratedLock(neutralPosition=0, timer=timer)
+
+        async def scenario():
+            await self.lock.init(fullLockRotations=2)
+            await self.lock.lock()
+            await self.lock._task
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(timer.completed, 1)
+        for phase in range(PHASE_COUNT):
+            self.assertEqual(sum(timer.getCount(phase, bucket) for bucket in range(HISTOGRAM_BUCKETS)), 1)
+        self.assertGreater(timer.percentile(PHASE_COMMAND_RECEIVED, 50), timer.percentile(PHASE_LOCK_ACQUIRED, 50))
+
+    def test_repeatedCommandDoesNotAbortRecentering(self):
+        # servo coasts past narrow reed switch after stop, so lock has to be recentered
+        self.servo = SimulatedScServo(fullSpeedRotationsPerSecond=4.0, limits=(-2.2, 2.2), acceleration=3.0)
+        self.uart = SimulatedScServoBus(self.servo)
+        reedSwitch = SimulatedReedSwitch(self.servo, width=0.02)
+        self.lock = self.calibratedLock(neutralPosition=0, reedSwitch=reedSwitch)
+        recentered = []
+
+        async def scenario():
+            await self.lock.init(fullLockRotations=2)
+            await self.lock.lock()
+            while not (self.lock._homing and self.lock.getLockState() == LOCK_WORKING_LOCKING):
+                await asyncio.sleep(0.005)
+            recentered.append(True)
+            task = self.lock._task
+            await self.lock.lock()
+            await task
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual(recentered, [True])
+        self.assertEqual(self.lock.getLockError(), None)
+        self.assertEqual(self.lock.getLockState(), LOCK_LOCKED)
+        self.assertEqual(reedSwitch.value(), 0)
+
+    def calibratedLock(self, neutralPosition, reedSwitch=None, **options):
+        calibration = LockCalibration(CALIBRATION_FILE)
+        calibration.targetRotations = 2
+        calibration.direction = LOCK_DIRECTION_COUNTERCLOCKWISE
+        calibration.state = LOCK_UNLOCKED
+        calibration.neutralPosition = neutralPosition
+        calibration.save()
+        lock = WaveshareScServoLockManipulator(ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS),
+                                               reedSwitchPin=reedSwitch or SimulatedReedSwitch(self.servo),
+                                               calibration=LockCalibration(CALIBRATION_FILE), **options)
+        lock.lockStateChangeCallback(callback=lambda state, error, lock: self.states.append(state))
+        return lock
+
+    @test.conditions.slow()
+    def test_lockCycleStoresCalibration(self):
+        calibration = LockCalibration(CALIBRATION_FILE)
+        self.lock = WaveshareScServoLockManipulator(ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS),
+                                                    reedSwitchPin=SimulatedReedSwitch(self.servo),
+                                                    calibration=calibration)
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2))
+        self.loop.run_until_complete(self.lock._task)
+
+        stored = LockCalibration(CALIBRATION_FILE)
+        self.assertTrue(stored.load())
+        self.assertEqual(stored.state, LOCK_UNLOCKED)
+        self.assertAlmostEqual(stored.madeRotations, 2, delta=0.1)
+        self.assertTrue(stored.matches(2, LOCK_DIRECTION_COUNTERCLOCKWISE))
+
+    @test.conditions.slow()
+    def test_lockCycle(self):
+        self.loop.run_until_complete(self.lock.init(fullLockRotations=2, lockDirection=LOCK_DIRECTION_COUNTERCLOCKWISE))
+        self.loop.run_until_complete(self.lock._task)
+        self.loop.run_until_complete(self.lock.lock())
+        self.loop.run_until_complete(self.lock._task)
+
+        self.assertEqual(self.lock.getLockError(), None)
+        self.assertEqual(self.states, [LOCK_UNINITIALIZED, LOCK_LOCKED, LOCK_WORKING_UNLOCKING, LOCK_UNLOCKED,
+                                       LOCK_WORKING_LOCKING, LOCK_LOCKED])
+        self.assertAlmostEqual(self.servo.rotations, -2, delta=0.1)
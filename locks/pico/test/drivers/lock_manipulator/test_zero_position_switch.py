@@ -0,0 +1,46 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from machine import Pin
+
+from src.drivers.lock_manipulator.zero_position_switch import ZeroPositionSwitch
+
+
+class TestZeroPositionSwitch(unittest.TestCase):
+    def setUp(self):
+        self.pin = Pin(13, value=1)
+        self.switch = ZeroPositionSwitch(self.pin)
+        self.calls = []
+        self.switch.init(lambda: self.calls.append(1))
+
+    def closingEdge(self):
+        self.pin._handler(self.pin)
+
+    def test_closingEdgeCallsHandlerAndTriggers(self):
+        self.switch.arm()
+
+        self.closingEdge()
+
+        self.assertEqual(self.calls, [1])
+        self.assertTrue(self.switch.triggered())
+        self.assertFalse(self.switch.isClosed())
+
+    def test_bounceIsIgnored(self):
+        self.closingEdge()
+        self.closingEdge()
+
+        self.assertEqual(self.calls, [1])
+
+    def test_armForgetsPreviousEdges(self):
+        self.closingEdge()
+
+        self.switch.arm()
+
+        self.assertFalse(self.switch.triggered())
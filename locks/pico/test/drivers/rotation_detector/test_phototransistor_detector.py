@@ -0,0 +1,194 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+from array import array
+
+import rp2
+from machine import ADC, mem32
+
+import test.conditions
+from src.drivers.rotation_detector.phototransistor_detector import *
+
+THRESHOLDS_TEST_FILE = "test_detector_thresholds.bin"
+
+
+@test.conditions.pc_only()
+class TestSteppingPhotoTransistorRotationDetector(unittest.TestCase):
+    def test_suspendStopsSamplingAndKeepsPosition(self):
+        detector = SteppingPhotoTransistorRotationDetector(ADC(28))
+        detector.setCurrentDegree(40)
+
+        detector.suspend()
+
+        self.assertFalse(detector.isSampling())
+        self.assertFalse(detector._timer.running)
+        self.assertEqual(detector.getCurrentDegree(), 40)
+
+    def test_resumeRestartsSampling(self):
+        detector = SteppingPhotoTransistorRotationDetector(ADC(28))
+        detector.suspend()
+        detector.setCurrentDegree(40)
+
+        detector.resume()
+
+        self.assertTrue(detector.isSampling())
+        self.assertTrue(detector._timer.running)
+        self.assertEqual(detector.getCurrentDegree(), 40)
+
+    def test_blockIsProcessedInOnePass(self):
+        detector = SteppingPhotoTransistorRotationDetector(ADC(28))
+        changes = []
+        detector.irq(lambda trigger, value: changes.append(value))
+        samples = array("H", [0, 50000, 30000, 50000, 5000, 30000, 50000, 0])
+
+        detector._processBlock(samples, len(samples))
+
+        # bouncing between thresholds is not counted again, only rise after falling below low threshold is
+        self.assertAlmostEqual(detector.getCurrentDegree(), 2 * 360.0 / STEPS_COUNT)
+        self.assertEqual(len(changes), 1)
+
+    def test_shiftedBlockUsesScaledThresholds(self):
+        detector = SteppingPhotoTransistorRotationDetector(ADC(28))
+        samples = array("H", [0, 50000 >> ADC_FIFO_SHIFT, 0])
+
+        detector._processBlock(samples, len(samples), ADC_FIFO_SHIFT)
+
+        self.assertAlmostEqual(detector.getCurrentDegree(), 360.0 / STEPS_COUNT)
+
+    def test_stateIsKeptBetweenBlocks(self):
+        detector = SteppingPhotoTransistorRotationDetector(ADC(28))
+        detector._processBlock(array("H", [0, 0]), 2)
+
+        detector._processBlock(array("H", [50000, 50000]), 2)
+
+        self.assertAlmostEqual(detector.getCurrentDegree(), 360.0 / STEPS_COUNT)
+
+    def test_dimSignalIsCountedWithLearnedThresholds(self):
+        pin = ADC(28)
+        detector = SteppingPhotoTransistorRotationDetector(
+            pin, ThresholdTracker(ADC_HIGH_VALUE, ADC_LOW_VALUE, THRESHOLDS_TEST_FILE))
+        self.addCleanup(ThresholdTracker(2, 1, THRESHOLDS_TEST_FILE).clear)
+
+        # reflector never gets above fixed high threshold
+        for value in (2000, 20000, 2000, 20000, 2000, 20000):
+            pin.value = value
+            detector._irq(detector._timer)
+
+        self.assertAlmostEqual(detector.getCurrentDegree(), 3 * 360.0 / STEPS_COUNT)
+
+    def test_learnedThresholdsAreSavedOnSuspend(self):
+        pin = ADC(28)
+        detector = SteppingPhotoTransistorRotationDetector(
+            pin, ThresholdTracker(ADC_HIGH_VALUE, ADC_LOW_VALUE, THRESHOLDS_TEST_FILE))
+        self.addCleanup(ThresholdTracker(2, 1, THRESHOLDS_TEST_FILE).clear)
+        detector.init()
+        for value in (2000, 20000):
+            pin.value = value
+            detector._irq(detector._timer)
+
+        detector.suspend()
+
+        restarted = SteppingPhotoTransistorRotationDetector(
+            pin, ThresholdTracker(ADC_HIGH_VALUE, ADC_LOW_VALUE, THRESHOLDS_TEST_FILE))
+        self.assertEqual(restarted.getThresholds(), detector.getThresholds())
+        self.assertLess(restarted.getThresholds()[1], 20000)
+
+
+class FakeDma:
+    def __init__(self):
+        self.handler = None
+        self.running = False
+        self.writes = []
+
+    def pack_ctrl(self, **kwargs):
+        return kwargs
+
+    def irq(self, handler=None):
+        self.handler = handler
+
+    def config(self, read=None, write=None, count=None, ctrl=None, trigger=False):
+        self.writes.append(write)
+        self.running = trigger
+
+    def active(self, value=None):
+        if value is not None:
+            self.running = bool(value)
+        return self.running
+
+
+@test.conditions.pc_only()
+class TestBlockSampledPhotoTransistorRotationDetector(unittest.TestCase):
+    def dmaDetector(self, **options):
+        rp2.DMA = FakeDma
+        self.addCleanup(delattr, rp2, "DMA")
+        return BlockSampledPhotoTransistorRotationDetector(28, blockSize=4, **options)
+
+    def test_withoutDmaAdcIsPolledLikeSteppingDetector(self):
+        detector = BlockSampledPhotoTransistorRotationDetector(28)
+
+        self.assertFalse(detector.usesDma())
+        self.assertEqual(detector._timer.kwargs["period"], SAMPLING_PERIOD_MS)
+        self.assertEqual(detector._timer.kwargs["callback"], detector._irq)
+
+    def test_adcInputIsSelectedByPin(self):
+        detector = self.dmaDetector(sampleRate=1000)
+
+        self.assertTrue(detector.usesDma())
+        self.assertEqual(mem32[ADC_CS], ADC_CS_EN | ADC_CS_START_MANY | (2 << ADC_CS_AINSEL_SHIFT))
+        self.assertEqual(mem32[ADC_DIV], (ADC_CLOCK // 1000 - 1) << ADC_DIV_INT_SHIFT)
+        self.assertFalse(detector._timer.running)
+
+    def test_filledBlockIsProcessedWhileOtherIsFilled(self):
+        detector = self.dmaDetector()
+        dma = detector._dma
+        first, second = detector._buffers
+        for i, value in enumerate((0, 50000, 0, 50000)):
+            first[i] = value >> ADC_FIFO_SHIFT
+
+        dma.handler(dma)
+
+        self.assertAlmostEqual(detector.getCurrentDegree(), 2 * 360.0 / STEPS_COUNT)
+        self.assertEqual(dma.writes[-2:], [first, second])
+
+    def test_suspendStopsAdcStream(self):
+        detector = self.dmaDetector()
+
+        detector.suspend()
+
+        self.assertFalse(detector.isSampling())
+        self.assertFalse(detector._dma.active())
+        self.assertEqual(mem32[ADC_CS] & ADC_CS_START_MANY, 0)
+
+    def test_blockThresholdsAreLearned(self):
+        detector = BlockSampledPhotoTransistorRotationDetector(
+            28, thresholds=ThresholdTracker(ADC_HIGH_VALUE, ADC_LOW_VALUE, THRESHOLDS_TEST_FILE))
+        self.addCleanup(ThresholdTracker(2, 1, THRESHOLDS_TEST_FILE).clear)
+        samples = array("H", [2000 >> ADC_FIFO_SHIFT, 20000 >> ADC_FIFO_SHIFT])
+        detector._processBlock(samples, len(samples), ADC_FIFO_SHIFT)
+        self.assertEqual(detector.getCurrentDegree(), 0)
+
+        detector._processBlock(array("H", [2000 >> ADC_FIFO_SHIFT, 20000 >> ADC_FIFO_SHIFT]), 2, ADC_FIFO_SHIFT)
+
+        self.assertAlmostEqual(detector.getCurrentDegree(), 360.0 / STEPS_COUNT)
+
+    def test_suspendStopsTimer(self):
+        detector = BlockSampledPhotoTransistorRotationDetector(28)
+
+        detector.suspend()
+
+        self.assertFalse(detector.isSampling())
+        self.assertFalse(detector._timer.running)
+
+    def test_invalidParametersAreRejected(self):
+        with self.assertRaises(ValueError):
+            BlockSampledPhotoTransistorRotationDetector(25)
+        with self.assertRaises(ValueError):
+            BlockSampledPhotoTransistorRotationDetector(28, blockSize=0)
+        with self.assertRaises(ValueError):
+            BlockSampledPhotoTransistorRotationDetector(28, sampleRate=0)
@@ -0,0 +1,70 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from machine import Pin
+
+import test.conditions
+from src.drivers.rotation_detector.pio_edge_detector import *
+
+
+@test.conditions.pc_only()
+class TestPioEdgeCounterDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = PioEdgeCounterDetector(Pin(15), edgesPerRotation=4, debounceUs=500)
+        self.stateMachine = self.detector._stateMachine
+        self.changes = []
+        self.detector.irq(lambda trigger, value: self.changes.append(value), TRIGGER_ROTATION_CHANGE)
+
+    def countEdges(self, count):
+        # state machine counts edges down from 0
+        self.stateMachine.x = -count & 0xFFFFFFFF
+
+    def test_stateMachineIsStartedWithDebounceDelay(self):
+        self.assertTrue(self.stateMachine.running)
+        self.assertEqual(self.stateMachine.kwargs["freq"], PIO_FREQUENCY)
+        self.assertEqual(self.stateMachine._tx, [500])
+
+    def test_countIsReadWhenPositionIsAsked(self):
+        self.countEdges(2)
+
+        self.assertEqual(self.changes, [])
+        self.assertEqual(self.detector.getCurrentRotations(), 0.5)
+        self.assertEqual(self.changes, [180.0])
+        self.assertEqual(self.stateMachine.rx_fifo(), 0)
+
+    def test_edgesAreCountedInSetDirection(self):
+        self.detector.setDirection(-1)
+        self.countEdges(1)
+        self.detector.getCurrentDegree()
+        self.countEdges(3)
+
+        self.assertEqual(self.detector.getCurrentDegree(), -270.0)
+
+    def test_resetKeepsCountingFromResetPosition(self):
+        self.countEdges(5)
+        self.detector.getCurrentDegree()
+        self.detector.resetCurrentDegree()
+        self.countEdges(6)
+
+        self.assertEqual(self.detector.getCurrentDegree(), 90.0)
+
+    def test_counterOverflowIsHandled(self):
+        self.countEdges(0xFFFFFFFF)
+        self.detector.getCurrentDegree()
+        self.countEdges(1)
+
+        self.assertEqual(self.detector.getCurrentDegree(), 0xFFFFFFFF * 90.0 + 180.0)
+
+    def test_asksForPolling(self):
+        self.assertEqual(self.detector.getPollInterval(), POLL_INTERVAL_MS)
+
+    def test_invalidEdgesPerRotationAreRejected(self):
+        with self.assertRaises(ValueError):
+            PioEdgeCounterDetector(Pin(15), edgesPerRotation=0)
@@ -0,0 +1,99 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from machine import Pin
+
+import test.conditions
+from src.drivers.rotation_detector.quadrature_detector import *
+
+# channel A leads in clockwise rotation
+CLOCKWISE_SEQUENCE = ((1, 0), (1, 1), (0, 1), (0, 0))
+
+
+@test.conditions.pc_only()
+class TestQuadratureRotationDetector(unittest.TestCase):
+    def setUp(self):
+        self.pinA = Pin(14)
+        self.pinB = Pin(15)
+        self.detector = QuadratureRotationDetector(self.pinA, self.pinB)
+
+    def move(self, *states):
+        for a, b in states:
+            changed = self.pinA if self.pinA.value() != a else self.pinB
+            self.pinA.value(a)
+            self.pinB.value(b)
+            self.detector._irq(changed)
+
+    def test_bothChannelsTriggerOnBothEdges(self):
+        self.assertEqual(self.pinA._trigger, Pin.IRQ_FALLING | Pin.IRQ_RISING)
+        self.assertEqual(self.pinB._trigger, Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
+    def test_clockwiseCycleIsFullRotation(self):
+        self.move(*CLOCKWISE_SEQUENCE)
+
+        self.assertEqual(self.detector.getCurrentRotations(), 1.0)
+
+    def test_counterclockwiseCycleIsNegative(self):
+        self.move(*reversed(((0, 0),) + CLOCKWISE_SEQUENCE[:3]))
+
+        self.assertEqual(self.detector.getCurrentRotations(), -1.0)
+
+    def rotateDisc(self, start, end, step=5):
+        # each sensor sees dark half of disc, pinB 90 degrees behind pinA
+        for degree in range(start, end, step if end > start else -step):
+            self.move((int(0 < degree % 360 <= 180), int(90 < degree % 360 <= 270)))
+
+    def test_halfDarkDiscIsTrackedBothWays(self):
+        self.rotateDisc(0, 3 * 360 + 1)
+        self.rotateDisc(3 * 360, 360 - 1)
+
+        self.assertEqual(self.detector.getCurrentRotations(), 1.0)
+        self.assertEqual(self.detector.invalidTransitions, 0)
+
+    def test_setDirectionIsIgnored(self):
+        self.detector.setDirection(-1)
+
+        self.move(*CLOCKWISE_SEQUENCE[:2])
+
+        self.assertEqual(self.detector.getCurrentDegree(), 180.0)
+
+    def test_reversalIsTracked(self):
+        self.move(*CLOCKWISE_SEQUENCE[:3])
+
+        self.move((1, 1), (1, 0))
+
+        self.assertEqual(self.detector.getCurrentDegree(), 90.0)
+
+    def test_bounceCancelsOut(self):
+        self.move((1, 0), (0, 0), (1, 0), (0, 0), (1, 0))
+
+        self.assertEqual(self.detector.getCurrentDegree(), 90.0)
+
+    def test_missedTransitionIsCountedAndIgnored(self):
+        self.move((1, 1))
+
+        self.assertEqual(self.detector.getCurrentDegree(), 0)
+        self.assertEqual(self.detector.invalidTransitions, 1)
+
+    def test_swappedSensorsAreReversed(self):
+        detector = QuadratureRotationDetector(Pin(16), Pin(17), cyclesPerRotation=2, clockwiseLeadsA=False)
+        detector._pinA.value(1)
+
+        detector._irq(detector._pinA)
+
+        self.assertEqual(detector.getCurrentDegree(), -45.0)
+
+    def test_changesAreReported(self):
+        changes = []
+        self.detector.irq(lambda trigger, value: changes.append(value), TRIGGER_ROTATION_CHANGE)
+
+        self.move(*CLOCKWISE_SEQUENCE[:2])
+
+        self.assertEqual(changes, [90.0, 180.0])
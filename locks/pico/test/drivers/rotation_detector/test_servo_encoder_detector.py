@@ -0,0 +1,61 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from src.drivers.rotation_detector.servo_encoder_detector import ServoEncoderRotationDetector
+
+
+class TestServoEncoderRotationDetector(unittest.TestCase):
+    def test_countsRotationsAcrossPositionWrap(self):
+        detector = ServoEncoderRotationDetector(positionsPerRotation=1000)
+
+        for position in (900, 100, 300, 500, 700, 900, 100):
+            detector.updatePosition(position)
+
+        self.assertAlmostEqual(detector.getCurrentRotations(), 1.2)
+
+    def test_countsBackwardRotationAsNegative(self):
+        detector = ServoEncoderRotationDetector(positionsPerRotation=1000)
+
+        for position in (100, 900, 700, 500):
+            detector.updatePosition(position)
+
+        self.assertAlmostEqual(detector.getCurrentRotations(), -0.6)
+
+    def test_ignoresCommandedDirection(self):
+        detector = ServoEncoderRotationDetector(positionsPerRotation=1000, clockwiseIncreasesPosition=False)
+        detector.setDirection(1)
+
+        detector.updatePosition(500)
+        detector.updatePosition(750)
+
+        self.assertAlmostEqual(detector.getCurrentRotations(), -0.25)
+
+    def test_ignoresNoiseInsideDeadband(self):
+        detector = ServoEncoderRotationDetector(positionsPerRotation=1000, deadband=2)
+
+        for position in (500, 502, 499, 501):
+            detector.updatePosition(position)
+
+        self.assertEqual(detector.getCurrentDegree(), 0)
+
+    def test_irqCalledOnPositionChange(self):
+        detector = ServoEncoderRotationDetector(positionsPerRotation=1000)
+        changes = []
+        detector.irq(lambda trigger, value: changes.append(value))
+
+        detector.updatePosition(0)
+        detector.updatePosition(100)
+
+        self.assertEqual(len(changes), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
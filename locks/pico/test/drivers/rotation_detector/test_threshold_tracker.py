@@ -0,0 +1,85 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from src.drivers.rotation_detector.threshold_tracker import *
+
+THRESHOLDS_TEST_FILE = "test_detector_thresholds.bin"
+
+
+class TestThresholdTracker(unittest.TestCase):
+    def tearDown(self):
+        ThresholdTracker(2, 1, THRESHOLDS_TEST_FILE).clear()
+
+    def test_initialThresholdsAreUsedUntilSpanIsLearned(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE)
+
+        self.assertFalse(tracker.track(20000, 20000))
+        self.assertFalse(tracker.track(21000, 21000))
+
+        self.assertEqual(tracker.getHigh(), 45000)
+        self.assertEqual(tracker.getLow(), 10000)
+
+    def test_thresholdsArePlacedBetweenEnvelopes(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE)
+        self.assertTrue(tracker.track(2000, 12000))
+
+        self.assertEqual(tracker.getEnvelope(), (2000, 12000))
+        self.assertEqual(tracker.getHigh(), 2000 + (10000 * HIGH_THRESHOLD >> 8))
+        self.assertEqual(tracker.getLow(), 2000 + (10000 * LOW_THRESHOLD >> 8))
+        self.assertGreater(tracker.getHigh(), tracker.getLow())
+
+    def test_envelopesDecayTowardsSignal(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE, decayShift=4)
+        tracker.track(0, 40000)
+
+        tracker.track(10000, 30000, samples=8)
+
+        # half of distance for 8 samples with 1/16 decay per sample
+        self.assertEqual(tracker.getEnvelope(), (5000, 35000))
+
+    def test_decayDoesNotPassSignal(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE, decayShift=1)
+        tracker.track(0, 40000)
+
+        tracker.track(10000, 30000, samples=100)
+
+        self.assertEqual(tracker.getEnvelope(), (10000, 30000))
+
+    def test_savedEnvelopesAreLoaded(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE)
+        tracker.track(3000, 20000)
+        tracker.save()
+
+        loaded = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE)
+
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.getEnvelope(), (3000, 20000))
+        self.assertEqual(loaded.getHigh(), tracker.getHigh())
+        self.assertEqual(loaded.getLow(), tracker.getLow())
+
+    def test_envelopesAreSavedOnlyAfterNoticeableChange(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE)
+        tracker.track(3000, 20000)
+        self.assertTrue(tracker.saveIfChanged())
+
+        tracker.track(3000, 20000 + SAVE_CHANGE - 1)
+
+        self.assertFalse(tracker.saveIfChanged())
+
+    def test_noiseIsNotSaved(self):
+        tracker = ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE)
+        tracker.track(20000, 21000)
+
+        self.assertFalse(tracker.saveIfChanged())
+        self.assertFalse(ThresholdTracker(45000, 10000, THRESHOLDS_TEST_FILE).load())
+
+    def test_invalidThresholdsAreRejected(self):
+        with self.assertRaises(ValueError):
+            ThresholdTracker(10000, 45000, THRESHOLDS_TEST_FILE)
@@ -0,0 +1,92 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import unittest
+
+import test.conditions
+from src.drivers.scservo.baudrate import BaudRateNegotiator
+from src.drivers.scservo.bus import ScServoBus
+from test.mock.scservo_simulator import SimulatedScServo, SimulatedScServoBus, BAUD_RATE_ADDR
+
+SIMULATION_TIMEOUT_MS = 100
+
+
+@test.conditions.pc_only()
+class TestBaudRateNegotiator(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.first = SimulatedScServo(servoId=1)
+        self.second = SimulatedScServo(servoId=2)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def negotiator(self, **kwargs):
+        self.uart = SimulatedScServoBus(self.first, self.second, **kwargs)
+        # simulation runs on non real-time host, so give responses more time than real servo needs
+        self.bus = ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS)
+        return BaudRateNegotiator(self.bus, servoIds=(1, 2), samples=10)
+
+    def test_findsBaudRateUsedByServos(self):
+        self.first.baudrate = self.second.baudrate = 250_000
+        negotiator = self.negotiator()
+
+        self.assertEqual(self.loop.run_until_complete(negotiator.find()), 250_000)
+        self.assertEqual(self.uart.baudrate, 250_000)
+
+    def test_keepsFastestReliableBaudRate(self):
+        self.first.baudrate = self.second.baudrate = 250_000
+        negotiator = self.negotiator(reliableBaudRate=500_000)
+
+        baudrate = self.loop.run_until_complete(negotiator.negotiate(candidates=(1_000_000, 500_000, 250_000)))
+
+        self.assertEqual(baudrate, 500_000)
+        self.assertEqual(self.uart.baudrate, 500_000)
+        self.assertEqual(self.first.baudrate, 500_000)
+        self.assertEqual(self.second.baudrate, 500_000)
+        results = negotiator.getResults()
+        self.assertEqual(set(results.keys()), {500_000})
+        failures, p50, p99 = results[500_000]
+        self.assertEqual(failures, 0)
+        self.assertTrue(0 < p50 <= p99)
+
+    def test_returnsToOriginalBaudRateWhenNoneIsReliable(self):
+        self.first.baudrate = self.second.baudrate = 250_000
+        negotiator = self.negotiator(reliableBaudRate=250_000)
+
+        baudrate = self.loop.run_until_complete(negotiator.negotiate(candidates=(1_000_000, 500_000)))
+
+        self.assertEqual(baudrate, 250_000)
+        self.assertEqual(self.uart.baudrate, 250_000)
+        self.assertEqual(self.first.baudrate, 250_000)
+
+    def test_measuresFailuresOfUnreliableBaudRate(self):
+        negotiator = self.negotiator()
+        self.loop.run_until_complete(negotiator.find())
+        self.uart.reliableBaudRate = 500_000
+
+        failures, p50, p99 = self.loop.run_until_complete(negotiator.measure())
+
+        self.assertEqual(failures, 20)
+
+    def test_persistUnlocksEeprom(self):
+        negotiator = self.negotiator()
+        self.loop.run_until_complete(negotiator.switch(500_000))
+
+        self.loop.run_until_complete(negotiator.persist())
+
+        self.assertEqual(self.first.table[BAUD_RATE_ADDR], 1)
+        self.assertEqual([parameters for servoId, instruction, parameters in self.uart.received[-3:]],
+                         [bytes((48, 0)), bytes((BAUD_RATE_ADDR, 1)), bytes((48, 1))])
+
+    def test_rejectsUnsupportedBaudRate(self):
+        negotiator = self.negotiator()
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(negotiator.switch(9600))
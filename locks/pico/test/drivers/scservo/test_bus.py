@@ -0,0 +1,163 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import unittest
+
+import test.conditions
+from src.drivers.scservo.bus import ScServoBus
+from src.drivers.scservo.protocol import *
+from src.drivers.scservo.telemetry import ServoTelemetry, TELEMETRY_LENGTH
+from src.drivers.scservo.transport import NO_RESPONSE
+from test.mock.scservo_simulator import SimulatedScServo, SimulatedScServoBus
+
+SIMULATION_TIMEOUT_MS = 100
+
+
+@test.conditions.pc_only()
+class TestScServoBusWithSimulator(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.first = SimulatedScServo(servoId=1, position=100)
+        self.second = SimulatedScServo(servoId=2)
+        self.uart = SimulatedScServoBus(self.first, self.second)
+        # simulation runs on non real-time host, so give responses more time than real servo needs
+        self.bus = ScServoBus(self.uart, timeoutMs=SIMULATION_TIMEOUT_MS)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_pingIsAnswered(self):
+        data, error = self.loop.run_until_complete(self.bus.servo(1).request(PING_INSTRUCTION))
+
+        self.assertEqual(bytes(data), b"")
+        self.assertEqual(error, 0)
+
+    def test_readsTelemetry(self):
+        data, error = self.loop.run_until_complete(
+            self.bus.servo(1).request(READ_INSTRUCTION, bytes((PRESENT_POSITION_MEMORY_ADDR, TELEMETRY_LENGTH))))
+        telemetry = ServoTelemetry()
+        telemetry.update(data, error)
+
+        self.assertTrue(telemetry.valid)
+        self.assertEqual(telemetry.position, 100)
+        self.assertEqual(telemetry.voltage, 120)
+        self.assertFalse(telemetry.moving)
+
+    def test_writeChangesControlTable(self):
+        frame = encodeFrame(2, WRITE_INSTRUCTION, bytes((TIME_MEMORY_ADDR, 40, 0)))
+
+        data, error = self.loop.run_until_complete(self.bus.servo(2).transaction(frame))
+
+        self.assertEqual(error, 0)
+        self.assertEqual(self.second.table[TIME_MEMORY_ADDR], 40)
+        self.assertEqual(self.first.table[TIME_MEMORY_ADDR], 0)
+
+    def test_missingServoDoesNotRespond(self):
+        self.second.online = False
+
+        data, error = self.loop.run_until_complete(self.bus.servo(2).request(PING_INSTRUCTION))
+
+        self.assertEqual(error, NO_RESPONSE)
+
+    def test_corruptedResponseIsDropped(self):
+        self.uart.corruptNextResponse = True
+
+        data, error = self.loop.run_until_complete(self.bus.servo(1).request(PING_INSTRUCTION))
+
+        self.assertEqual(error, NO_RESPONSE)
+        self.assertEqual(self.bus.getTransport().getParser().checksumErrors, 1)
+
+    def test_stopAllReachesEveryServo(self):
+        self.first.table[TIME_MEMORY_ADDR] = 40
+        self.second.table[TIME_MEMORY_ADDR] = 240
+
+        self.loop.run_until_complete(self.bus.stopAll())
+
+        self.assertEqual(self.first.table[TIME_MEMORY_ADDR], 0)
+        self.assertEqual(self.second.table[TIME_MEMORY_ADDR], 0)
+
+    def test_servosShareBusRoundRobin(self):
+        async def requests(servoId):
+            for i in range(3):
+                await self.bus.servo(servoId).request(PING_INSTRUCTION)
+
+        async def both():
+            await asyncio.gather(requests(1), requests(2))
+
+        self.loop.run_until_complete(both())
+
+        self.assertEqual([servoId for servoId, *_ in self.uart.received], [1, 2, 1, 2, 1, 2])
+
+    def test_priorityOvertakesRegularTraffic(self):
+        stop = encodeFrame(1, WRITE_INSTRUCTION, bytes((TIME_MEMORY_ADDR, 0, 0)))
+
+        async def scenario():
+            regular = [asyncio.create_task(self.bus.servo(2).request(PING_INSTRUCTION)) for i in range(3)]
+            await asyncio.sleep(0)
+            await self.bus.servo(1).transaction(stop, priority=True)
+            await asyncio.gather(*regular)
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual([instruction for servoId, instruction, parameters in self.uart.received],
+                         [PING_INSTRUCTION, WRITE_INSTRUCTION, PING_INSTRUCTION, PING_INSTRUCTION])
+
+    def test_requestsOfOneServoKeepOrder(self):
+        async def scenario():
+            await asyncio.gather(*(self.bus.servo(1).request(READ_INSTRUCTION, bytes((address, 1)))
+                                   for address in (56, 58, 60)))
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual([parameters[0] for servoId, instruction, parameters in self.uart.received], [56, 58, 60])
+
+    def test_priorityTransactionsAreServedInOrder(self):
+        async def scenario():
+            regular = asyncio.create_task(self.bus.servo(2).request(PING_INSTRUCTION))
+            await asyncio.sleep(0)
+            await asyncio.gather(self.bus.servo(1).request(PING_INSTRUCTION, priority=True),
+                                 self.bus.servo(2).request(PING_INSTRUCTION, priority=True),
+                                 self.bus.servo(1).request(PING_INSTRUCTION))
+            await regular
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual([servoId for servoId, *_ in self.uart.received], [2, 1, 2, 1])
+
+    def test_broadcastReachesEveryServoWithoutResponse(self):
+        self.loop.run_until_complete(self.bus.broadcast(WRITE_INSTRUCTION, bytes((TIME_MEMORY_ADDR, 40, 0))))
+
+        self.assertEqual(self.first.table[TIME_MEMORY_ADDR], 40)
+        self.assertEqual(self.second.table[TIME_MEMORY_ADDR], 40)
+        self.assertEqual(self.bus.getTransport().getLatency().failures, 0)
+
+    def test_stopAllOvertakesRegularTraffic(self):
+        async def scenario():
+            regular = [asyncio.create_task(self.bus.servo(servoId).request(PING_INSTRUCTION)) for servoId in (1, 2, 1)]
+            await asyncio.sleep(0)
+            await self.bus.stopAll()
+            await asyncio.gather(*regular)
+
+        self.loop.run_until_complete(scenario())
+
+        self.assertEqual([servoId for servoId, *_ in self.uart.received], [1, BROADCAST_ID, 2, 1])
+
+    def test_cancelledWaiterDoesNotBlockBus(self):
+        async def scenario():
+            first = asyncio.create_task(self.bus.servo(1).request(PING_INSTRUCTION))
+            cancelled = asyncio.create_task(self.bus.servo(2).request(PING_INSTRUCTION))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await first
+            return await asyncio.wait_for(self.bus.servo(2).request(PING_INSTRUCTION), 1)
+
+        data, error = self.loop.run_until_complete(scenario())
+
+        self.assertEqual(error, 0)
+        self.assertEqual([servoId for servoId, *_ in self.uart.received], [1, 2])
@@ -0,0 +1,47 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import unittest
+
+from src.drivers.scservo.latency import LatencyRecorder
+
+
+class TestLatencyRecorder(unittest.TestCase):
+    def test_emptyRecorderReportsZero(self):
+        latency = LatencyRecorder()
+
+        self.assertEqual(latency.percentile(50), 0)
+        self.assertEqual(latency.percentile(99), 0)
+
+    def test_percentiles(self):
+        latency = LatencyRecorder(size=100)
+        for i in range(100, 0, -1):
+            latency.record(i)
+
+        self.assertEqual(latency.percentile(50), 50)
+        self.assertEqual(latency.percentile(99), 99)
+        self.assertEqual(latency.percentile(100), 100)
+        self.assertEqual(latency.count, 100)
+
+    def test_keepsOnlyLastSamples(self):
+        latency = LatencyRecorder(size=4)
+        for duration in (1000, 1000, 1000, 1000, 10, 20, 30, 40):
+            latency.record(duration)
+
+        self.assertEqual(latency.percentile(99), 40)
+        self.assertEqual(latency.count, 8)
+
+    def test_resetForgetsSamplesAndFailures(self):
+        latency = LatencyRecorder()
+        latency.record(100)
+        latency.recordFailure()
+
+        latency.reset()
+
+        self.assertEqual(latency.percentile(50), 0)
+        self.assertEqual(latency.failures, 0)
@@ -0,0 +1,129 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from src.drivers.scservo.protocol import *
+
+# example from SC servo manual: write speed 1000 into address 0x2E of servo 1
+EXAMPLE_FRAME = bytes((0xFF, 0xFF, 0x01, 0x05, 0x03, 0x2E, 0x03, 0xE8, 0xDD))
+
+
+class TestFrameEncoder(unittest.TestCase):
+    def test_encodesFrameWithChecksum(self):
+        encoder = FrameEncoder()
+
+        frame = encoder.encode(1, WRITE_INSTRUCTION, bytes((0x2E, 0x03, 0xE8)))
+
+        self.assertEqual(bytes(frame), EXAMPLE_FRAME)
+
+    def test_encodesFrameWithoutParameters(self):
+        encoder = FrameEncoder()
+
+        frame = encoder.encode(1, PING_INSTRUCTION)
+
+        self.assertEqual(bytes(frame), bytes((0xFF, 0xFF, 0x01, 0x02, 0x01, 0xFB)))
+
+    def test_reusesBufferBetweenFrames(self):
+        encoder = FrameEncoder()
+
+        first = encoder.encode(1, WRITE_INSTRUCTION, bytes((0x2E, 0x03, 0xE8)))
+        second = encoder.encode(1, WRITE_INSTRUCTION, bytes((0x2E, 0x03, 0xE8)))
+
+        self.assertIs(first, second)
+
+    def test_rejectsTooManyParameters(self):
+        encoder = FrameEncoder(maxParameters=2)
+
+        with self.assertRaises(ValueError):
+            encoder.encode(1, WRITE_INSTRUCTION, bytes((1, 2, 3)))
+
+    def test_precomputedFrameMatchesEncoder(self):
+        self.assertEqual(encodeFrame(1, WRITE_INSTRUCTION, bytes((0x2E, 0x03, 0xE8))), EXAMPLE_FRAME)
+
+
+# response of servo 1 with error 0 and two parameters
+RESPONSE_FRAME = bytes((0xFF, 0xFF, 0x01, 0x04, 0x00, 0x10, 0x20, 0xCA))
+
+
+class TestFrameParser(unittest.TestCase):
+    def test_parsesFrameFromSingleChunk(self):
+        parser = FrameParser()
+
+        parser.push(RESPONSE_FRAME)
+
+        self.assertTrue(parser.poll())
+        self.assertEqual(parser.servoId, 1)
+        self.assertEqual(parser.error, 0)
+        self.assertEqual(bytes(parser.parameters), bytes((0x10, 0x20)))
+        self.assertFalse(parser.poll())
+
+    def test_parsesFrameSplitIntoSingleBytes(self):
+        parser = FrameParser()
+
+        for i in range(len(RESPONSE_FRAME) - 1):
+            parser.push(RESPONSE_FRAME[i:i + 1])
+            self.assertFalse(parser.poll())
+        parser.push(RESPONSE_FRAME[-1:])
+
+        self.assertTrue(parser.poll())
+        self.assertEqual(bytes(parser.parameters), bytes((0x10, 0x20)))
+
+    def test_parsesManyFramesFromOneChunk(self):
+        parser = FrameParser()
+
+        parser.push(RESPONSE_FRAME + RESPONSE_FRAME)
+
+        self.assertTrue(parser.poll())
+        self.assertTrue(parser.poll())
+        self.assertFalse(parser.poll())
+        self.assertEqual(parser.frames, 2)
+
+    def test_resynchronizesAfterGarbage(self):
+        parser = FrameParser()
+
+        parser.push(bytes((0x12, 0xFF, 0x34)) + RESPONSE_FRAME)
+
+        self.assertTrue(parser.poll())
+        self.assertEqual(parser.resyncs, 1)
+        self.assertEqual(parser.checksumErrors, 0)
+
+    def test_countsChecksumErrors(self):
+        parser = FrameParser()
+        broken = bytearray(RESPONSE_FRAME)
+        broken[-1] = 0
+
+        parser.push(broken + RESPONSE_FRAME)
+
+        self.assertTrue(parser.poll())
+        self.assertEqual(parser.checksumErrors, 1)
+        self.assertEqual(parser.frames, 1)
+
+    def test_skipsEchoOfSentFrame(self):
+        parser = FrameParser()
+        request = encodeFrame(1, READ_INSTRUCTION, bytes((0x38, 2)))
+
+        parser.skip(len(request))
+        parser.push(request + RESPONSE_FRAME, len(request) + len(RESPONSE_FRAME))
+
+        self.assertTrue(parser.poll())
+        self.assertEqual(parser.error, 0)
+        self.assertEqual(parser.frames, 1)
+
+    def test_dropsOldestBytesOnOverflow(self):
+        parser = FrameParser(size=len(RESPONSE_FRAME))
+
+        parser.push(bytes((0x00, 0x00)) + RESPONSE_FRAME)
+
+        self.assertEqual(parser.overflows, 2)
+        self.assertTrue(parser.poll())
+
+
+if __name__ == '__main__':
+    unittest.main()
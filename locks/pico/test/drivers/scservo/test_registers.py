@@ -0,0 +1,48 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from src.drivers.scservo.registers import ShadowRegisters
+
+
+class TestShadowRegisters(unittest.TestCase):
+    def test_unknownRegistersNeverMatch(self):
+        registers = ShadowRegisters()
+
+        self.assertFalse(registers.matches(44, bytes((0, 0))))
+
+    def test_matchesWrittenValues(self):
+        registers = ShadowRegisters()
+
+        registers.update(44, bytes((0xFF, 44, 40, 0, 0xAA)), 2, 4)
+
+        self.assertTrue(registers.matches(44, bytes((40, 0))))
+        self.assertTrue(registers.matches(45, bytes((0,))))
+        self.assertFalse(registers.matches(44, bytes((240, 0))))
+        self.assertFalse(registers.matches(44, bytes((40, 0, 0))))
+
+    def test_invalidateForgetsValues(self):
+        registers = ShadowRegisters()
+        registers.update(44, bytes((40, 0)))
+
+        registers.invalidate()
+
+        self.assertFalse(registers.matches(44, bytes((40, 0))))
+
+    def test_ignoresWritesOutsideOfTable(self):
+        registers = ShadowRegisters(size=8)
+
+        registers.update(7, bytes((1, 2)))
+
+        self.assertFalse(registers.matches(7, bytes((1, 2))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+
+import unittest
+
+from src.drivers.scservo.telemetry import ServoTelemetry, TELEMETRY_LENGTH
+
+# position 0x0102, speed -5, load -1, 12.0V, 30C, status 0, moving
+REGISTERS = bytes((0x01, 0x02, 0x80, 0x05, 0x04, 0x01, 120, 30, 0, 0, 1))
+
+
+class TestServoTelemetry(unittest.TestCase):
+    def test_decodesAllRegisters(self):
+        telemetry = ServoTelemetry()
+
+        telemetry.update(REGISTERS, 0)
+
+        self.assertTrue(telemetry.valid)
+        self.assertEqual(telemetry.position, 0x0102)
+        self.assertEqual(telemetry.speed, -5)
+        self.assertEqual(telemetry.load, -1)
+        self.assertEqual(telemetry.voltage, 120)
+        self.assertEqual(telemetry.temperature, 30)
+        self.assertTrue(telemetry.moving)
+
+    def test_readsWholeTableInOneRequest(self):
+        self.assertEqual(TELEMETRY_LENGTH, len(REGISTERS))
+
+    def test_missingResponseInvalidatesSnapshot(self):
+        telemetry = ServoTelemetry()
+        telemetry.update(REGISTERS, 0)
+
+        telemetry.update(b"", 0xFF)
+
+        self.assertFalse(telemetry.valid)
+        self.assertEqual(telemetry.error, 0xFF)
+
+
+if __name__ == '__main__':
+    unittest.main()
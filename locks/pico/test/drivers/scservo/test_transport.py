@@ -0,0 +1,130 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import unittest
+
+import test.conditions
+from src.drivers.scservo.protocol import *
+from src.drivers.scservo.transport import ScServoTransport, NO_RESPONSE
+from test.mock.scservo_simulator import frame
+
+TIMEOUT_MS = 20
+
+
+class FakeServoStream:
+    def __init__(self, echo=True):
+        """Answers each written frame with prepared chunks, every chunk is returned by separate readinto"""
+        self.echo = echo
+        self.answers = []
+        self.written = []
+        self._chunks = []
+
+    def write(self, buffer):
+        self.written.append(bytes(buffer))
+        if self.echo:
+            self._chunks.append(bytes(buffer))
+        if self.answers:
+            self._chunks.extend(self.answers.pop(0))
+
+    async def drain(self):
+        pass
+
+    def any(self) -> int:
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def read(self, count: int = -1):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+    async def readinto(self, buffer) -> int:
+        while not self._chunks:
+            await asyncio.sleep(0.001)
+        chunk = self._chunks.pop(0)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+@test.conditions.pc_only()
+class TestScServoTransport(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.stream = FakeServoStream()
+        self.transport = ScServoTransport(self.stream, timeoutMs=TIMEOUT_MS)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def request(self, servoId=1, instruction=READ_INSTRUCTION, parameters=b"\x38\x02"):
+        data, error = self.loop.run_until_complete(self.transport.request(servoId, instruction, parameters))
+        return bytes(data), error
+
+    def test_echoIsSkipped(self):
+        # echo of request to servo 1 is not mistaken for its response
+        self.stream.answers.append([frame(1, 0, b"\x10\x02")])
+
+        self.assertEqual(self.request(), (b"\x10\x02", 0))
+        self.assertEqual(self.stream.written, [encodeFrame(1, READ_INSTRUCTION, b"\x38\x02")])
+
+    def test_responseWithoutEchoIsParsed(self):
+        self.stream = FakeServoStream(echo=False)
+        self.transport = ScServoTransport(self.stream, timeoutMs=TIMEOUT_MS, echo=False)
+        self.stream.answers.append([frame(1, 0x20, b"\x10")])
+
+        self.assertEqual(self.request(), (b"\x10", 0x20))
+
+    def test_responseSplitIntoSingleBytesIsParsed(self):
+        response = frame(1, 0, b"\x10\x02")
+        self.stream.answers.append([response[i:i + 1] for i in range(len(response))])
+
+        self.assertEqual(self.request(), (b"\x10\x02", 0))
+
+    def test_resynchronizesAfterCorruptedFrame(self):
+        corrupted = bytearray(frame(1, 0, b"\x99\x99"))
+        corrupted[-1] = corrupted[-1] ^ 0xFF
+        self.stream.answers.append([b"\x00\x42", bytes(corrupted), frame(1, 0, b"\x10\x02")])
+
+        self.assertEqual(self.request(), (b"\x10\x02", 0))
+        self.assertEqual(self.transport.getParser().checksumErrors, 1)
+
+    def test_responseOfOtherServoIsIgnored(self):
+        self.stream.answers.append([frame(2, 0, b"\x99\x99"), frame(1, 0, b"\x10\x02")])
+
+        self.assertEqual(self.request(), (b"\x10\x02", 0))
+
+    def test_missingResponseTimesOut(self):
+        self.assertEqual(self.request(), (b"", NO_RESPONSE))
+        self.assertEqual(self.transport.getLatency().failures, 1)
+        self.assertEqual(self.transport.getLatency().count, 0)
+
+    def test_onlyCorruptedResponseTimesOut(self):
+        corrupted = bytearray(frame(1, 0, b"\x10\x02"))
+        corrupted[-1] = corrupted[-1] ^ 0xFF
+        self.stream.answers.append([bytes(corrupted)])
+
+        self.assertEqual(self.request(), (b"", NO_RESPONSE))
+
+    def test_staleResponseIsDiscardedBeforeRequest(self):
+        # late answer to request, which already timed out
+        self.request()
+        self.stream._chunks.append(frame(1, 0, b"\x99\x99"))
+        self.stream.answers.append([frame(1, 0, b"\x10\x02")])
+
+        self.assertEqual(self.request(), (b"\x10\x02", 0))
+
+    def test_answeredRequestIsTimed(self):
+        self.stream.answers.append([frame(1, 0)])
+
+        self.request(instruction=PING_INSTRUCTION, parameters=b"")
+
+        self.assertEqual(self.transport.getLatency().count, 1)
+
+    def test_broadcastDoesNotWaitForResponse(self):
+        self.assertEqual(self.request(BROADCAST_ID, WRITE_INSTRUCTION, b"\x2c\x00\x00"), (b"", 0))
+        self.assertEqual(self.transport.getLatency().failures, 0)
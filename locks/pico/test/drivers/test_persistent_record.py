@@ -0,0 +1,58 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import os
+import unittest
+
+from src.drivers.persistent_record import PersistentRecord, crc16
+
+RECORD_FILE = "test_persistent_record.bin"
+
+
+class TestPersistentRecord(unittest.TestCase):
+    def tearDown(self):
+        PersistentRecord(RECORD_FILE, "<B").clear()
+
+    def test_crc16(self):
+        self.assertEqual(crc16(b"123456789"), 0x29B1)
+
+    def test_missingRecordIsNotLoaded(self):
+        self.assertIsNone(PersistentRecord(RECORD_FILE, "<Bf").load())
+
+    def test_savedValuesAreLoaded(self):
+        PersistentRecord(RECORD_FILE, "<Bfh").save(2, 1.5, -1)
+
+        self.assertEqual(PersistentRecord(RECORD_FILE, "<Bfh").load(), (2, 1.5, -1))
+
+    def test_corruptedRecordIsNotLoaded(self):
+        PersistentRecord(RECORD_FILE, "<Bf").save(2, 1.5)
+        with open(RECORD_FILE, "rb") as file:
+            data = bytearray(file.read())
+        data[4] = data[4] ^ 0x01
+        with open(RECORD_FILE, "wb") as file:
+            file.write(data)
+
+        self.assertIsNone(PersistentRecord(RECORD_FILE, "<Bf").load())
+
+    def test_recordOfOtherVersionIsNotLoaded(self):
+        PersistentRecord(RECORD_FILE, "<Bf", version=1).save(2, 1.5)
+
+        self.assertIsNone(PersistentRecord(RECORD_FILE, "<Bf", version=2).load())
+
+    def test_recordOfOtherFormatIsNotLoaded(self):
+        PersistentRecord(RECORD_FILE, "<Bf").save(2, 1.5)
+
+        self.assertIsNone(PersistentRecord(RECORD_FILE, "<Bff").load())
+
+    def test_saveReplacesRecordWithoutLeftovers(self):
+        record = PersistentRecord(RECORD_FILE, "<B")
+        record.save(1)
+        record.save(2)
+
+        self.assertEqual(record.load(), (2,))
+        self.assertNotIn(RECORD_FILE + ".tmp", os.listdir())
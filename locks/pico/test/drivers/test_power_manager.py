@@ -0,0 +1,129 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+import asyncio
+import unittest
+
+import machine
+
+import test.conditions
+from src.drivers.power_manager import *
+
+
+class TestCurrentModel(unittest.TestCase):
+    def test_estimateGrowsWithFrequencyAndSampling(self):
+        model = CurrentModel()
+
+        idle = model.estimate(IDLE_FREQUENCY, False)
+        active = model.estimate(ACTIVE_FREQUENCY, True)
+
+        self.assertGreater(active, idle)
+
+    def test_lightSleepReplacesCpuCurrent(self):
+        model = CurrentModel((10.0, 0.0, 0.0, 0.0, 0.0, 2.0))
+
+        self.assertAlmostEqual(model.estimate(IDLE_FREQUENCY, False, 0.5), 6.0)
+
+    def test_measuredCurrentReplacesEstimate(self):
+        model = CurrentModel()
+
+        model.setCurrent(SUBSYSTEM_WIRELESS, 40.0)
+
+        self.assertTrue(model.isMeasured(SUBSYSTEM_WIRELESS))
+        self.assertFalse(model.isMeasured(SUBSYSTEM_SERVO))
+        self.assertEqual(model.getCurrent(SUBSYSTEM_WIRELESS), 40.0)
+
+    def test_everySubsystemMustHaveCurrent(self):
+        with self.assertRaises(ValueError):
+            CurrentModel((1.0,))
+
+
+@test.conditions.pc_only()
+class TestPowerManager(unittest.TestCase):
+    def setUp(self):
+        machine.freq(ACTIVE_FREQUENCY)
+        machine.lightSleeps.clear()
+
+    def test_idleLowersFrequencyAndActiveRestoresIt(self):
+        frequencies = []
+        power = PowerManager()
+        power.addFrequencyListener(frequencies.append)
+
+        power.idle()
+        self.assertEqual(machine.freq(), IDLE_FREQUENCY)
+        power.idle()
+        power.active()
+
+        self.assertEqual(machine.freq(), ACTIVE_FREQUENCY)
+        self.assertEqual(frequencies, [IDLE_FREQUENCY, ACTIVE_FREQUENCY])
+
+    def test_idleCurrentIsLower(self):
+        power = PowerManager(lightSleepMs=20)
+        active = power.getEstimatedCurrent()
+
+        power.idle()
+
+        self.assertLess(power.getEstimatedCurrent(), active)
+
+    def test_lightSleepsOnlyWhileIdle(self):
+        power = PowerManager(lightSleepMs=10, sleepDelayMs=0)
+        loop = asyncio.new_event_loop()
+
+        async def scenario():
+            task = asyncio.create_task(power.run())
+            await asyncio.sleep(0.05)
+            sleepsWhileActive = len(machine.lightSleeps)
+            power.idle()
+            await asyncio.sleep(0.05)
+            power.active()
+            sleepsWhileIdle = len(machine.lightSleeps)
+            await asyncio.sleep(0.05)
+            task.cancel()
+            return sleepsWhileActive, sleepsWhileIdle
+
+        try:
+            sleepsWhileActive, sleepsWhileIdle = loop.run_until_complete(scenario())
+        finally:
+            loop.close()
+
+        self.assertEqual(sleepsWhileActive, 0)
+        self.assertGreater(sleepsWhileIdle, 0)
+        self.assertEqual(len(machine.lightSleeps), sleepsWhileIdle)
+
+    def test_lightSleepStartsAfterDelay(self):
+        power = PowerManager(lightSleepMs=10, sleepDelayMs=100)
+        loop = asyncio.new_event_loop()
+
+        async def scenario():
+            task = asyncio.create_task(power.run())
+            power.idle()
+            await asyncio.sleep(0.05)
+            sleepsBeforeDelay = len(machine.lightSleeps)
+            await asyncio.sleep(0.1)
+            task.cancel()
+            return sleepsBeforeDelay
+
+        try:
+            sleepsBeforeDelay = loop.run_until_complete(scenario())
+        finally:
+            loop.close()
+
+        self.assertEqual(sleepsBeforeDelay, 0)
+        self.assertGreater(len(machine.lightSleeps), 0)
+
+    def test_shortLightSleepIsEnabledByDefault(self):
+        power = PowerManager()
+        power.idle()
+        awake = PowerManager(lightSleepMs=0)
+        awake.idle()
+
+        self.assertLess(power.getEstimatedCurrent(), awake.getEstimatedCurrent())
+
+    def test_invalidFrequenciesAreRejected(self):
+        with self.assertRaises(ValueError):
+            PowerManager(activeFrequency=IDLE_FREQUENCY, idleFrequency=ACTIVE_FREQUENCY)
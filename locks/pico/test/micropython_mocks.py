@@ -13,6 +13,7 @@ def get_micropython_mocks():
     import test.mock.micropython.micropython as micropython
     import test.mock.micropython.machine as machine
     import test.mock.micropython.aioble as aioble
+    import test.mock.micropython.rp2 as rp2
 
     return dict({
         "micropython": micropython,
@@ -21,7 +22,8 @@ def get_micropython_mocks():
         },
         "aioble": aioble,
         "bluetooth": MagicMock(),
-        "machine": machine
+        "machine": machine,
+        "rp2": rp2
     })
 
 
@@ -30,3 +32,13 @@ if "micropython" != sys.implementation.name:
     mocks = get_micropython_mocks()
     for key in mocks:
         sys.modules[key] = mocks[key]
+    import asyncio
+    import time
+    import test.mock.micropython.ticks as ticks
+    from test.mock.micropython.threadsafe_flag import ThreadSafeFlag
+
+    for name in ("ticks_ms", "ticks_us", "ticks_add", "ticks_diff", "sleep_ms", "sleep_us"):
+        if not hasattr(time, name):
+            setattr(time, name, getattr(ticks, name))
+    if not hasattr(asyncio, "ThreadSafeFlag"):
+        asyncio.ThreadSafeFlag = ThreadSafeFlag
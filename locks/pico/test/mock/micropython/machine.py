@@ -8,6 +8,44 @@
 # ------------------------------------------------------------------------------
 import time
 
+_frequency = 125_000_000
+lightSleeps = []
+
+
+def freq(frequency=None):
+    global _frequency
+    if frequency is None:
+        return _frequency
+    _frequency = frequency
+
+
+def lightsleep(timeMs=None):
+    lightSleeps.append(timeMs)
+    if timeMs is not None:
+        time.sleep(timeMs / 1000)
+
+
+# ADC FIFO of RP2040 is never filled by mock, so its status reports it empty
+_ADC_FCS = 0x4004C008
+_ADC_FCS_EMPTY = 0x100
+
+
+class _Memory:
+    def __init__(self):
+        self.values = {}
+
+    def __getitem__(self, address):
+        value = self.values.get(address, 0)
+        if address == _ADC_FCS:
+            value = value | _ADC_FCS_EMPTY
+        return value
+
+    def __setitem__(self, address, value):
+        self.values[address] = value & 0xFFFFFFFF
+
+
+mem32 = _Memory()
+
 
 class RTC:
     def __init__(self):
@@ -21,3 +59,96 @@ class RTC:
         (year, month, day, hour, minute, second, weekday, *_) = time.localtime(
             time.mktime(time.localtime()) - self._offset)
         return (year, month, day, weekday, hour, minute, second, 0)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id=None, mode=-1, pull=-1, value=None):
+        self._id = id
+        self._value = 0 if value is None else value
+        self._handler = None
+        self._trigger = 0
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if value is not None:
+            self._value = value
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, **kwargs):
+        self._handler = handler
+        self._trigger = trigger
+
+
+class PWM:
+    def __init__(self, dest, **kwargs):
+        self._pin = dest
+        self._freq = kwargs.get("freq", 0)
+        self._duty = kwargs.get("duty_u16", 0)
+        self.duties = []
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = value
+        self.duties.append(value)
+
+    def deinit(self):
+        self._duty = 0
+
+
+class ADC:
+    def __init__(self, pin):
+        self._pin = pin
+        self.value = 0
+
+    def read_u16(self):
+        return self.value
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.running = False
+        self.kwargs = kwargs
+
+    def init(self, **kwargs):
+        self.running = True
+        self.kwargs = kwargs
+
+    def deinit(self):
+        self.running = False
+
+
+class UART:
+    def __init__(self, id, baudrate=115200, **kwargs):
+        self._id = id
+
+    def init(self, baudrate=115200, **kwargs):
+        pass
+
+    def flush(self):
+        pass
@@ -10,3 +10,7 @@
 
 def const(value):
     return value
+
+
+def native(function):
+    return function
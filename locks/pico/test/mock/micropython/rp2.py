@@ -0,0 +1,89 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+#
+# PIO programs are not assembled on PC, state machine keeps only registers tests set and instructions executed
+# with exec, so code reading PIO registers can be tested
+#
+_instructions = []
+
+
+class PIO:
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+
+
+def asm_pio(*args, **kwargs):
+    return lambda program: program
+
+
+def asm_pio_encode(instruction, sideset_count, sideset_opt=False):
+    if instruction not in _instructions:
+        _instructions.append(instruction)
+    return _instructions.index(instruction)
+
+
+class StateMachine:
+    def __init__(self, id, program=None, **kwargs):
+        self.id = id
+        self.x = 0
+        self.y = 0
+        self.isr = 0
+        self.osr = 0
+        self.running = False
+        self.program = None
+        self.kwargs = None
+        self._rx = []
+        self._tx = []
+        if program is not None:
+            self.init(program, **kwargs)
+
+    def init(self, program, **kwargs):
+        self.program = program
+        self.kwargs = kwargs
+
+    def active(self, value=None):
+        if value is None:
+            return self.running
+        self.running = bool(value)
+
+    def restart(self):
+        self.x = 0
+        self.y = 0
+        self.isr = 0
+
+    def put(self, value, shift=0):
+        self._tx.append(value >> shift)
+
+    def get(self, buf=None, shift=0):
+        return self._rx.pop(0) >> shift
+
+    def rx_fifo(self):
+        return len(self._rx)
+
+    def tx_fifo(self):
+        return len(self._tx)
+
+    def exec(self, instruction):
+        if not isinstance(instruction, str):
+            instruction = _instructions[instruction]
+        if instruction == "mov(isr, x)":
+            self.isr = self.x
+        elif instruction == "mov(isr, y)":
+            self.isr = self.y
+        elif instruction == "push()":
+            self._rx.append(self.isr)
+        else:
+            raise NotImplementedError(instruction)
@@ -0,0 +1,39 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+#
+# MicroPython specific functions of time module, added to CPython time module by micropython_mocks
+#
+import time
+
+TICKS_PERIOD = 1 << 30
+TICKS_HALF_PERIOD = TICKS_PERIOD // 2
+
+
+def ticks_ms():
+    return (time.monotonic_ns() // 1_000_000) % TICKS_PERIOD
+
+
+def ticks_us():
+    return (time.monotonic_ns() // 1_000) % TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALF_PERIOD) % TICKS_PERIOD) - TICKS_HALF_PERIOD
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    time.sleep(us / 1_000_000)
@@ -0,0 +1,390 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2023, Pawel Przytarski                                        -
+#                                                                              -
+#   Licensed under the Apache License, Version 2.0 (the "License");            -
+#   you may not use this file except in compliance with the License.           -
+#   You may obtain a copy of the License at                                    -
+#   http://www.apache.org/licenses/LICENSE-2.0                                 -
+# ------------------------------------------------------------------------------
+#
+# Pure python simulation of Waveshare/Feetech SC servos connected to half-duplex UART.
+# Simulated bus can be passed as communication of WaveshareScServoLockManipulator or
+# ScServoBus instead of machine.UART. It implements PING, READ and WRITE instructions,
+# checksum validation, control table, wire and response timing and simple model of
+# rotating shaft in wheel mode.
+#
+# Simulation is written independently of src.drivers.scservo on purpose, so it can catch
+# protocol errors of driver instead of repeating them.
+#
+import asyncio
+import time
+
+from machine import Pin
+
+HEADER = 0xFF
+BROADCAST_ID = 0xFE
+
+PING = 0x01
+READ = 0x02
+WRITE = 0x03
+
+ERROR_INSTRUCTION = 0x40
+
+BAUD_RATE_ADDR = 6
+RETURN_DELAY_ADDR = 7
+TIME_ADDR = 44
+POSITION_ADDR = 56
+SPEED_ADDR = 58
+LOAD_ADDR = 60
+VOLTAGE_ADDR = 62
+TEMPERATURE_ADDR = 63
+MOVING_ADDR = 66
+CONTROL_TABLE_SIZE = 72
+
+BAUD_RATES = (1_000_000, 500_000, 250_000, 128_000, 115_200, 76_800, 57_600, 38_400)
+
+DIRECTION_BIT = 0x80
+SPEED_MASK = 0x7F
+LOAD_DIRECTION_BIT = 1 << 10
+MAX_LOAD = 1000
+
+# start bit, 8 data bits and stop bit
+BITS_PER_BYTE = 10
+
+# seconds between reed switch checks while shaft accelerates or coasts
+ACCELERATION_CHECK_INTERVAL = 0.002
+
+
+def checksum(data) -> int:
+    return (~sum(data)) & 0xFF
+
+
+def frame(servoId: int, instructionOrError: int, parameters=b"") -> bytes:
+    body = bytes((servoId, len(parameters) + 2, instructionOrError)) + bytes(parameters)
+    return bytes((HEADER, HEADER)) + body + bytes((checksum(body),))
+
+
+class SimulatedScServo:
+    def __init__(self,
+                 servoId: int = 1,
+                 positionsPerRotation: int = 1024,
+                 fullSpeedRotationsPerSecond: float = 1.0,
+                 friction: int = 150,
+                 limits: tuple = None,
+                 position: int = 0,
+                 acceleration: float = None):
+        """
+        Single servo with control table and shaft model. Shaft rotates only when goal time register
+        (used as speed in wheel mode) is non zero. Bit 0x80 of its high byte selects clockwise rotation,
+        which increases present position.
+
+        :param servoId: id servo answers to
+        :param positionsPerRotation: resolution of present position register
+        :param fullSpeedRotationsPerSecond: shaft speed for speed value 127
+        :param friction: load reported by freely rotating shaft, in 0.1% of maximal torque
+        :param limits: optional (min, max) shaft rotations, where mechanism blocks shaft, e.g. lock bolt end
+        :param position: initial present position
+        :param acceleration: shaft acceleration and deceleration in rotations per second squared, shaft
+                             reaches set speed immediately if None, otherwise it also coasts after stop
+        """
+        self.servoId = servoId
+        self.table = bytearray(CONTROL_TABLE_SIZE)
+        self.table[BAUD_RATE_ADDR] = 0
+        self.table[RETURN_DELAY_ADDR] = 0
+        self.table[VOLTAGE_ADDR] = 120
+        self.table[TEMPERATURE_ADDR] = 30
+        self.positionsPerRotation = positionsPerRotation
+        self.fullSpeedRotationsPerSecond = fullSpeedRotationsPerSecond
+        self.friction = friction
+        self.limits = limits
+        self.acceleration = acceleration
+        self.rotations = position / positionsPerRotation
+        self.baudrate = BAUD_RATES[0]
+        self.jammed = False
+        self.online = True
+        self.errors = 0
+        self.received = []
+        self.listeners = []
+        self._lastUpdate = time.monotonic()
+        self._stalled = False
+        self._speed = 0.0
+        self._refreshRegisters(0)
+
+    def commandedSpeed(self) -> float:
+        """Signed shaft speed set in register in rotations per second, positive for clockwise rotation"""
+        value = self.table[TIME_ADDR]
+        speed = (value & SPEED_MASK) * self.fullSpeedRotationsPerSecond / SPEED_MASK
+        return -speed if value & DIRECTION_BIT == 0 else speed
+
+    def speed(self) -> float:
+        """Signed speed shaft really has, it differs from commanded one while shaft accelerates or coasts"""
+        return self._speed
+
+    def update(self, now: float = None):
+        """Moves shaft according to speed set since last update"""
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self._lastUpdate
+        self._lastUpdate = now
+        target = self.commandedSpeed()
+        start = self._speed
+        if self.acceleration is None or start == target:
+            speed = target
+            distance = target * elapsed
+        else:
+            rampTime = abs(target - start) / self.acceleration
+            if elapsed >= rampTime:
+                speed = target
+                distance = (start + target) / 2 * rampTime + target * (elapsed - rampTime)
+            else:
+                speed = start + (self.acceleration if target > start else -self.acceleration) * elapsed
+                distance = (start + speed) / 2 * elapsed
+        rotations = self.rotations + distance
+        self._stalled = False
+        if self.jammed:
+            rotations = self.rotations
+            speed = 0.0
+            self._stalled = target != 0
+        elif self.limits is not None:
+            if rotations <= self.limits[0]:
+                rotations = self.limits[0]
+                speed = 0.0
+                self._stalled = target < 0
+            elif rotations >= self.limits[1]:
+                rotations = self.limits[1]
+                speed = 0.0
+                self._stalled = target > 0
+        self.rotations = rotations
+        self._speed = speed
+        self._refreshRegisters(target)
+
+    def _refreshRegisters(self, target):
+        position = int(self.rotations * self.positionsPerRotation) % self.positionsPerRotation
+        self._writeWord(POSITION_ADDR, position)
+        speed = self._speed
+        self._writeWord(SPEED_ADDR, int(abs(speed) / self.fullSpeedRotationsPerSecond * SPEED_MASK) * 50
+                        | (0x8000 if speed < 0 else 0))
+        load = 0
+        if target != 0:
+            load = MAX_LOAD if self._stalled else self.friction
+            if target < 0:
+                load = load | LOAD_DIRECTION_BIT
+        self._writeWord(LOAD_ADDR, load)
+        self.table[MOVING_ADDR] = 1 if speed != 0 else 0
+
+    def _writeWord(self, address, value):
+        self.table[address] = (value >> 8) & 0xFF
+        self.table[address + 1] = value & 0xFF
+
+    def execute(self, instruction: int, parameters: bytes):
+        """
+        Executes instruction addressed to this servo
+
+        :return: response parameters and error byte, or None if servo does not answer
+        """
+        self.received.append((instruction, parameters))
+        self.update()
+        if instruction == PING:
+            return b"", self._errorFlags()
+        if instruction == READ and len(parameters) == 2:
+            address, length = parameters
+            return bytes(self.table[address:address + length]), self._errorFlags()
+        if instruction == WRITE and len(parameters) >= 1:
+            address = parameters[0]
+            self.table[address:address + len(parameters) - 1] = parameters[1:]
+            self.update()
+            for listener in self.listeners:
+                listener.speedChanged()
+            return b"", self._errorFlags()
+        return b"", ERROR_INSTRUCTION
+
+    def _errorFlags(self):
+        return self.errors
+
+    def returnDelay(self) -> float:
+        # return delay register is in 2us units
+        return self.table[RETURN_DELAY_ADDR] * 2e-6
+
+
+class SimulatedReedSwitch(Pin):
+    def __init__(self, servo: SimulatedScServo, neutral: float = 0.0, width: float = 0.05):
+        """
+        Reed switch closed (value 0) when magnet on servo shaft is near neutral position
+
+        :param servo: servo shaft of which carries magnet
+        :param neutral: fraction of rotation where magnet is aligned with switch
+        :param width: fraction of rotation, where switch stays closed
+        """
+        super().__init__()
+        self._servo = servo
+        self._neutral = neutral
+        self._width = width
+        self._timer = None
+        self._closed = False
+        servo.listeners.append(self)
+
+    def value(self, value=None):
+        if value is not None:
+            return
+        self._servo.update()
+        offset = (self._servo.rotations - self._neutral) % 1.0
+        return 0 if offset < self._width / 2 or offset > 1.0 - self._width / 2 else 1
+
+    def irq(self, handler=None, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, **kwargs):
+        """Only closing (falling) edge is simulated. Handler is called from event loop."""
+        super().irq(handler, trigger, **kwargs)
+        self.speedChanged()
+
+    def speedChanged(self):
+        """Plans handler call for moment when magnet reaches switch with current shaft speed"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._handler is None or self._trigger & Pin.IRQ_FALLING == 0:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._closed = self.value() == 0
+        speed = self._servo.speed()
+        accelerating = speed != self._servo.commandedSpeed()
+        if speed == 0 and not accelerating:
+            return
+        offset = (self._servo.rotations - self._neutral) % 1.0
+        if speed > 0:
+            distance = (1.0 - self._width / 2 - offset) % 1.0
+        else:
+            distance = (offset - self._width / 2) % 1.0
+        delay = distance / abs(speed) + 0.0001 if speed != 0 else ACCELERATION_CHECK_INTERVAL
+        if accelerating and delay > ACCELERATION_CHECK_INTERVAL:
+            # prediction holds only for constant speed, so check often while speed changes
+            delay = ACCELERATION_CHECK_INTERVAL
+        self._timer = loop.call_later(delay, self._edge)
+
+    def _edge(self):
+        self._timer = None
+        closed = self.value() == 0
+        if closed and not self._closed:
+            self._handler(self)
+        self._closed = closed
+        self.speedChanged()
+
+
+class SimulatedScServoBus:
+    def __init__(self, *servos: SimulatedScServo, baudrate: int = 1_000_000, echo: bool = True,
+                 timing: bool = True, reliableBaudRate: int = None):
+        """
+        Half-duplex UART with servos connected. Provides UART any and read methods and asyncio stream
+        write, drain and readinto methods, so transport can use it directly.
+
+        :param servos: servos connected to bus
+        :param baudrate: UART speed used to simulate wire time of frames
+        :param echo: True if sent frames are received back like on real half-duplex bus
+        :param timing: False to deliver responses immediately, without simulating wire time
+        :param reliableBaudRate: if set, responses sent faster than it are corrupted, like on too long wires
+        """
+        self.servos = dict((servo.servoId, servo) for servo in servos)
+        self.baudrate = baudrate
+        self.echo = echo
+        self.timing = timing
+        self.reliableBaudRate = reliableBaudRate
+        self.sentFrames = 0
+        self.sentBytes = 0
+        self.corruptNextResponse = False
+        self.received = []
+        self._pending = []
+        self._busyUntil = time.monotonic()
+
+    def init(self, baudrate: int = None, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def _wireTime(self, length):
+        return length * BITS_PER_BYTE / self.baudrate if self.timing else 0
+
+    def _transmit(self, data, delay=0.0):
+        start = max(self._busyUntil, time.monotonic()) + delay
+        self._busyUntil = start + self._wireTime(len(data))
+        self._pending.append((self._busyUntil, data))
+
+    def write(self, buffer):
+        data = bytes(buffer)
+        self.sentFrames = self.sentFrames + 1
+        self.sentBytes = self.sentBytes + len(data)
+        if self.echo:
+            self._transmit(data)
+        else:
+            self._busyUntil = max(self._busyUntil, time.monotonic()) + self._wireTime(len(data))
+        self._handle(data)
+        return len(data)
+
+    async def drain(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def _handle(self, data):
+        if len(data) < 6 or data[0] != HEADER or data[1] != HEADER:
+            return
+        servoId, length = data[2], data[3]
+        if len(data) != length + 4:
+            return
+        if checksum(data[2:-1]) != data[-1]:
+            # servos silently drop corrupted frames
+            return
+        instruction, parameters = data[4], data[5:-1]
+        self.received.append((servoId, instruction, parameters))
+        for servo in self.servos.values():
+            if not servo.online or servo.baudrate != self.baudrate \
+                    or (servo.servoId != servoId and servoId != BROADCAST_ID):
+                continue
+            response = servo.execute(instruction, parameters)
+            baudIndex = servo.table[BAUD_RATE_ADDR]
+            if servoId == BROADCAST_ID or response is None:
+                servo.baudrate = BAUD_RATES[baudIndex % len(BAUD_RATES)]
+                continue
+            encoded = frame(servo.servoId, response[1], response[0])
+            if self.corruptNextResponse or (self.reliableBaudRate is not None
+                                            and self.baudrate > self.reliableBaudRate):
+                self.corruptNextResponse = False
+                encoded = encoded[:-1] + bytes((encoded[-1] ^ 0xFF,))
+            self._transmit(encoded, servo.returnDelay() if self.timing else 0)
+            # new baud rate is used after response is sent with old one
+            servo.baudrate = BAUD_RATES[baudIndex % len(BAUD_RATES)]
+
+    def _available(self):
+        now = time.monotonic()
+        data = b""
+        while self._pending and self._pending[0][0] <= now:
+            data = data + self._pending.pop(0)[1]
+        if data:
+            self._pending.insert(0, (now, data))
+        return data
+
+    def any(self) -> int:
+        return len(self._available())
+
+    def read(self, count: int = -1):
+        data = self._available()
+        if not data:
+            return None
+        self._pending.pop(0)
+        if 0 <= count < len(data):
+            self._pending.insert(0, (time.monotonic(), data[count:]))
+            data = data[:count]
+        return data
+
+    async def readinto(self, buffer) -> int:
+        while not self._available():
+            if not self._pending:
+                # nothing on the wire, wait for next write
+                await asyncio.sleep(0.0005)
+                continue
+            remaining = self._pending[0][0] - time.monotonic()
+            # event loop sleeps with millisecond resolution, so shorter waits only yield to keep wire timing
+            await asyncio.sleep(remaining if remaining > 0.001 else 0)
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)